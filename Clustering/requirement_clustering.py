@@ -0,0 +1,144 @@
+import argparse
+import logging
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import linkage, fcluster
+
+# The shared text normalization lives in the repository root, the embedding cache in visuals/
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_DIR)
+sys.path.insert(0, os.path.join(REPOSITORY_DIR, 'visuals'))
+from embedding_cache import CachedEncoder
+from text_normalization import REQUIREMENTS
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+MODEL_NAME = 'bert-base-uncased'
+BATCH_SIZE = 64
+MAX_LENGTH = 512
+DISTANCE_THRESHOLD = 0.98
+DEFAULT_MEMORY_BUDGET = 256 * 1024 ** 2  # Bytes of float32 similarity blocks held at once
+
+
+def clean_requirements(requirements):
+    """Case-fold requirement texts, collapse whitespace and strip punctuation, in one pass per distinct text."""
+    return REQUIREMENTS.normalize_series(requirements)
+
+
+class BertClsModel:
+    """
+    BERT sentence vectors (the final hidden state of the [CLS] token), encoded in padded batches.
+    Texts are batched by length so that little padding is computed; the attention mask keeps the
+    padding from changing any vector.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, max_length=MAX_LENGTH):
+        # Imported here so that clustering precomputed embeddings does not need torch
+        import torch
+        from transformers import BertModel, BertTokenizer
+
+        self.torch = torch
+        self.tokenizer = BertTokenizer.from_pretrained(model_name)
+        self.model = BertModel.from_pretrained(model_name).eval()
+        self.max_length = max_length
+
+    def encode(self, texts, batch_size=BATCH_SIZE, **kwargs):
+        order = np.argsort([len(text) for text in texts], kind='stable')
+        embeddings = np.empty((len(texts), self.model.config.hidden_size), dtype=np.float32)
+
+        with self.torch.inference_mode():
+            for start in range(0, len(texts), batch_size):
+                rows = order[start:start + batch_size]
+                inputs = self.tokenizer([texts[row] for row in rows], padding=True, truncation=True,
+                                        max_length=self.max_length, return_tensors='pt')
+                embeddings[rows] = self.model(**inputs).last_hidden_state[:, 0].float().numpy()
+        return embeddings
+
+
+def encode_requirements(requirements, batch_size=BATCH_SIZE):
+    """Embeddings for a list of requirement texts; only texts missing from the embedding cache run through BERT."""
+    encoder = CachedEncoder(f'{MODEL_NAME}/cls', load_model=lambda: BertClsModel(MODEL_NAME))
+    return encoder.encode(requirements, batch_size=batch_size)
+
+
+def condensed_cosine_distances(embeddings, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """
+    Pairwise distances between the unit-normalized embeddings, sqrt(2 - 2 cos), in scipy's condensed form.
+    This is the Euclidean distance between the normalized vectors, so it is a valid input for Ward linkage.
+    Similarities are computed in float32 row blocks of at most `memory_budget` bytes; the condensed
+    result is float64, as `linkage` requires, so it is never copied.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors = vectors / norms
+
+    n = len(vectors)
+    condensed = np.empty(n * (n - 1) // 2, dtype=np.float64)
+    block_rows = max(1, memory_budget // (4 * max(n, 1)))
+
+    offset = 0
+    for start in range(0, n - 1, block_rows):
+        stop = min(start + block_rows, n - 1)
+        # Only the columns right of the diagonal are needed for this block
+        similarities = vectors[start:stop] @ vectors[start + 1:].T
+        np.clip(similarities, -1.0, 1.0, out=similarities)
+        for i in range(start, stop):
+            row = similarities[i - start, i - start:]
+            condensed[offset:offset + len(row)] = row
+            offset += len(row)
+
+    # In place, so the condensed matrix is never held twice
+    condensed *= -2.0
+    condensed += 2.0
+    np.maximum(condensed, 0.0, out=condensed)
+    np.sqrt(condensed, out=condensed)
+    return condensed
+
+
+def cluster_requirements(embeddings, threshold=DISTANCE_THRESHOLD, method='ward', memory_budget=DEFAULT_MEMORY_BUDGET):
+    """
+    Hierarchical clustering of requirement embeddings by cosine distance.
+    :return: An array of flat cluster numbers (starting at 1), one per embedding.
+    """
+    if len(embeddings) < 2:
+        return np.ones(len(embeddings), dtype=np.int32)
+
+    started = time.perf_counter()
+    distances = condensed_cosine_distances(embeddings, memory_budget)
+    logging.info(f"Computed {len(distances)} pairwise distances ({distances.nbytes / 1024 ** 2:.1f} MiB) "
+                 f"in {time.perf_counter() - started:.2f}s")
+
+    Z = linkage(distances, method=method)
+    del distances
+    clusters = fcluster(Z, threshold, criterion='distance')
+    logging.info(f"Clustered {len(embeddings)} requirements into {clusters.max()} clusters in {time.perf_counter() - started:.2f}s")
+    return clusters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster job requirements by the similarity of their BERT embeddings.")
+    parser.add_argument('--input', default='requirements.csv', help="CSV with 'id' and 'requirement' columns.")
+    parser.add_argument('--output', default='cluster_results.csv', help="Where to write id, requirement and cluster (read by uploading.py).")
+    parser.add_argument('--threshold', type=float, default=DISTANCE_THRESHOLD, help="Merge height at which the dendrogram is cut.")
+    parser.add_argument('--method', default='ward', choices=['ward', 'average', 'complete', 'single'], help="Linkage method.")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Requirements encoded per BERT batch.")
+    parser.add_argument('--memory-mb', type=int, default=DEFAULT_MEMORY_BUDGET // 1024 ** 2,
+                        help="Memory for each block of pairwise similarities.")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+    df['requirement'] = clean_requirements(df['requirement'])
+
+    embeddings = encode_requirements(df['requirement'].tolist(), batch_size=args.batch_size)
+    df['cluster'] = cluster_requirements(embeddings, args.threshold, args.method, args.memory_mb * 1024 ** 2)
+
+    df[['id', 'requirement', 'cluster']].to_csv(args.output, index=False)
+    print(f"Cluster assignments for {len(df)} requirements saved to '{args.output}'.")
+
+
+if __name__ == '__main__':
+    main()
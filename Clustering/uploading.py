@@ -1,22 +1,18 @@
-import psycopg2
+import os
+import sys
 import pandas as pd
 
-
-# Database connection
-conn = psycopg2.connect("dbname=epri user=isaac password=passEPRIword host=epri.cjcsqa8ckwo0.us-east-2.rds.amazonaws.com")
-cur = conn.cursor()
-
+# The shared bulk loader lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bulk_load import connect, copy_dataframe
 
 
+# Database connection
+conn = connect()
 
-for i, row in df.iterrows():
-    sql = """
-    insert into requirements_clusters1 (requirement_id, cluster)
-    values (%s, %s)
-    """
-    cur.execute(sql, tuple(row))
+# Requirement cluster assignments written by requirement_clustering.py (or cluster_summary_analysis.ipynb)
+df = pd.read_csv('cluster_results.csv')[['id', 'cluster']]
 
-conn.commit()
+copy_dataframe(conn, df, 'requirements_clusters1', columns=['requirement_id', 'cluster'])
 
-cur.close()
-conn.close()
\ No newline at end of file
+conn.close()
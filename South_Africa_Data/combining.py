@@ -1,15 +1,118 @@
-import pandas as pd
+import argparse
 import glob
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+
+FILTER_COLUMN = "Hydrogen Capabilities"
+CANONICAL_COLUMNS = ["Occupation", "Hydrogen Capabilities", "Value Chain", "Technology"]
+DEFAULT_CHUNK_SIZE = 100000
+
+
+def canonical_column(name):
+    """
+    Reconcile header variants (stray or repeated whitespace, different case) to one column name.
+    Known columns get their canonical spelling; anything else just has its whitespace collapsed.
+    """
+    name = ' '.join(str(name).split())
+    for canonical in CANONICAL_COLUMNS:
+        if name.casefold() == canonical.casefold():
+            return canonical
+    return name
+
+
+def clean_chunk(chunk):
+    """Normalize column names and cell whitespace, then drop rows without hydrogen capabilities."""
+    chunk = chunk.rename(columns=canonical_column)
+    # Every column is read as text, so strip them all
+    chunk = chunk.apply(lambda column: column.str.strip())
+
+    if FILTER_COLUMN not in chunk.columns:
+        return chunk.iloc[0:0]
+    return chunk[chunk[FILTER_COLUMN].fillna("") != ""]
+
+
+def read_file(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Parse one CSV in chunks, filtering each chunk as it is read so that only the kept rows are held in memory.
+    :return: The cleaned DataFrame and a content hash of its (order-independent) rows.
+    """
+    chunks = [clean_chunk(chunk) for chunk in pd.read_csv(path, dtype=str, chunksize=chunk_size)]
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=CANONICAL_COLUMNS)
+    df = df.reindex(columns=sorted(df.columns, key=column_order))
+
+    row_hashes = pd.util.hash_pandas_object(df, index=False).sort_values().to_numpy()
+    digest = hashlib.sha1(','.join(df.columns).encode('utf-8') + row_hashes.tobytes()).hexdigest()
+    return df, digest
+
+
+def column_order(name):
+    return (CANONICAL_COLUMNS.index(name), name) if name in CANONICAL_COLUMNS else (len(CANONICAL_COLUMNS), name)
+
+
+def combine(files, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Parse the files in parallel, skip files whose cleaned contents duplicate an earlier file,
+    concatenate everything once and drop duplicate rows.
+    """
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(read_file, files, [chunk_size] * len(files)))
+
+    frames = []
+    seen = {}
+    for path, (df, digest) in zip(files, results):
+        if digest in seen:
+            logging.info(f"Skipping {path}: same contents as {seen[digest]}")
+            continue
+        seen[digest] = path
+        frames.append(df)
+
+    if not frames:
+        return pd.DataFrame(columns=CANONICAL_COLUMNS)
+
+    combined_df = pd.concat(frames, ignore_index=True)
+    combined_df = combined_df.reindex(columns=sorted(combined_df.columns, key=column_order))
+    row_count = len(combined_df)
+    combined_df = combined_df.drop_duplicates(ignore_index=True)
+
+    logging.info(f"Combined {len(frames)} of {len(files)} files into {len(combined_df)} rows "
+                 f"({row_count - len(combined_df)} duplicate rows dropped) in {time.perf_counter() - started:.2f}s")
+    return combined_df
+
+
+def write_output(df, output):
+    """Write CSV, or Parquet when the output path ends in .parquet (needs pyarrow)."""
+    if output.endswith('.parquet'):
+        try:
+            df.to_parquet(output, index=False)
+        except ImportError:
+            raise SystemExit("Writing Parquet needs pyarrow: pip install pyarrow")
+    else:
+        df.to_csv(output, index=False)
+    logging.info(f"Wrote {output}")
+
 
-files = glob.glob("*.csv")
+def main():
+    parser = argparse.ArgumentParser(description="Combine the per-sector hydrogen capability exports into one table.")
+    parser.add_argument('patterns', nargs='*', default=["*.csv"], help="Glob patterns of the files to combine")
+    parser.add_argument('--output', default="combined_data.csv", help="Output path (.csv or .parquet)")
+    parser.add_argument('--workers', type=int, default=None, help="Number of parsing processes (defaults to the CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Rows parsed per chunk")
+    args = parser.parse_args()
 
-combined_df = pd.DataFrame()
+    output = os.path.abspath(args.output)
+    files = sorted({path for pattern in args.patterns for path in glob.glob(pattern)
+                    if os.path.abspath(path) != output})
 
-for file in files:
-    df = pd.read_csv(file)
-    combined_df = pd.concat([combined_df, df], ignore_index=True)
+    combined_df = combine(files, workers=args.workers, chunk_size=args.chunk_size)
+    write_output(combined_df, args.output)
 
-combined_df = combined_df.dropna(subset = ["Hydrogen Capabilities"])
-combined_df = combined_df[combined_df["Hydrogen Capabilities"].str.strip() != ""]
 
-combined_df.to_csv("combined_data.csv", index=False)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+import io
+import os
+import time
+import numpy as np
+import pandas as pd
+import psycopg2
+from psycopg2 import errors, sql
+from psycopg2.extras import execute_values
+
+# Point EPRI_DSN at a local container (e.g. "dbname=epri user=postgres password=password host=localhost")
+# to run the loaders against a test database instead of the RDS instance
+DEFAULT_DSN = os.environ.get(
+    'EPRI_DSN',
+    "dbname=epri user=isaac password=passEPRIword host=epri.cjcsqa8ckwo0.us-east-2.rds.amazonaws.com"
+)
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def connect(dsn=DEFAULT_DSN):
+    """Open a connection to the dashboard database."""
+    return psycopg2.connect(dsn)
+
+
+def table_identifier(table):
+    """Quote a table name, allowing an optional schema prefix ("schema.table")."""
+    return sql.Identifier(*table.split('.'))
+
+
+def report(table, rows, seconds):
+    rate = rows / seconds if seconds > 0 else float('inf')
+    print(f"Loaded {rows} rows into {table} in {seconds:.2f}s ({rate:,.0f} rows/sec)")
+
+
+def whole_floats_as_integers(df):
+    """
+    Turn float columns holding only whole numbers into nullable integers. pandas stores integer
+    columns with missing values as float64, and COPY rejects the '3.0' to_csv would write for an
+    integer column (the old parameterized INSERTs accepted it).
+    """
+    converted = df
+    for position, dtype in enumerate(df.dtypes):
+        if not pd.api.types.is_float_dtype(dtype):
+            continue
+        values = df.iloc[:, position].dropna()
+        if len(values) and (values.abs() < 2 ** 53).all() and (values == np.floor(values)).all():
+            if converted is df:
+                converted = df.copy()
+            converted.isetitem(position, df.iloc[:, position].astype('Int64'))
+    return converted
+
+
+def copy_rows(cur, df, table, columns):
+    """COPY a DataFrame into a table inside the caller's transaction (nothing is committed)."""
+    # An explicit NULL marker keeps empty strings distinct from missing values
+    statement = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '\\N')").format(
+        table_identifier(table), sql.SQL(', ').join(map(sql.Identifier, columns))
+    )
+    buffer = io.StringIO()
+    whole_floats_as_integers(df).to_csv(buffer, index=False, header=False, na_rep='\\N')
+    buffer.seek(0)
+    cur.copy_expert(statement, buffer)
+
+
+def copy_dataframe(conn, df, table, columns=None, chunk_size=DEFAULT_CHUNK_SIZE, verbose=True):
+    """
+    Stream a DataFrame into a table with COPY ... FROM STDIN, one transaction per chunk.
+    DataFrame columns are matched to the table's columns by position, like the old per-row INSERTs.
+    :param conn: An open psycopg2 connection.
+    :param df: The rows to load. NaN/None values are written as NULL.
+    :param table: The target table name.
+    :param columns: The target column names (defaults to the DataFrame's column names).
+    :param chunk_size: The number of rows sent and committed per COPY.
+    :param verbose: Whether to print the load rate.
+    :return: The number of rows loaded.
+    """
+    columns = list(columns) if columns is not None else [str(column) for column in df.columns]
+    if len(columns) != len(df.columns):
+        raise ValueError(f"{len(df.columns)} DataFrame columns cannot be loaded into {len(columns)} table columns")
+
+    started = time.perf_counter()
+    with conn.cursor() as cur:
+        for start in range(0, len(df), chunk_size):
+            try:
+                copy_rows(cur, df.iloc[start:start + chunk_size], table, columns)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    if verbose:
+        report(table, len(df), time.perf_counter() - started)
+    return len(df)
+
+
+def copy_csv(conn, csv_path, table, columns=None, chunk_size=DEFAULT_CHUNK_SIZE, **read_csv_kwargs):
+    """Stream a CSV file into a table chunk by chunk without loading the whole file into memory."""
+    started = time.perf_counter()
+    total = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size, **read_csv_kwargs):
+        total += copy_dataframe(conn, chunk, table, columns=columns, chunk_size=chunk_size, verbose=False)
+
+    report(table, total, time.perf_counter() - started)
+    return total
+
+
+def insert_dataframe(conn, df, table, columns=None, chunk_size=DEFAULT_CHUNK_SIZE, on_conflict=None):
+    """
+    Load a DataFrame with batched multi-row INSERTs, one transaction per chunk.
+    Slower than COPY, but allows an ON CONFLICT clause for idempotent upserts.
+    :param on_conflict: Optional SQL appended after VALUES, e.g. "ON CONFLICT (soc_code) DO NOTHING".
+    :return: The number of rows sent.
+    """
+    columns = list(columns) if columns is not None else [str(column) for column in df.columns]
+    statement = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
+        table_identifier(table), sql.SQL(', ').join(map(sql.Identifier, columns))
+    )
+    if on_conflict:
+        statement = sql.SQL(' ').join([statement, sql.SQL(on_conflict)])
+
+    # psycopg2 adapts None to NULL but not NaN
+    rows = list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+    started = time.perf_counter()
+    with conn.cursor() as cur:
+        for start in range(0, len(rows), chunk_size):
+            try:
+                execute_values(cur, statement.as_string(conn), rows[start:start + chunk_size], page_size=1000)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    report(table, len(rows), time.perf_counter() - started)
+    return len(rows)
+
+
+def ensure_unique_key(conn, table, key_columns):
+    """Create the unique index that ON CONFLICT upserts on `key_columns` need, if it does not exist yet."""
+    index_name = f"{table.split('.')[-1]}_{'_'.join(key_columns)}_key"
+    with conn.cursor() as cur:
+        try:
+            cur.execute(sql.SQL("CREATE UNIQUE INDEX IF NOT EXISTS {} ON {} ({})").format(
+                sql.Identifier(index_name), table_identifier(table), sql.SQL(', ').join(map(sql.Identifier, key_columns))
+            ))
+            conn.commit()
+        except errors.UniqueViolation:
+            conn.rollback()
+            raise ValueError(f"{table} already holds duplicate {', '.join(key_columns)} values; remove them before upserting")
+
+
+def upsert_dataframe(conn, df, table, key_columns, columns=None):
+    """
+    Idempotently load a DataFrame in a single transaction: COPY it into a temporary staging table,
+    then INSERT ... ON CONFLICT (key_columns) DO UPDATE into the target table.
+    Later rows win when the DataFrame repeats a key. The target needs a unique index on
+    `key_columns` (see ensure_unique_key).
+    :return: The number of rows loaded.
+    """
+    columns = list(columns) if columns is not None else [str(column) for column in df.columns]
+    staging = sql.Identifier(f"staging_{table.split('.')[-1]}")
+    column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+    key_list = sql.SQL(', ').join(map(sql.Identifier, key_columns))
+    updates = [column for column in columns if column not in key_columns]
+    conflict_action = sql.SQL("DO UPDATE SET {}").format(sql.SQL(', ').join(
+        sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(column)) for column in updates
+    )) if updates else sql.SQL("DO NOTHING")
+
+    df = df.drop_duplicates(subset=[df.columns[columns.index(key)] for key in key_columns], keep='last')
+    buffer = io.StringIO()
+    whole_floats_as_integers(df).to_csv(buffer, index=False, header=False, na_rep='\\N')
+    buffer.seek(0)
+
+    started = time.perf_counter()
+    with conn.cursor() as cur:
+        try:
+            cur.execute(sql.SQL("CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP").format(staging, table_identifier(table)))
+            cur.copy_expert(sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '\\N')").format(staging, column_list), buffer)
+            cur.execute(sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {} ON CONFLICT ({}) {}").format(
+                table_identifier(table), column_list, column_list, staging, key_list, conflict_action
+            ))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    report(table, len(df), time.perf_counter() - started)
+    return len(df)
@@ -1,88 +1,69 @@
-import requests
-import psycopg2
+import os
+import sys
 import json
-import pandas as pd
+from onet_client import NOT_FOUND, ONET_API_BASE_URL, OnetClient
+from response_cache import ResponseCache
+from ingestion import ingest_soc_codes
 
-# Replace these with your own O*NET credentials
-ONET_USERNAME = 'epri'
-ONET_PASSWORD = '5977jrb'
+# The shared bulk loader lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bulk_load import connect
 
-# Define the base URL for the O*NET API
-ONET_API_BASE_URL = "https://services.onetcenter.org/ws/"
-
-# Function to fetch data from O*NET API
-def fetch_onet_data(url, params=None):
-    headers = {
-        'Authorization': 'Basic ZXByaTo1OTc3anJi',  # Base64 encoded credentials
-        'Accept': 'application/json'
-    }
-    print(f"Requesting URL: {url} with params: {params}")
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code == 200:
-        print(f"Success for URL: {url}")
-        return response.json()
-    else:
-        print(f"Error fetching data for URL {url}: {response.status_code} {response.reason}")
-        print(f"Response content: {response.text}")
-        return None
+# Pooled, rate-limited O*NET client (holds the auth header) backed by the local response cache
+client = OnetClient(cache=ResponseCache())
 
 # Database connection
-conn = psycopg2.connect("dbname=epri user=isaac password=passEPRIword host=epri.cjcsqa8ckwo0.us-east-2.rds.amazonaws.com")
-cur = conn.cursor()
+conn = connect()
 
-# Function to insert data into the database
-def insert_data_into_db(soc_code, occupation, abilities, interests, work_values, skills, knowledge, work_context, technology, education, job_outlook):
-    cur.execute("""
-        INSERT INTO onet_data1 (soc_code, core_occupation, abilities, interests, work_values, skills, knowledge, work_context, technology, education, job_outlook)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (soc_code, occupation, json.dumps(abilities), json.dumps(interests), json.dumps(work_values), json.dumps(skills), json.dumps(knowledge), json.dumps(work_context), json.dumps(technology), json.dumps(education), json.dumps(job_outlook)))
-    conn.commit()
+ONET_DATA1_COLUMNS = ['soc_code', 'core_occupation', 'abilities', 'interests', 'work_values', 'skills', 'knowledge', 'work_context', 'technology', 'education', 'job_outlook']
 
-# New SOC codes
-new_soc_codes = ["49-9043", "51-8021", "49-9052", "53-6051", "17-2061", "53-6099", "53-1043"]
+# Detail documents fetched for each career, in the column order of onet_data1
+DETAIL_SECTIONS = ['abilities', 'personality', 'work_values', 'skills', 'knowledge', 'work_context', 'technology', 'education', 'job_outlook']
 
-# Fetch and insert data for each SOC code
-for soc_code in new_soc_codes:
+def fetch_careers(soc_codes):
+    """Search for the careers matching a batch of SOC codes and fetch all of their details concurrently."""
     search_url = ONET_API_BASE_URL + "mnm/search"
-    params = {'keyword': soc_code}
-    search_response = fetch_onet_data(search_url, params)
-    if search_response and 'career' in search_response:
-        for career in search_response['career']:
-            career_url = career['href']
-            career_data = fetch_onet_data(career_url)
-            if career_data:
-                occupation = career_data.get('title', None)
+    search_responses = client.fetch_many([search_url] * len(soc_codes), [{'keyword': soc_code} for soc_code in soc_codes])
+
+    results = {}
+    careers = []
+    for soc_code, search_response in zip(soc_codes, search_responses):
+        if search_response is None:
+            results[soc_code] = None
+            continue
+        results[soc_code] = []
+        for career in (search_response or {}).get('career', []):
+            careers.append((soc_code, career['href']))
 
-                # Fetch detailed data
-                abilities_url = career_url + '/abilities'
-                abilities = fetch_onet_data(abilities_url)
-                
-                interests_url = career_url + '/personality'
-                interests = fetch_onet_data(interests_url)
-                
-                work_values_url = career_url + '/work_values'
-                work_values = fetch_onet_data(work_values_url)
-                
-                skills_url = career_url + '/skills'
-                skills = fetch_onet_data(skills_url)
-                
-                knowledge_url = career_url + '/knowledge'
-                knowledge = fetch_onet_data(knowledge_url)
-                
-                work_context_url = career_url + '/work_context'
-                work_context = fetch_onet_data(work_context_url)
+    # Fetch each career and all of its detail documents in one concurrent pass
+    urls = [career_url + suffix for _, career_url in careers for suffix in [''] + [f'/{section}' for section in DETAIL_SECTIONS]]
+    documents = client.fetch_many(urls)
+    documents_per_career = len(DETAIL_SECTIONS) + 1
 
-                technology_url = career_url + '/technology'
-                technology = fetch_onet_data(technology_url)
+    for index, (soc_code, career_url) in enumerate(careers):
+        career_data, *details = documents[index * documents_per_career:(index + 1) * documents_per_career]
+        if results[soc_code] is None:
+            continue
+        # A failed fetch leaves the whole SOC code unfinished, so the journal retries it next run;
+        # a career or section the API does not have is skipped or stored as NULL
+        if career_data is None or any(detail is None for detail in details):
+            results[soc_code] = None
+            continue
+        if career_data is NOT_FOUND:
+            continue
+        # core_occupation is part of the upsert key, and NULL keys never conflict, so an untitled
+        # career falls back to its O*NET career code (the last part of its URL)
+        occupation = career_data.get('title') or career_url.rstrip('/').rsplit('/', 1)[-1]
+        results[soc_code].append((soc_code, occupation, *[None if detail is NOT_FOUND else json.dumps(detail) for detail in details]))
 
-                education_url = career_url + '/education'
-                education = fetch_onet_data(education_url)
+    return results
+
+# New SOC codes
+new_soc_codes = ["49-9043", "51-8021", "49-9052", "53-6051", "17-2061", "53-6099", "53-1043"]
 
-                job_outlook_url = career_url + '/job_outlook'
-                job_outlook = fetch_onet_data(job_outlook_url)
-                
-                insert_data_into_db(soc_code, occupation, abilities, interests, work_values, skills, knowledge, work_context, technology, education, job_outlook)
+# Fetch and upsert in checkpointed batches; a search can return several careers per SOC code
+ingest_soc_codes(conn, new_soc_codes, fetch_careers, 'onet_data1', ONET_DATA1_COLUMNS, key_columns=('soc_code', 'core_occupation'))
 
-# Close the database connection
-cur.close()
+# Close the database connection and the HTTP session
 conn.close()
+client.close()
@@ -0,0 +1,73 @@
+import os
+import sys
+import pandas as pd
+
+# The shared bulk loader lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bulk_load import ensure_unique_key, upsert_dataframe
+
+DEFAULT_BATCH_SIZE = 50
+JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
+
+class CheckpointJournal:
+    """
+    Append-only record of SOC codes whose rows are committed to the database.
+    A code is only written after its batch's transaction commits, so a crashed run can
+    resume from the journal; delete the journal file to ingest everything again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.completed = set()
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                self.completed = {line.strip() for line in file if line.strip()}
+
+    def record(self, soc_codes):
+        with open(self.path, 'a') as file:
+            file.writelines(f"{soc_code}\n" for soc_code in soc_codes)
+            file.flush()
+            os.fsync(file.fileno())
+        self.completed.update(soc_codes)
+
+
+def journal_for(table):
+    """Default journal location for a target table."""
+    return CheckpointJournal(os.path.join(JOURNAL_DIR, f"{table}.journal"))
+
+
+def ingest_soc_codes(conn, soc_codes, fetch_rows, table, columns, key_columns=('soc_code',), journal=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Fetch and load occupations in batches, one transaction per batch, skipping SOC codes the
+    journal already records as loaded. Rows are upserted on `key_columns`, so re-running a batch
+    that committed just before a crash does not create duplicates. SOC codes whose fetch failed
+    are left out of the journal and retried on the next run.
+    :param conn: An open psycopg2 connection.
+    :param soc_codes: Every SOC code to ingest.
+    :param fetch_rows: A function mapping a list of SOC codes to a dict of {soc_code: list of row tuples},
+                       with None for codes that could not be fetched.
+    :param table: The target table.
+    :param columns: The table columns of each row tuple.
+    :param key_columns: The columns identifying a row for the upsert.
+    :param journal: The CheckpointJournal to resume from (defaults to one per table).
+    :param batch_size: The number of SOC codes fetched and committed together.
+    """
+    journal = journal if journal is not None else journal_for(table)
+    pending = [soc_code for soc_code in dict.fromkeys(soc_codes) if str(soc_code) not in journal.completed]
+    print(f"{len(soc_codes) - len(pending)} SOC codes already loaded into {table}, {len(pending)} to go")
+
+    ensure_unique_key(conn, table, list(key_columns))
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        fetched = fetch_rows(batch)
+        rows = [row for soc_rows in fetched.values() if soc_rows for row in soc_rows]
+        if rows:
+            upsert_dataframe(conn, pd.DataFrame(rows, columns=columns), table, list(key_columns))
+
+        completed = [str(soc_code) for soc_code in batch if fetched.get(soc_code) is not None]
+        journal.record(completed)
+        failed = len(batch) - len(completed)
+        print(f"Checkpoint: {start + len(batch)}/{len(pending)} SOC codes processed for {table}" + (f" ({failed} failed, will retry next run)" if failed else ""))
@@ -0,0 +1,175 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from response_cache import ResponseCache
+
+# Replace these with your own O*NET credentials
+ONET_USERNAME = 'epri'
+ONET_PASSWORD = '5977jrb'
+
+# Define the base URL for the O*NET API
+ONET_API_BASE_URL = "https://services.onetcenter.org/ws/"
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_REQUESTS_PER_SECOND = 10
+DEFAULT_MAX_RETRIES = 5
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Statuses meaning the document does not exist; fetching it again will not help
+NOT_FOUND_STATUS_CODES = {404, 410}
+
+
+class NotFound:
+    """What `fetch` returns for a document the API says does not exist (falsy, unlike a successful fetch)."""
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return 'NOT_FOUND'
+
+
+NOT_FOUND = NotFound()
+
+# Set ONET_OFFLINE=1 to serve every request from the response cache without touching the network
+OFFLINE = os.environ.get('ONET_OFFLINE', '') not in ('', '0')
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` requests per second with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class OnetClient:
+    """
+    O*NET web services client shared by the jobs_api_onet scripts.
+    One keep-alive session (with the auth header) is reused for every request, a client-side
+    rate limiter keeps us under the API's limits, and 429/5xx responses are retried with
+    exponential backoff. `fetch_many` runs requests concurrently on a bounded thread pool.
+    With a ResponseCache, fresh responses are served locally and expired ones are revalidated
+    with conditional requests; in offline mode only the cache is used.
+    """
+
+    def __init__(self, username=ONET_USERNAME, password=ONET_PASSWORD, max_workers=DEFAULT_MAX_WORKERS,
+                 requests_per_second=DEFAULT_REQUESTS_PER_SECOND, max_retries=DEFAULT_MAX_RETRIES, backoff=1.0,
+                 cache=None, offline=OFFLINE):
+        self.cache = cache
+        self.offline = offline
+        if offline and cache is None:
+            raise ValueError("Offline mode needs a response cache")
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limiter = RateLimiter(requests_per_second)
+
+        self.session = requests.Session()
+        self.session.auth = (username, password)
+        self.session.headers.update({'Accept': 'application/json'})
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get(self, url, params=None, headers=None):
+        """Send a rate-limited GET, retrying throttled and server-error responses. Returns the final response."""
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=30)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                if attempt == self.max_retries:
+                    raise
+                print(f"Retrying URL {url} after {error.__class__.__name__}")
+                self._sleep_before_retry(attempt)
+                continue
+
+            if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                return response
+
+            print(f"Retrying URL {url} after {response.status_code} {response.reason}")
+            self._sleep_before_retry(attempt, response.headers.get('Retry-After'))
+
+    def _sleep_before_retry(self, attempt, retry_after=None):
+        if retry_after is not None and retry_after.isdigit():
+            time.sleep(int(retry_after))
+        else:
+            time.sleep(self.backoff * 2 ** attempt + random.uniform(0, self.backoff))
+
+    def fetch(self, url, params=None):
+        """
+        Fetch a JSON document.
+        :return: The decoded document; NOT_FOUND if the API answered 404 or 410; None (after printing
+                 the error) if the request failed and is worth retrying later.
+        """
+        cached = self.cache.get(url, params) if self.cache is not None else None
+        if cached is not None and (cached.fresh or self.offline):
+            print(f"Cache hit for URL: {url}")
+            return cached.json()
+        if self.offline:
+            print(f"Offline: no cached response for URL {url} with params: {params}")
+            return None
+
+        print(f"Requesting URL: {url} with params: {params}")
+        try:
+            response = self.get(url, params=params, headers=ResponseCache.validators(cached) if cached else None)
+        except requests.RequestException as error:
+            print(f"Error fetching data for URL {url}: {error}")
+            return None
+
+        if response.status_code == 304 and cached is not None:
+            print(f"Not modified: {url}")
+            self.cache.refresh(url, params)
+            return cached.json()
+
+        if response.status_code == 200:
+            print(f"Success for URL: {url}")
+            if self.cache is not None:
+                self.cache.put(url, params, response.text, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            return response.json()
+        elif response.status_code in NOT_FOUND_STATUS_CODES:
+            print(f"Not found: {url}")
+            return NOT_FOUND
+        else:
+            print(f"Error fetching data for URL {url}: {response.status_code} {response.reason}")
+            print(f"Response content: {response.text}")
+            return None
+
+    def fetch_many(self, urls, params=None):
+        """
+        Fetch many JSON documents concurrently.
+        :param urls: The URLs to fetch.
+        :param params: Optional list of query parameter dicts, one per URL.
+        :return: The decoded documents (NOT_FOUND for missing ones, None for failures) in the order of `urls`.
+        """
+        params = params if params is not None else [None] * len(urls)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self.fetch, urls, params))
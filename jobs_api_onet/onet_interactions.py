@@ -1,59 +1,27 @@
-import requests
-import psycopg2
-import json
+import os
+import sys
 import pandas as pd
-import base64
 from urllib.parse import urljoin
+from onet_client import ONET_API_BASE_URL, OnetClient
+from response_cache import ResponseCache
+from ingestion import ingest_soc_codes
 
-# Replace these with your own O*NET credentials
-ONET_USERNAME = 'epri'
-ONET_PASSWORD = '5977jrb'
+# The shared bulk loader lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bulk_load import connect
 
-# Define the base URL for the O*NET API
-ONET_API_BASE_URL = "https://services.onetcenter.org/ws/"
-
-# Encode credentials dynamically
-credentials = f"{ONET_USERNAME}:{ONET_PASSWORD}"
-encoded_credentials = base64.b64encode(credentials.encode()).decode()
-
-# Function to fetch data from O*NET API
-def fetch_onet_data(url, params=None):
-    headers = {
-        'Authorization': f'Basic {encoded_credentials}',
-        'Accept': 'application/json'
-    }
-    print(f"Requesting URL: {url} with params: {params}")
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code == 200:
-        print(f"Success for URL: {url}")
-        return response.json()
-    else:
-        print(f"Error fetching data for URL {url}: {response.status_code} {response.reason}")
-        print(f"Response content: {response.text}")
-        return None
+# Pooled, rate-limited O*NET client (holds the auth header) backed by the local response cache
+client = OnetClient(cache=ResponseCache())
 
 # Database connection
+conn = connect()
 
-conn = psycopg2.connect("dbname=epri user=isaac password=passEPRIword host=epri.cjcsqa8ckwo0.us-east-2.rds.amazonaws.com")
-cur = conn.cursor()
-
-# Function to insert data into the database
-def insert_data_into_db(soc_code, occupation, description, complete_tasks, complete_education):
-    cur.execute("""
-        INSERT INTO onet_data3 (soc_code, core_occupation, base_job, tasks, qualifications)
-        VALUES (%s, %s, %s, %s, %s)
-        """, (soc_code, occupation, description, complete_tasks, complete_education))
-    conn.commit()
-
-# Load SOC codes from CSV
-csv_file_path = './h2_SOC_map.csv'  # Update with your actual file path
-soc_codes_df = pd.read_csv(csv_file_path)
-soc_codes = soc_codes_df['SOC_code'].tolist()
+ONET_DATA3_COLUMNS = ['soc_code', 'core_occupation', 'base_job', 'tasks', 'qualifications']
 
-# Fetch and insert data for each SOC code
-for soc_code in soc_codes:
-    search_url = urljoin(ONET_API_BASE_URL, f"online/occupations/{soc_code}.00/details")
-    search_response = fetch_onet_data(search_url)
+def parse_occupation_details(soc_code, search_response):
+    """Turn an occupation details document into an onet_data3 row."""
+    occupation = None
+    description = None
     complete_tasks = []
     complete_education = []
     if search_response and 'occupation' in search_response:
@@ -73,8 +41,28 @@ for soc_code in soc_codes:
             complete_education.append(f"{education.get('name', 'NULL')} ({education.get('score', {}).get('value', '')}%)")
 
     #print(f"{soc_code}\n{occupation}\n\n{''.join(complete_tasks)}\n\n{', '.join(complete_education)}")
-    insert_data_into_db(soc_code, occupation, description, '<new_task>'.join(complete_tasks), ', '.join(complete_education))
+    return (soc_code, occupation, description, '<new_task>'.join(complete_tasks), ', '.join(complete_education))
+
+def fetch_occupations(soc_codes):
+    """
+    Fetch the details for a batch of SOC codes concurrently. An occupation the API does not have
+    still gets its (empty) row, so only failed fetches are left for the next run.
+    """
+    detail_urls = [urljoin(ONET_API_BASE_URL, f"online/occupations/{soc_code}.00/details") for soc_code in soc_codes]
+    detail_responses = client.fetch_many(detail_urls)
+    return {
+        soc_code: [parse_occupation_details(soc_code, response)] if response is not None else None
+        for soc_code, response in zip(soc_codes, detail_responses)
+    }
+
+# Load SOC codes from CSV
+csv_file_path = './h2_SOC_map.csv'  # Update with your actual file path
+soc_codes_df = pd.read_csv(csv_file_path)
+soc_codes = soc_codes_df['SOC_code'].tolist()
+
+# Fetch and upsert in checkpointed batches; an interrupted run resumes where it stopped
+ingest_soc_codes(conn, soc_codes, fetch_occupations, 'onet_data3', ONET_DATA3_COLUMNS)
 
-# Close the database connection
-cur.close()
+# Close the database connection and the HTTP session
 conn.close()
+client.close()
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    'ONET_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'onet_responses.sqlite')
+)
+DEFAULT_TTL = 30 * 24 * 60 * 60  # O*NET data changes rarely; revalidate responses after 30 days
+
+
+def request_key(url, params=None):
+    """Cache key for a GET request: the URL plus its query parameters in a stable order."""
+    canonical = json.dumps([url, sorted((params or {}).items())], default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class CachedResponse:
+    def __init__(self, body, etag, last_modified, expires_at):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+    @property
+    def fresh(self):
+        return time.time() < self.expires_at
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class ResponseCache:
+    """
+    Persistent cache of successful GET responses, stored zlib-compressed in SQLite.
+    Entries expire after `ttl` seconds; expired entries keep their ETag/Last-Modified validators
+    so they can be revalidated with a conditional request instead of re-downloaded.
+    Each thread gets its own connection, so the cache can be shared by a thread pool.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self.local.conn = conn
+        return conn
+
+    def get(self, url, params=None):
+        """Return the CachedResponse for a request (fresh or expired), or None if it was never cached."""
+        row = self._connection().execute(
+            'SELECT body, etag, last_modified, expires_at FROM responses WHERE key = ?', (request_key(url, params),)
+        ).fetchone()
+        if row is None:
+            return None
+        body, etag, last_modified, expires_at = row
+        return CachedResponse(zlib.decompress(body).decode('utf-8'), etag, last_modified, expires_at)
+
+    def put(self, url, params, body, etag=None, last_modified=None):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (request_key(url, params), url, zlib.compress(body.encode('utf-8')), etag, last_modified, now, now + self.ttl)
+            )
+
+    def refresh(self, url, params=None):
+        """Extend an entry's lifetime after the server confirmed it is unchanged (304)."""
+        with self._connection() as conn:
+            conn.execute('UPDATE responses SET expires_at = ? WHERE key = ?', (time.time() + self.ttl, request_key(url, params)))
+
+    @staticmethod
+    def validators(cached):
+        """Conditional request headers for revalidating an expired entry."""
+        headers = {}
+        if cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+        return headers
@@ -1,34 +1,9 @@
-import requests
-import json
-import base64
 from urllib.parse import urljoin
+from onet_client import ONET_API_BASE_URL, OnetClient
+from response_cache import ResponseCache
 
-# Replace these with your own O*NET credentials
-ONET_USERNAME = 'epri'
-ONET_PASSWORD = '5977jrb'
-
-# Define the base URL for the O*NET API
-ONET_API_BASE_URL = "https://services.onetcenter.org/ws/"
-
-# Encode credentials dynamically
-credentials = f"{ONET_USERNAME}:{ONET_PASSWORD}"
-encoded_credentials = base64.b64encode(credentials.encode()).decode()
-
-# Function to fetch data from O*NET API
-def fetch_onet_data(url, params=None):
-    headers = {
-        'Authorization': f'Basic {encoded_credentials}',
-        'Accept': 'application/json'
-    }
-    print(f"Requesting URL: {url} with params: {params}")
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code == 200:
-        print(f"Success for URL: {url}")
-        return response.json()
-    else:
-        print(f"Error fetching data for URL {url}: {response.status_code} {response.reason}")
-        print(f"Response content: {response.text}")
-        return None
+# O*NET client backed by the local response cache
+client = OnetClient(cache=ResponseCache())
 
 # SOC codes for testing
 
@@ -36,7 +11,7 @@ soc_code = "17-2041.00"
 
 # Search for careers related to the SOC code
 search_url = urljoin(ONET_API_BASE_URL, f"online/occupations/{soc_code}/details")
-search_response = fetch_onet_data(search_url)
+search_response = client.fetch(search_url)
 
 complete_tasks = []
 complete_education = []
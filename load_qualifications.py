@@ -0,0 +1,180 @@
+import argparse
+import os
+import re
+import time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from psycopg2 import sql
+from bulk_load import connect, copy_rows, report, table_identifier
+from text_normalization import QUALIFICATIONS
+
+# A country dataset: the file its rows come from, the column holding the bulleted qualifications, and the
+# tables it is loaded into. `id_column` is kept as old_id when the source has its own IDs.
+# Every dataset shares the qualifications table, so equal qualifications get the same ID across countries.
+Dataset = namedtuple('Dataset', ['path', 'qualifications_column', 'bullet', 'id_column', 'table', 'join_table', 'join_id_column'])
+
+DATASETS = {
+    # The canada_data -> canada_data2 / qualifications / canada_data_qualifications normalization of queries.sql.bak
+    'canada': Dataset('Canada_Data.csv', 'typical_qualifications', '•', 'id',
+                      'canada_data2', 'canada_data_qualifications', 'canada_data_id'),
+    'australia': Dataset('Austrailia_Report_COMPLETE.csv', 'Qualifications & Memberships', '●', None,
+                         'australia_data', 'australia_data_qualifications', 'australia_data_id'),
+}
+
+QUALIFICATIONS_TABLE = 'qualifications'
+
+
+def column_name(name):
+    """Table column name for a source column, e.g. 'Base/Current Job Role Description' -> 'base_current_job_role_description'."""
+    return re.sub(r'[^0-9a-z]+', '_', str(name).lower()).strip('_')
+
+
+def read_dataset(path):
+    if os.path.splitext(path)[1].lower() in ('.xlsx', '.xls'):
+        return pd.read_excel(path)
+    return pd.read_csv(path)
+
+
+def split_qualifications(values, bullet):
+    """
+    Split bulleted cells into one row per qualification, cleaned exactly like the old SQL (see
+    SqlQualificationNormalizer), so existing qualifications keep their IDs; empty pieces and repeats
+    within a row are dropped.
+    :param values: The qualifications cells, indexed by row ID.
+    :return: A DataFrame with 'row_id' and 'qualification' columns.
+    """
+    pieces = values.dropna().astype(str).str.split(bullet, regex=False).explode()
+    cleaned = QUALIFICATIONS.normalize_series(pieces.dropna())
+    pairs = pd.DataFrame({'row_id': cleaned.index, 'qualification': cleaned.to_numpy()})
+    return pairs.loc[pairs['qualification'] != ''].drop_duplicates(ignore_index=True)
+
+
+def encode_qualifications(qualifications, known):
+    """
+    Dictionary-encode qualifications against the IDs already in the database.
+    :param qualifications: A Series of qualification texts.
+    :param known: A DataFrame of existing ('id', 'qualification') rows.
+    :return: (an array with the ID of every qualification, a DataFrame of the new dimension rows)
+    """
+    codes, uniques = pd.factorize(qualifications)
+    ids = pd.Index(known['qualification']).get_indexer(uniques)
+    ids = np.where(ids >= 0, known['id'].to_numpy()[ids] if len(known) else 0, 0).astype(np.int64)
+
+    # Unseen qualifications continue the existing numbering
+    new = ids == 0
+    first_id = int(known['id'].max()) + 1 if len(known) else 1
+    ids[new] = np.arange(first_id, first_id + new.sum())
+    return ids[codes], pd.DataFrame({'id': ids[new], 'qualification': np.asarray(uniques)[new]})
+
+
+def ensure_qualification_keys(cur):
+    """
+    Add the primary key on id and the unique qualification that loading relies on, when the shared
+    qualifications table lacks them (queries.sql.bak creates it with a bare `id serial`).
+    """
+    cur.execute(
+        "SELECT a.attname FROM pg_index i JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0] "
+        "WHERE i.indrelid = %s::regclass AND i.indisunique AND i.indnkeyatts = 1", [QUALIFICATIONS_TABLE])
+    unique_columns = {column for column, in cur.fetchall()}
+    qualifications_table = table_identifier(QUALIFICATIONS_TABLE)
+    if 'id' not in unique_columns:
+        cur.execute(sql.SQL("ALTER TABLE {} ADD PRIMARY KEY (id)").format(qualifications_table))
+    if 'qualification' not in unique_columns:
+        cur.execute(sql.SQL("ALTER TABLE {} ADD UNIQUE (qualification)").format(qualifications_table))
+
+
+def load_dataset(conn, dataset, df):
+    """
+    Replace a dataset's tables with the rows of `df` in one transaction: the data table, new entries
+    of the shared qualifications table, and the join table.
+    Indexes are built after the COPYs.
+    :return: (data rows, new qualifications, join rows)
+    """
+    started = time.perf_counter()
+    df = df.reset_index(drop=True)
+    row_ids = pd.RangeIndex(1, len(df) + 1)
+    pairs = split_qualifications(df[dataset.qualifications_column].set_axis(row_ids), dataset.bullet)
+
+    data = df.copy()
+    if dataset.id_column is not None:
+        data = data.rename(columns={dataset.id_column: 'old_id'})
+    data.columns = [column if column == 'old_id' else column_name(column) for column in data.columns]
+    data.insert(0, 'id', row_ids)
+
+    column_types = [sql.SQL("{} bigint").format(sql.Identifier(column)) if column in ('id', 'old_id')
+                    else sql.SQL("{} varchar").format(sql.Identifier(column)) for column in data.columns]
+    table, join_table = table_identifier(dataset.table), table_identifier(dataset.join_table)
+    qualifications_table = table_identifier(QUALIFICATIONS_TABLE)
+    join_id = sql.Identifier(dataset.join_id_column)
+
+    with conn.cursor() as cur:
+        try:
+            cur.execute(sql.SQL(
+                "CREATE TABLE IF NOT EXISTS {} (id bigint PRIMARY KEY, qualification varchar NOT NULL UNIQUE CHECK (qualification <> ''))"
+            ).format(qualifications_table))
+            ensure_qualification_keys(cur)
+            cur.execute(sql.SQL("SELECT id, qualification FROM {}").format(qualifications_table))
+            known = pd.DataFrame(cur.fetchall(), columns=['id', 'qualification'])
+
+            qualification_ids, new_qualifications = encode_qualifications(pairs['qualification'], known)
+            join_rows = pd.DataFrame({'data_id': pairs['row_id'].to_numpy(), 'qualifications_id': qualification_ids})
+            copy_rows(cur, new_qualifications, QUALIFICATIONS_TABLE, ['id', 'qualification'])
+            # IDs are assigned here, so move a serial id's sequence past them for inserts made elsewhere
+            cur.execute("SELECT pg_get_serial_sequence(%s, 'id')", [QUALIFICATIONS_TABLE])
+            sequence = cur.fetchone()[0]
+            if sequence is not None:
+                cur.execute(sql.SQL("SELECT setval(%s, max(id)) FROM {}").format(qualifications_table), [sequence])
+
+            # The dataset's own tables are rebuilt from scratch, with indexes created once the rows are in
+            cur.execute(sql.SQL("DROP TABLE IF EXISTS {}, {}").format(join_table, table))
+            cur.execute(sql.SQL("CREATE TABLE {} ({})").format(table, sql.SQL(', ').join(column_types)))
+            cur.execute(sql.SQL("CREATE TABLE {} ({} bigint NOT NULL, qualifications_id bigint NOT NULL)").format(join_table, join_id))
+            copy_rows(cur, data, dataset.table, list(data.columns))
+            copy_rows(cur, join_rows, dataset.join_table, [dataset.join_id_column, 'qualifications_id'])
+
+            cur.execute(sql.SQL("ALTER TABLE {} ADD PRIMARY KEY (id)").format(table))
+            cur.execute(sql.SQL("ALTER TABLE {} ADD PRIMARY KEY ({}, qualifications_id)").format(join_table, join_id))
+            cur.execute(sql.SQL("CREATE INDEX ON {} (qualifications_id)").format(join_table))
+            cur.execute(sql.SQL("ALTER TABLE {} ADD FOREIGN KEY ({}) REFERENCES {} (id)").format(join_table, join_id, table))
+            cur.execute(sql.SQL("ALTER TABLE {} ADD FOREIGN KEY (qualifications_id) REFERENCES {} (id)").format(
+                join_table, qualifications_table))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    # Fresh planner statistics, so the first joins against the reloaded tables are planned well
+    with conn.cursor() as cur:
+        for name in (QUALIFICATIONS_TABLE, dataset.table, dataset.join_table):
+            cur.execute(sql.SQL("ANALYZE {}").format(table_identifier(name)))
+    conn.commit()
+
+    report(f"{dataset.table}, {QUALIFICATIONS_TABLE} and {dataset.join_table}",
+           len(data) + len(new_qualifications) + len(join_rows), time.perf_counter() - started)
+    return len(data), len(new_qualifications), len(join_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load a country dataset with its qualifications normalized into a shared table.")
+    parser.add_argument('dataset', choices=sorted(DATASETS), help="Which dataset to (re)load.")
+    parser.add_argument('--path', help="Source file (.csv or .xlsx); defaults to the dataset's usual file.")
+    parser.add_argument('--dry-run', action='store_true', help="Only split and count the qualifications.")
+    args = parser.parse_args()
+
+    dataset = DATASETS[args.dataset]
+    df = read_dataset(args.path or dataset.path)
+
+    if args.dry_run:
+        pairs = split_qualifications(df[dataset.qualifications_column].reset_index(drop=True), dataset.bullet)
+        print(f"{len(df)} rows, {len(pairs)} row/qualification pairs, {pairs['qualification'].nunique()} distinct qualifications")
+        return
+
+    conn = connect()
+    rows, new, links = load_dataset(conn, dataset, df)
+    conn.close()
+    print(f"{rows} rows into {dataset.table}, {new} new qualifications, {links} links in {dataset.join_table}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+import argparse
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+
+# Typographic characters and their plain ASCII equivalents
+SMART_CHARACTERS = {
+    '‘': "'", '’': "'", '‚': "'", '′': "'",
+    '“': '"', '”': '"', '„': '"', '″': '"',
+    '–': '-', '—': '-', '‐': '-', '‑': '-',
+    '…': '...',
+}
+
+# Invisible formatting characters, dropped outright
+FORMAT_CHARACTERS = '­​‌‍‎‏‪‫‬‭‮⁠⁡⁢⁣⁤﻿'
+
+# Punctuation the requirement clustering removes (after smart characters become ASCII)
+REQUIREMENT_PUNCTUATION = ',;().\'"!?:-/&><=+*%^@#$~`•'
+
+NON_NULL_SEPARATOR = ' <br>  '
+
+_WHITESPACE = re.compile(r'\s+')
+_SPACES = re.compile(r'[^\S\n]+')
+_LINE_BREAKS = re.compile(r'\s*\n\s*')
+_WHITESPACE_RUNS = re.compile(r'\s\s+')
+
+
+class TextNormalizer:
+    """
+    Cleans text in a single pass per distinct value: one `str.translate` table handles control
+    characters, smart quotes and dashes and removed characters together, then one compiled regex
+    collapses whitespace. The cost does not grow with the number of characters being replaced.
+    """
+
+    def __init__(self, lower=False, remove='', spaces='', keep_newlines=False):
+        """
+        :param lower: Whether to case-fold the text.
+        :param remove: Characters to delete (smart characters are mapped to ASCII before this applies).
+        :param spaces: Characters to treat as whitespace.
+        :param keep_newlines: Keep line breaks (e.g. between bullet points) instead of turning them into spaces.
+        """
+        self.lower = lower
+        self.keep_newlines = keep_newlines
+
+        table = {code: ' ' for code in list(range(0x00, 0x20)) + list(range(0x7f, 0xa0))}
+        if keep_newlines:
+            table[ord('\n')] = '\n'
+            table[ord('\r')] = '\n'
+        table.update({ord(character): None for character in FORMAT_CHARACTERS})
+        for character, replacement in SMART_CHARACTERS.items():
+            table[ord(character)] = ''.join(part for part in replacement if part not in remove)
+        table.update({ord(character): None for character in remove})
+        table.update({ord(character): ' ' for character in spaces})
+        self.table = table
+
+    def normalize(self, text):
+        if self.lower:
+            text = text.casefold()
+        text = text.translate(self.table)
+        if self.keep_newlines:
+            # Blank lines and spaces around line breaks collapse into a single line break
+            return _LINE_BREAKS.sub('\n', _SPACES.sub(' ', text)).strip()
+        return _WHITESPACE.sub(' ', text).strip()
+
+    def normalize_series(self, series):
+        """Normalize a column of text; repeated values are cleaned once, missing values stay missing."""
+        codes, uniques = pd.factorize(series)
+        cleaned = np.array([self.normalize(str(value)) for value in uniques] + [np.nan], dtype=object)
+        return pd.Series(cleaned[codes], index=series.index, name=series.name)
+
+
+class SqlQualificationNormalizer(TextNormalizer):
+    """
+    The qualification cleanup of queries.sql.bak, transform for transform, so qualifications the SQL
+    already stored are matched exactly: spaces are trimmed, line breaks, tabs and '+' become spaces,
+    runs of whitespace collapse into one space and a leading space is dropped. Quotes, dashes and
+    invisible characters are left alone.
+    """
+
+    def __init__(self, spaces='\r\n\t+'):
+        self.table = {ord(character): ' ' for character in spaces}
+
+    def normalize(self, text):
+        text = text.strip(' ').translate(self.table)
+        return _WHITESPACE_RUNS.sub(' ', text).removeprefix(' ')
+
+
+# Lower-cased requirement text without punctuation, as the requirement clustering uses it
+REQUIREMENTS = TextNormalizer(lower=True, remove=REQUIREMENT_PUNCTUATION)
+
+# Free text from the country reports: whitespace, quotes and control characters only
+REPORT_TEXT = TextNormalizer()
+
+# Single qualifications split out of a bulleted cell; '+' joined alternatives in the Canadian data
+QUALIFICATIONS = SqlQualificationNormalizer()
+
+PROFILES = {'requirements': REQUIREMENTS, 'text': REPORT_TEXT, 'bullets': TextNormalizer(keep_newlines=True),
+            'qualifications': QUALIFICATIONS}
+
+
+def column_label(column):
+    # Column names are written the way str() of a list of names rendered them in reformat.ipynb
+    return repr(str(column)).replace('[', '').replace(']', '').replace('\'', '').replace(',', ' <br> ')
+
+
+def non_null_columns(df, exclude=()):
+    """
+    For every row, the names of the columns holding a value, joined with ' <br> ' (as reformat.ipynb
+    formatted them). Rows are grouped by their pattern of missing values, so each distinct
+    pattern is formatted once.
+    """
+    columns = [column for column in df.columns if column not in set(exclude)]
+    if not columns:
+        return pd.Series('', index=df.index, name='Non_NaN_Columns')
+
+    mask = df[columns].notna().to_numpy()
+    if len(columns) < 63:
+        # Each row's pattern as the bits of one integer
+        inverse, keys = pd.factorize(mask.astype(np.int64) @ (np.int64(1) << np.arange(len(columns), dtype=np.int64)))
+        patterns = (np.asarray(keys)[:, None] >> np.arange(len(columns))) & 1
+    else:
+        patterns, inverse = np.unique(mask, axis=0, return_inverse=True)
+    labels = [column_label(column) for column in columns]
+
+    summaries = []
+    for pattern in patterns.astype(bool):
+        summaries.append(NON_NULL_SEPARATOR.join(label for label, present in zip(labels, pattern) if present))
+    return pd.Series(np.array(summaries, dtype=object)[np.ravel(inverse)], index=df.index, name='Non_NaN_Columns')
+
+
+def normalize_dataframe(df, columns=None, profile='text'):
+    """Normalize the given text columns (all string columns by default) with one of the PROFILES."""
+    normalizer = PROFILES[profile]
+    columns = columns or list(df.select_dtypes(include=['object', 'string']).columns)
+    df = df.copy()
+    for column in columns:
+        df[column] = normalizer.normalize_series(df[column])
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalize the text columns of a CSV (e.g. combined_data.csv, "
+                                                 "Austrailia_Report_COMPLETE.csv or Clustering/requirements.csv).")
+    parser.add_argument('input', help="The CSV to clean.")
+    parser.add_argument('--columns', nargs='+', help="Columns to normalize (default: every text column).")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='text',
+                        help="'requirements' also case-folds and drops punctuation; 'bullets' keeps line breaks.")
+    parser.add_argument('--non-null-summary', nargs='*', metavar='EXCLUDED_COLUMN',
+                        help="Add a Non_NaN_Columns column listing each row's non-empty columns, except those named.")
+    parser.add_argument('--output', help="Output CSV (default: <input>_normalized.csv).")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    df = pd.read_csv(args.input)
+    if args.non_null_summary is not None:
+        summary = non_null_columns(df, exclude=args.non_null_summary)
+    df = normalize_dataframe(df, args.columns, args.profile)
+    if args.non_null_summary is not None:
+        df['Non_NaN_Columns'] = summary
+
+    output = args.output or f"{os.path.splitext(args.input)[0]}_normalized.csv"
+    df.to_csv(output, index=False)
+    print(f"Normalized {len(df)} rows of {args.input} into '{output}' in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,74 +1,173 @@
+import argparse
+import hashlib
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 import seaborn as sns
+import matplotlib
 import matplotlib.pyplot as plt
-import os
+from scipy.cluster.hierarchy import linkage
 
-data_path = './visuals/mnt/data/aggregated_heatmap_data_with_categories.csv'
-heatmap_data = pd.read_csv(data_path, index_col=[0, 1])
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+VISUALS_DIR = os.path.dirname(os.path.abspath(__file__))
+data_path = os.path.join(VISUALS_DIR, 'mnt', 'data', 'aggregated_heatmap_data_with_categories.csv')
+LINKAGE_CACHE_DIR = os.path.join(VISUALS_DIR, 'mnt', 'cache', 'linkage')
+FIGURES_DIR = os.path.join(VISUALS_DIR, 'mnt', 'figures')
 
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
+LINKAGE_METHOD = 'average'
+LINKAGE_METRIC = 'euclidean'
 
-def display_clustergram():
-    # Load the generated workforce data
-    heatmap_data = pd.read_csv(data_path, index_col=[0, 1])
 
-    sns.clustermap(
-        heatmap_data.drop(columns={'Category'}),
+def load_heatmap(path=data_path):
+    """Load the aggregated occupation x taxonomy matrix written by workforce_aggregation.py."""
+    return pd.read_csv(path, index_col=[0, 1])
+
+
+def cached_linkage(matrix, method=LINKAGE_METHOD, metric=LINKAGE_METRIC, cache_dir=LINKAGE_CACHE_DIR):
+    """
+    Hierarchical clustering of the rows of `matrix`, cached on disk by a hash of its contents and labels,
+    so unchanged matrices (and categories) are not re-clustered on the next render.
+    :return: The linkage matrix, or None when there are fewer than two rows to cluster.
+    """
+    if len(matrix) < 2:
+        return None
+
+    values = np.ascontiguousarray(matrix.to_numpy(dtype=np.float64))
+    digest = hashlib.sha256(f'{method}\0{metric}\0{values.shape}'.encode('utf-8'))
+    digest.update(values.tobytes())
+    digest.update('\0'.join(map(str, matrix.index)).encode('utf-8'))
+    path = os.path.join(cache_dir, f'{digest.hexdigest()}.npy')
+
+    if os.path.exists(path):
+        return np.load(path)
+
+    result = linkage(values, method=method, metric=metric)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(path, result)
+    return result
+
+
+def draw_clustermap(matrix, row_cluster=True, col_cluster=True):
+    """Draw a clustermap with the precomputed (cached) row and column linkages."""
+    row_linkage = cached_linkage(matrix) if row_cluster else None
+    col_linkage = cached_linkage(matrix.T) if col_cluster else None
+
+    return sns.clustermap(
+        matrix,
         cmap='coolwarm',
         figsize=(12, 10),
         annot=False,
         fmt=".1f",
-        method='average',
-        metric='euclidean',
-        row_cluster=True,  # Ensures hierarchical clustering is applied to rows
-        col_cluster=True,  # Ensures hierarchical clustering is applied to columns
+        row_cluster=row_linkage is not None,  # Ensures hierarchical clustering is applied to rows
+        col_cluster=col_linkage is not None,  # Ensures hierarchical clustering is applied to columns
+        row_linkage=row_linkage,
+        col_linkage=col_linkage,
         dendrogram_ratio=(.1, .2),  # Adjusts dendrogram size for better visibility
         cbar_pos=(0, .2, .03, .4),  # Adjust colorbar position for better layout
         xticklabels=True,
         yticklabels=True
     )
+
+
+def draw_category_clustermap(category_data, category):
+    g = draw_clustermap(category_data, row_cluster=True, col_cluster=False)
+    for i in range(len(category_data)):
+        g.ax_heatmap.axhline(i, color='black', lw=0.5)
+
+    # Add title to each clustergram
+    plt.title(f'Clustergram for Category: {category}')
+    return g
+
+
+def display_clustergram(heatmap_data=None):
+    # Load the generated workforce data
+    heatmap_data = load_heatmap() if heatmap_data is None else heatmap_data
+
+    draw_clustermap(heatmap_data.drop(columns={'Category'}))
     plt.show()
 
 
-def display_clustergrams_by_category():
-    heatmap_data = pd.read_csv(data_path, index_col=[0, 1])
+def display_clustergrams_by_category(heatmap_data=None):
+    heatmap_data = load_heatmap() if heatmap_data is None else heatmap_data
 
     # Get unique categories
     unique_categories = heatmap_data['Category'].unique()
 
-
     for category in unique_categories:
         # Filter data by the current category
-        #category_occupations = job_clusters_df[job_clusters_df['Category'] == category]['unique_occupation']
         category_data = heatmap_data.loc[heatmap_data['Category'] == category]
 
         # Generate the clustermap for this category
-        g = sns.clustermap(
-            category_data.drop(columns={'Category'}),
-            cmap='coolwarm',
-            figsize=(12, 10),
-            annot=False,
-            fmt=".1f",
-            method='average',
-            metric='euclidean',
-            row_cluster=True,
-            col_cluster=False,
-            dendrogram_ratio=(.1, .2),
-            cbar_pos=(0, .2, .03, .4),
-            xticklabels=True,
-            yticklabels=True
-        )
-        for i in range(len(category_data)):
-            g.ax_heatmap.axhline(i, color='black', lw=0.5)
-
-        # Add title to each clustergram
-        plt.title(f'Clustergram for Category: {category}')
+        draw_category_clustermap(category_data.drop(columns={'Category'}), category)
         plt.show()
 
 
+def figure_name(category):
+    slug = re.sub(r'[^a-z0-9]+', '_', category.lower()).strip('_')
+    return f'clustergram_{slug}'
+
+
+def render_job(job):
+    """Render one clustergram to image files (runs in a worker process, without a display)."""
+    name, matrix, category, output_dir, formats = job
+    started = time.perf_counter()
+
+    if category is None:
+        g = draw_clustermap(matrix)
+    else:
+        g = draw_category_clustermap(matrix, category)
+
+    paths = []
+    for image_format in formats:
+        path = os.path.join(output_dir, f'{name}.{image_format}')
+        g.savefig(path, format=image_format)
+        paths.append(path)
+    plt.close(g.fig)
+    return name, paths, time.perf_counter() - started
+
+
+def render_all(heatmap_data=None, output_dir=FIGURES_DIR, formats=('png',), workers=None):
+    """
+    Render the full clustergram and one per category to image files, in parallel worker processes.
+    Usable from the pipeline or a dashboard backend; nothing is shown on screen.
+    :return: A dict mapping each figure name ('clustergram_all' or 'clustergram_<category>') to its file paths.
+    """
+    heatmap_data = load_heatmap() if heatmap_data is None else heatmap_data
+    os.makedirs(output_dir, exist_ok=True)
+
+    jobs = [('clustergram_all', heatmap_data.drop(columns={'Category'}), None, output_dir, tuple(formats))]
+    for category in heatmap_data['Category'].unique():
+        category_data = heatmap_data.loc[heatmap_data['Category'] == category].drop(columns={'Category'})
+        jobs.append((figure_name(category), category_data, category, output_dir, tuple(formats)))
+
+    started = time.perf_counter()
+    rendered = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=matplotlib.use, initargs=('Agg',)) as executor:
+        for name, paths, seconds in executor.map(render_job, jobs):
+            logging.info(f"Rendered {name} in {seconds:.2f}s")
+            rendered[name] = paths
+
+    logging.info(f"Rendered {len(jobs)} clustergrams to {output_dir} in {time.perf_counter() - started:.2f}s")
+    return rendered
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or render clustergrams of the occupation x taxonomy heatmap.")
+    parser.add_argument('--batch', action='store_true', help="Render every clustergram to files instead of showing them.")
+    parser.add_argument('--output-dir', default=FIGURES_DIR, help="Where batch mode writes the figures.")
+    parser.add_argument('--format', dest='formats', action='append', choices=['png', 'svg', 'pdf'],
+                        help="Image format for batch mode (repeatable, default png).")
+    parser.add_argument('--workers', type=int, default=None, help="Rendering processes (defaults to the CPU count).")
+    args = parser.parse_args()
 
-display_clustergram()
-display_clustergrams_by_category()
+    if args.batch:
+        render_all(output_dir=args.output_dir, formats=args.formats or ['png'], workers=args.workers)
+    else:
+        heatmap_data = load_heatmap()
+        display_clustergram(heatmap_data)
+        display_clustergrams_by_category(heatmap_data)
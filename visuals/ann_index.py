@@ -0,0 +1,224 @@
+import hashlib
+import logging
+import time
+import numpy as np
+
+DEFAULT_N_PROBE = 8
+DEFAULT_K = 32
+QUERY_BATCH_SIZE = 1024
+
+
+def normalize_rows32(matrix):
+    """Unit-normalize rows in float32 so that inner products are cosine similarities."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def fingerprint(ids, vectors):
+    """Content hash of an indexed collection, used to tell whether a saved index is stale."""
+    digest = hashlib.sha1()
+    digest.update('\0'.join(map(str, ids)).encode('utf-8'))
+    digest.update(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+def spherical_kmeans(vectors, n_lists, n_iter=20, seed=0):
+    """
+    Cluster unit vectors by cosine similarity.
+    :return: A (n_lists, dim) array of unit-length centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=n_lists, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assignments = assign_to_centroids(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_lists)
+
+        # Re-seed empty lists with random vectors so every list stays in use
+        empty = counts == 0
+        sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()))]
+        centroids = normalize_rows32(sums)
+
+    return centroids
+
+
+def assign_to_centroids(vectors, centroids, batch_size=QUERY_BATCH_SIZE):
+    """Return the index of the most similar centroid for every vector."""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch_size):
+        assignments[start:start + batch_size] = (vectors[start:start + batch_size] @ centroids.T).argmax(axis=1)
+    return assignments
+
+
+class IVFIndex:
+    """
+    Inverted-file index for cosine similarity search.
+    Vectors are partitioned into `n_lists` clusters; a query only scans the `n_probe` lists whose
+    centroids are closest to it. Raising `n_probe` trades latency for recall, and
+    `n_probe == n_lists` is an exact search.
+    Each indexed row can carry a payload (a variable-length list of strings) stored in CSR form.
+    """
+
+    def __init__(self, centroids, vectors, row_ids, list_offsets, ids, source_fingerprint="",
+                 payload_offsets=None, payload_values=None):
+        self.centroids = centroids
+        self.vectors = vectors          # Indexed vectors, grouped by list
+        self.row_ids = row_ids          # Original row of each grouped vector
+        self.list_offsets = list_offsets
+        self.ids = ids                  # ID of each original row
+        self.source_fingerprint = source_fingerprint
+        self.payload_offsets = payload_offsets
+        self.payload_values = payload_values
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, vectors, ids, n_lists=None, n_iter=20, seed=0, payloads=None):
+        """
+        Train the coarse quantizer and bucket every vector into its nearest list.
+        :param vectors: A (n, dim) array of embeddings.
+        :param ids: An ID for each row, returned by searches.
+        :param n_lists: The number of inverted lists (defaults to about sqrt(n)).
+        :param payloads: Optional list of string lists attached to each row.
+        """
+        started = time.perf_counter()
+        vectors = normalize_rows32(vectors)
+        n_lists = n_lists or max(1, int(np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+
+        centroids = spherical_kmeans(vectors, n_lists, n_iter=n_iter, seed=seed)
+        index = cls._from_assignments(centroids, vectors, np.asarray(ids).astype(str),
+                                      assign_to_centroids(vectors, centroids), fingerprint(ids, vectors))
+        if payloads is not None:
+            index.set_payloads(payloads)
+
+        logging.info(f"Built IVF index over {len(vectors)} vectors with {n_lists} lists in {time.perf_counter() - started:.2f}s")
+        return index
+
+    @classmethod
+    def _from_assignments(cls, centroids, vectors, ids, assignments, source_fingerprint):
+        order = np.argsort(assignments, kind='stable')
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=len(centroids)))])
+        return cls(centroids, vectors[order], order, list_offsets, ids, source_fingerprint)
+
+    def set_payloads(self, payloads):
+        lengths = [len(payload) for payload in payloads]
+        self.payload_offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self.payload_values = np.asarray([value for payload in payloads for value in payload], dtype=str)
+
+    def payload(self, row):
+        return self.payload_values[self.payload_offsets[row]:self.payload_offsets[row + 1]]
+
+    def add(self, vectors, ids, payloads=None):
+        """
+        Append vectors to the index without retraining the centroids.
+        Returns a new index; rebuild from scratch once the data drifts far from the original clusters.
+        """
+        vectors = normalize_rows32(vectors)
+        all_vectors = np.empty((len(self), self.vectors.shape[1]), dtype=np.float32)
+        all_vectors[self.row_ids] = self.vectors
+        all_vectors = np.vstack([all_vectors, vectors])
+        all_ids = np.concatenate([self.ids, np.asarray(ids).astype(str)])
+
+        assignments = assign_to_centroids(all_vectors, self.centroids)
+        index = IVFIndex._from_assignments(self.centroids, all_vectors, all_ids, assignments,
+                                           fingerprint(all_ids, all_vectors))
+        if self.payload_offsets is not None or payloads is not None:
+            old_payloads = [list(self.payload(row)) for row in range(len(self))] if self.payload_offsets is not None else [[] for _ in range(len(self))]
+            index.set_payloads(old_payloads + list(payloads if payloads is not None else [[] for _ in range(len(vectors))]))
+        return index
+
+    def search(self, queries, k=DEFAULT_K, n_probe=DEFAULT_N_PROBE, batch_size=QUERY_BATCH_SIZE):
+        """
+        Find the `k` most similar indexed rows for each query.
+        :return: A (n, k) array of original row numbers (-1 where fewer than k were found) and the
+                 matching (n, k) array of cosine similarities, best first.
+        """
+        queries = normalize_rows32(queries)
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start:start + batch_size]
+            batch_rows, batch_scores = self._search_batch(batch, k, min(n_probe, self.n_lists))
+            rows[start:start + len(batch)] = batch_rows
+            scores[start:start + len(batch)] = batch_scores
+
+        return rows, scores
+
+    def _search_batch(self, queries, k, n_probe):
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+
+        # Pick the lists to scan for every query
+        centroid_scores = queries @ self.centroids.T
+        probes = np.argpartition(-centroid_scores, n_probe - 1, axis=1)[:, :n_probe]
+
+        # Scan list by list, so each list's vectors are scored against all queries probing it at once
+        for list_id in np.unique(probes):
+            query_rows = np.flatnonzero((probes == list_id).any(axis=1))
+            start, end = self.list_offsets[list_id], self.list_offsets[list_id + 1]
+            if start == end:
+                continue
+
+            list_scores = queries[query_rows] @ self.vectors[start:end].T
+            merged_scores = np.hstack([best_scores[query_rows], list_scores])
+            merged_rows = np.hstack([best_rows[query_rows], np.broadcast_to(self.row_ids[start:end], list_scores.shape)])
+
+            keep = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+            best_scores[query_rows] = np.take_along_axis(merged_scores, keep, axis=1)
+            best_rows[query_rows] = np.take_along_axis(merged_rows, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def save(self, path):
+        arrays = {
+            'centroids': self.centroids,
+            'vectors': self.vectors,
+            'row_ids': self.row_ids,
+            'list_offsets': self.list_offsets,
+            'ids': self.ids,
+            'source_fingerprint': np.asarray(self.source_fingerprint)
+        }
+        if self.payload_offsets is not None:
+            arrays['payload_offsets'] = self.payload_offsets
+            arrays['payload_values'] = self.payload_values
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data['centroids'], data['vectors'], data['row_ids'], data['list_offsets'], data['ids'],
+                str(data['source_fingerprint']),
+                data['payload_offsets'] if 'payload_offsets' in data else None,
+                data['payload_values'] if 'payload_values' in data else None
+            )
+
+
+def exact_search(vectors, queries, k=DEFAULT_K):
+    """Brute-force top-k cosine search, used as ground truth for recall checks."""
+    scores = normalize_rows32(queries) @ normalize_rows32(vectors).T
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def recall(approx_pairs, exact_pairs):
+    """Fraction of the exact (query, row) pairs that the approximate search also returned."""
+    exact_pairs = set(exact_pairs)
+    if not exact_pairs:
+        return 1.0
+    return len(exact_pairs & set(approx_pairs)) / len(exact_pairs)
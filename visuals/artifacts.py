@@ -0,0 +1,211 @@
+import argparse
+import logging
+import operator
+import os
+import time
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (optional: enables the Parquet format)
+    HAVE_PYARROW = True
+except ImportError:
+    HAVE_PYARROW = False
+
+DATA_DIR = './mnt/data'
+ROW_GROUP_SIZE = 50000
+
+# Column types of the tabular pipeline artifacts, keyed by file name (without extension).
+# 'dictionary' columns repeat a small set of long strings and are stored dictionary-encoded;
+# columns not listed in a schema are kept with inferred types.
+SCHEMAS = {
+    'reformatted_skills': {
+        'requirement_id': 'int64',
+        'requirement': 'dictionary',
+        'skill_id': 'int64',
+        'skill': 'string'
+    },
+    'reformatted_occupations': {
+        'occupation_id': 'int64',
+        'core_occupation': 'string',
+        'value_chain': 'dictionary',
+        'technology': 'dictionary'
+    },
+    'occupation_clusters_individual': {
+        'occupation_id': 'int64',
+        'core_occupation': 'string',
+        'value_chain': 'dictionary',
+        'technology': 'dictionary',
+        'Category': 'dictionary'
+    },
+    'complete_taxonomy': {
+        'Taxonomy ID': 'string',
+        'Description': 'string'
+    },
+    'threshold_skills_insertion': {
+        'skill_id': 'int64',
+        'skill': 'dictionary',
+        'Mapped Node': 'dictionary',
+        'Taxonomy ID': 'dictionary',
+        'Similarity Score': 'float64'
+    },
+    'skill_taxonomy_with_locations': {
+        'skill_id': 'int64',
+        'skill': 'dictionary',
+        'Taxonomy ID': 'dictionary',
+        'taxonomy_location': 'dictionary',
+        'Similarity Score': 'float64'
+    },
+    'skill_taxonomy_mapping_with_ids': {
+        'Skill ID': 'int64',
+        'Skill': 'string',
+        'Mapped Node': 'dictionary',
+        'Taxonomy ID': 'dictionary',
+        'Similarity Score': 'float64'
+    }
+}
+
+FILTER_OPERATORS = {
+    '==': operator.eq,
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda column, values: column.isin(values),
+    'not in': lambda column, values: ~column.isin(values)
+}
+
+
+def artifact_paths(name, data_dir=DATA_DIR):
+    """Return the (Parquet, CSV) paths of an artifact."""
+    return os.path.join(data_dir, f'{name}.parquet'), os.path.join(data_dir, f'{name}.csv')
+
+
+def pandas_dtype(column_type, categorical):
+    if column_type == 'dictionary':
+        return 'category' if categorical else str
+    if column_type == 'string':
+        return str
+    return column_type
+
+
+def apply_schema(df, name, categorical=True):
+    """Cast the columns of `df` that appear in the artifact's schema to their declared types."""
+    schema = SCHEMAS.get(name, {})
+    missing = [column for column in schema if column not in df.columns]
+    if missing:
+        raise ValueError(f"Artifact '{name}' is missing columns {missing}")
+
+    return df.astype({
+        column: pandas_dtype(column_type, categorical) for column, column_type in schema.items()
+    })
+
+
+def apply_filters(df, filters):
+    """Apply (column, op, value) filters, ANDed together, to a loaded DataFrame."""
+    if not filters:
+        return df
+
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        if op not in FILTER_OPERATORS:
+            raise ValueError(f"Unsupported filter operator '{op}'")
+        mask &= FILTER_OPERATORS[op](df[column], value)
+    return df[mask]
+
+
+def save_artifact(df, name, data_dir=DATA_DIR, write_csv=True):
+    """
+    Write an artifact with its schema applied. The CSV is always written, as it is the file the repo
+    tracks; when pyarrow is installed a Parquet copy (dictionary-encoded, zstd-compressed) is written
+    after it, so load_artifact picks the Parquet file up as the newer of the two.
+    :param write_csv: Set to False to only (re)write the Parquet copy of an existing CSV.
+    :return: The CSV path, or the Parquet path when only that was written.
+    """
+    parquet_path, csv_path = artifact_paths(name, data_dir)
+    df = apply_schema(df, name)
+
+    started = time.perf_counter()
+    paths = []
+    if write_csv or not HAVE_PYARROW:
+        df.to_csv(csv_path, index=False)
+        paths.append(csv_path)
+    if HAVE_PYARROW:
+        df.to_parquet(parquet_path, index=False, compression='zstd', row_group_size=ROW_GROUP_SIZE)
+        paths.append(parquet_path)
+
+    logging.info(f"Saved {len(df)} rows to {' and '.join(paths)} in {time.perf_counter() - started:.2f}s")
+    return paths[0]
+
+
+def load_artifact(name, columns=None, filters=None, data_dir=DATA_DIR, categorical=False):
+    """
+    Load a pipeline artifact with its schema applied.
+    Reads the Parquet file when pyarrow is installed and it is at least as new as the CSV (so a CSV
+    regenerated elsewhere, e.g. by the notebook, is not shadowed by a stale Parquet file).
+    :param name: The artifact name, e.g. 'reformatted_skills'.
+    :param columns: Optional list of columns to load (projection).
+    :param filters: Optional list of (column, op, value) tuples, ANDed together, e.g.
+                    [('Similarity Score', '>=', 0.5)]. With Parquet, row groups that cannot match are skipped.
+    :param categorical: Keep dictionary columns as pandas categoricals instead of plain strings.
+    :return: The loaded DataFrame.
+    """
+    parquet_path, csv_path = artifact_paths(name, data_dir)
+    use_parquet = HAVE_PYARROW and os.path.exists(parquet_path) and (
+        not os.path.exists(csv_path) or os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path)
+    )
+
+    schema = SCHEMAS.get(name, {})
+    started = time.perf_counter()
+    if use_parquet:
+        df = pd.read_parquet(parquet_path, columns=columns, filters=[tuple(f) for f in filters] if filters else None)
+        if not categorical:
+            # Plain strings like the CSV path gives, with missing values kept missing rather than 'nan'
+            for column, column_type in schema.items():
+                if column_type == 'dictionary' and column in df.columns:
+                    df[column] = df[column].astype(str).where(df[column].notna())
+        path = parquet_path
+    else:
+        # Filter columns must be read even when they are not in the projection
+        usecols = None
+        if columns is not None:
+            usecols = list(dict.fromkeys(list(columns) + [column for column, _, _ in filters or []]))
+        df = pd.read_csv(csv_path, usecols=usecols, dtype={
+            column: pandas_dtype(column_type, categorical) for column, column_type in schema.items()
+            if usecols is None or column in usecols
+        })
+        df = apply_filters(df, filters)
+        if columns is not None:
+            df = df[list(columns)]
+        df = df.reset_index(drop=True)
+        path = csv_path
+
+    logging.debug(f"Loaded {len(df)} rows of '{name}' from {path} in {time.perf_counter() - started:.3f}s")
+    return df
+
+
+def convert(names, data_dir=DATA_DIR):
+    """Convert existing CSV artifacts to Parquet and report the size change."""
+    if not HAVE_PYARROW:
+        raise SystemExit("Converting to Parquet needs pyarrow: pip install pyarrow")
+
+    for name in names:
+        parquet_path, csv_path = artifact_paths(name, data_dir)
+        if not os.path.exists(csv_path):
+            print(f"Skipping {name}: {csv_path} not found")
+            continue
+        df = pd.read_csv(csv_path, dtype={column: pandas_dtype(column_type, True)
+                                          for column, column_type in SCHEMAS.get(name, {}).items()})
+        save_artifact(df, name, data_dir, write_csv=False)
+        print(f"{name}: {os.path.getsize(csv_path):,} bytes CSV -> {os.path.getsize(parquet_path):,} bytes Parquet")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert the CSV pipeline artifacts to typed Parquet files.")
+    parser.add_argument('names', nargs='*', default=sorted(SCHEMAS), help="Artifacts to convert (defaults to all)")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    convert(args.names, args.data_dir)
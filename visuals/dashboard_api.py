@@ -0,0 +1,405 @@
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+import pandas as pd
+from artifacts import artifact_paths, load_artifact
+from taxonomy_index import INDEX_FILE, load_taxonomy_index, normalize_taxonomy_id
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+VISUALS_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(VISUALS_DIR, 'mnt', 'data')
+EXTRAS_DIR = os.path.join(VISUALS_DIR, 'mnt', 'extras')
+
+DEFAULT_PORT = 8050
+CACHE_ENTRIES = 256          # Rendered responses kept in memory
+RELOAD_CHECK_SECONDS = 1.0   # How often an artifact's files are checked for changes
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+GZIP_MIN_BYTES = 1024        # Smaller responses are sent uncompressed
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Artifact:
+    """
+    A pipeline output held in memory in the form the endpoints need. Its files are checked at most once
+    every RELOAD_CHECK_SECONDS and it is reloaded when their mtime or size changes, so rerunning a pipeline
+    stage is picked up without restarting the service. A failed reload (e.g. a file caught mid-write)
+    keeps serving the previous version.
+    """
+
+    def __init__(self, name, paths, load):
+        self.name = name
+        self.paths = paths
+        self.load = load
+        self.lock = threading.Lock()
+        self.version = None
+        self.value = None
+        self.checked_at = 0.0
+
+    def file_version(self):
+        version = []
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            version.append((os.path.basename(path), stat.st_mtime_ns, stat.st_size))
+        return tuple(version)
+
+    def get(self):
+        """:return: (version, value); the version changes whenever the value is reloaded."""
+        with self.lock:
+            now = time.monotonic()
+            if self.version is not None and now - self.checked_at < RELOAD_CHECK_SECONDS:
+                return self.version, self.value
+            self.checked_at = now
+
+            version = self.file_version()
+            if version == self.version:
+                return self.version, self.value
+            if not version:
+                if self.version is not None:
+                    return self.version, self.value
+                raise ApiError(HTTPStatus.SERVICE_UNAVAILABLE, f"The '{self.name}' artifact has not been generated yet")
+
+            started = time.perf_counter()
+            try:
+                value = self.load()
+            except Exception:
+                if self.version is None:
+                    raise
+                logging.exception(f"Reloading '{self.name}' failed; still serving the previous version")
+                return self.version, self.value
+            self.version, self.value = version, value
+            logging.info(f"Loaded '{self.name}' in {time.perf_counter() - started:.2f}s")
+            return self.version, self.value
+
+
+class ResponseCache:
+    """A thread-safe LRU of rendered responses."""
+
+    def __init__(self, max_entries=CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class Response:
+    """A JSON body with its ETag; the gzip encoding is made on first request and kept."""
+
+    def __init__(self, payload):
+        self.body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+        self.gzipped = None
+
+    def encoded(self, accept_gzip):
+        if not accept_gzip or len(self.body) < GZIP_MIN_BYTES:
+            return self.body, None
+        if self.gzipped is None:
+            self.gzipped = gzip.compress(self.body, compresslevel=6)
+        return self.gzipped, 'gzip'
+
+
+def load_skill_mappings(data_dir):
+    """Skill mappings grouped by Taxonomy ID, best match first."""
+    df = load_artifact('threshold_skills_insertion', data_dir=data_dir)
+    df['Taxonomy ID'] = df['Taxonomy ID'].map(normalize_taxonomy_id)
+    df = df.sort_values(['Taxonomy ID', 'Similarity Score'], ascending=[True, False], kind='stable')
+
+    records = df[['skill_id', 'skill', 'Similarity Score']].rename(columns={'Similarity Score': 'score'})
+    records = records.to_dict('records')
+    by_node = {}
+    for taxonomy_id, record in zip(df['Taxonomy ID'], records):
+        by_node.setdefault(taxonomy_id, []).append(record)
+    return by_node
+
+
+def load_heatmap(path):
+    df = pd.read_csv(path, index_col=0)
+    categories = df.pop('Category') if 'Category' in df.columns else pd.Series(None, index=df.index)
+    return {
+        'columns': [str(column) for column in df.columns],
+        'rows': [{'occupation': occupation, 'category': None if pd.isna(category) else category, 'values': values}
+                 for occupation, category, values in zip(df.index, categories, df.to_numpy().tolist())]
+    }
+
+
+def load_records(load):
+    """A loader returning the DataFrame as a list of JSON-ready records."""
+    def load_as_records():
+        df = load()
+        df = df.loc[:, [column for column in df.columns if not str(column).startswith('Unnamed')]]
+        return json.loads(df.to_json(orient='records'))
+    return load_as_records
+
+
+def build_artifacts(data_dir=DATA_DIR, extras_dir=EXTRAS_DIR):
+    heatmap_path = os.path.join(data_dir, 'aggregated_heatmap_data_with_categories.csv')
+    skill_clusters_path = os.path.join(extras_dir, 'skill_clusters.csv')
+    return {
+        # The index taxonomy.py saves, or the taxonomy CSV it is built from when it has not been saved
+        'taxonomy': Artifact('taxonomy', [os.path.join(data_dir, INDEX_FILE)] + list(artifact_paths('complete_taxonomy', data_dir)),
+                             lambda: load_taxonomy_index(data_dir)),
+        'skill_mappings': Artifact('skill_mappings', list(artifact_paths('threshold_skills_insertion', data_dir)),
+                                   lambda: load_skill_mappings(data_dir)),
+        'heatmap': Artifact('heatmap', [heatmap_path], lambda: load_heatmap(heatmap_path)),
+        'clusters/skills': Artifact('clusters/skills', [skill_clusters_path],
+                                    load_records(lambda: pd.read_csv(skill_clusters_path))),
+        'clusters/occupations': Artifact('clusters/occupations', list(artifact_paths('occupation_clusters_individual', data_dir)),
+                                         load_records(lambda: load_artifact('occupation_clusters_individual', data_dir=data_dir)))
+    }
+
+
+def query_int(query, name, default, minimum=0, maximum=None):
+    try:
+        value = int(query.get(name, [default])[0])
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"'{name}' must be an integer")
+    if maximum is not None and not minimum <= value <= maximum:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"'{name}' must be between {minimum} and {maximum}")
+    if value < minimum:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"'{name}' must be at least {minimum}")
+    return value
+
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows gzip, honouring q-values ('gzip;q=0' refuses it)."""
+    weights = {}
+    for part in accept_encoding.split(','):
+        coding, *parameters = [piece.strip() for piece in part.split(';')]
+        quality = 1.0
+        for parameter in parameters:
+            key, _, value = parameter.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            weights[coding.lower()] = quality
+    quality = weights.get('gzip', weights.get('x-gzip', weights.get('*', 0.0)))
+    return quality > 0
+
+
+def paginate(items, query):
+    offset = query_int(query, 'offset', 0)
+    limit = query_int(query, 'limit', DEFAULT_PAGE_SIZE, minimum=1, maximum=MAX_PAGE_SIZE)
+    return {'total': len(items), 'offset': offset, 'limit': limit, 'items': items[offset:offset + limit]}
+
+
+class DashboardApi:
+    """
+    Routes GET requests to the endpoints below; each response is cached by its path, query and the
+    versions of the artifacts it was built from, so repeated requests are served from memory.
+
+    /api                              The datasets and their versions
+    /api/taxonomy?depth=               The top-level nodes, expanded `depth` levels (default 1)
+    /api/taxonomy/<id>?depth=          A node with its ancestors and `depth` levels of children
+    /api/taxonomy/<id>/skills?descendants=&offset=&limit=
+                                      Skills mapped to a node (and its subtree with descendants=1)
+    /api/heatmap?category=&offset=&limit=
+                                      Rows of the occupation x taxonomy matrix
+    /api/clusters/<skills|occupations>?cluster_column=&cluster=&offset=&limit=
+                                      Cluster assignments
+    """
+
+    def __init__(self, artifacts, cache_entries=CACHE_ENTRIES):
+        self.artifacts = artifacts
+        self.cache = ResponseCache(cache_entries)
+
+    def respond(self, path, query_string):
+        parts = [unquote(part) for part in path.strip('/').split('/')]
+        if parts[0] != 'api':
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No endpoint at {path}")
+        parts = parts[1:]
+
+        if not parts:
+            return Response(self.index())
+        if parts[0] == 'taxonomy' and len(parts) <= 2:
+            names = ['taxonomy', 'skill_mappings']
+            handler = self.taxonomy
+        elif parts[0] == 'taxonomy' and len(parts) == 3 and parts[2] == 'skills':
+            names = ['taxonomy', 'skill_mappings']
+            handler = self.node_skills
+        elif parts == ['heatmap']:
+            names = ['heatmap']
+            handler = self.heatmap
+        elif parts[0] == 'clusters' and len(parts) == 2 and f'clusters/{parts[1]}' in self.artifacts:
+            names = [f'clusters/{parts[1]}']
+            handler = self.clusters
+        else:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No endpoint at {path}")
+
+        loaded = {name: self.artifacts[name].get() for name in names}
+        key = ('/'.join(parts), query_string, tuple(version for version, _ in loaded.values()))
+        response = self.cache.get(key)
+        if response is None:
+            query = parse_qs(query_string)
+            response = Response(handler(parts[1:], query, **{name.replace('/', '_'): value for name, (_, value) in loaded.items()}))
+            self.cache.put(key, response)
+        return response
+
+    def index(self):
+        # Not cached: it reports the files as they are now, without loading anything
+        return {'datasets': {name: [{'file': file, 'mtime_ns': mtime, 'size': size} for file, mtime, size in artifact.file_version()]
+                             for name, artifact in self.artifacts.items()}}
+
+    @staticmethod
+    def node_summary(taxonomy, skill_mappings, row, depth):
+        node_id = str(taxonomy.ids[row])
+        children = taxonomy.child_rows(row)
+        summary = {'id': node_id, 'description': taxonomy.descriptions[row] or '', 'child_count': len(children),
+                   'skill_count': len(skill_mappings.get(node_id, ()))}
+        if depth > 0:
+            summary['children'] = [DashboardApi.node_summary(taxonomy, skill_mappings, child, depth - 1) for child in children]
+        return summary
+
+    def taxonomy(self, parts, query, taxonomy, skill_mappings):
+        depth = query_int(query, 'depth', 1, maximum=20)
+        if not parts:
+            return {'roots': [self.node_summary(taxonomy, skill_mappings, root, depth - 1) for root in taxonomy.top_level()]}
+
+        row = self.find_node(taxonomy, parts[0])
+        return {'path': [{'id': str(taxonomy.ids[ancestor]), 'description': taxonomy.descriptions[ancestor] or ''}
+                         for ancestor in taxonomy.ancestors(row)[:-1]],
+                'node': self.node_summary(taxonomy, skill_mappings, row, depth)}
+
+    def node_skills(self, parts, query, taxonomy, skill_mappings):
+        row = self.find_node(taxonomy, parts[0])
+        node_id = str(taxonomy.ids[row])
+        if query.get('descendants', ['0'])[0].lower() in ('1', 'true', 'yes'):
+            # The subtree's rows are in depth-first order, so each node's skills stay together
+            items = [dict(record, taxonomy_id=descendant) for descendant in taxonomy.ids[taxonomy.subtree(row)].tolist()
+                     for record in skill_mappings.get(descendant, ())]
+        else:
+            items = skill_mappings.get(node_id, [])
+        return dict(paginate(items, query), id=node_id)
+
+    @staticmethod
+    def find_node(taxonomy, taxonomy_id):
+        row = taxonomy.row_of.get(normalize_taxonomy_id(taxonomy_id))
+        if row is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Unknown Taxonomy ID '{taxonomy_id}'")
+        return row
+
+    def heatmap(self, parts, query, heatmap):
+        rows = heatmap['rows']
+        if 'category' in query:
+            categories = set(query['category'])
+            rows = [row for row in rows if row['category'] in categories]
+        return dict(paginate(rows, query), columns=heatmap['columns'])
+
+    def clusters(self, parts, query, **artifacts):
+        (records,) = artifacts.values()
+        if 'cluster' in query:
+            column = query.get('cluster_column', ['Category' if parts[0] == 'occupations' else 'Cluster_Threshold_1.0'])[0]
+            if records and column not in records[0]:
+                raise ApiError(HTTPStatus.BAD_REQUEST, f"Unknown cluster column '{column}'")
+            wanted = set(query['cluster'])
+            records = [record for record in records if str(record[column]) in wanted]
+        return paginate(records, query)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    api = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            response = self.api.respond(url.path, url.query)
+        except ApiError as error:
+            self.send_error_json(error.status, str(error))
+            return
+        except Exception:
+            logging.exception(f"Failed to serve {self.path}")
+            self.send_error_json(HTTPStatus.INTERNAL_SERVER_ERROR, "Internal error")
+            return
+
+        # Unchanged data is answered with 304 and no body
+        if response.etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_common_headers(response.etag)
+            self.end_headers()
+            return
+
+        body, encoding = response.encoded(accepts_gzip(self.headers.get('Accept-Encoding', '')))
+        self.send_response(HTTPStatus.OK)
+        self.send_common_headers(response.etag)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_common_headers(self, etag):
+        self.send_header('ETag', etag)
+        # Clients revalidate every time, which costs a 304 while the artifacts are unchanged
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Access-Control-Allow-Origin', '*')
+
+    def send_error_json(self, status, message):
+        body = json.dumps({'error': message}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+def serve(host='127.0.0.1', port=DEFAULT_PORT, data_dir=DATA_DIR, extras_dir=EXTRAS_DIR, cache_entries=CACHE_ENTRIES):
+    handler = type('DashboardRequestHandler', (RequestHandler,), {'api': DashboardApi(build_artifacts(data_dir, extras_dir), cache_entries)})
+    server = ThreadingHTTPServer((host, port), handler)
+    logging.info(f"Serving the dashboard data on http://{host}:{server.server_port}/api")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the dashboard data (taxonomy, skill mappings, heatmap, clusters) as a JSON API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--extras-dir', default=EXTRAS_DIR)
+    parser.add_argument('--cache-entries', type=int, default=CACHE_ENTRIES, help="Rendered responses kept in memory.")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.data_dir, args.extras_dir, args.cache_entries)
@@ -0,0 +1,220 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+import numpy as np
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    'EMBEDDING_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mnt', 'cache', 'embeddings.sqlite')
+)
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GiB of vectors before least-recently-used entries are evicted
+
+# SQLite caps the number of bound parameters per statement
+SQL_CHUNK_SIZE = 500
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """Normalize text for cache keys: NFC unicode, collapsed whitespace, stripped ends."""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFC', str(text))).strip()
+
+
+def cache_key(model_name, text):
+    """Content address of an embedding: a SHA-256 digest of the model name and the normalized text."""
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode('utf-8')).digest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding store keyed by (model name, normalized text hash).
+    Vectors are stored as raw float32 blobs in SQLite running in WAL mode, so any number of
+    processes can read while one writes. When the stored vectors exceed `max_bytes`, the
+    least recently used entries are evicted. Triggers keep the total vector size in a one-row
+    cache_stats table, updated in the same transaction as each write, so the size check on
+    every write does not scan the cache.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        with self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key BLOB PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self.conn.execute('CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)')
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_stats (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    total_bytes INTEGER NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS embeddings_insert AFTER INSERT ON embeddings BEGIN
+                    UPDATE cache_stats SET total_bytes = total_bytes + LENGTH(NEW.vector);
+                END
+            """)
+            self.conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS embeddings_update AFTER UPDATE OF vector ON embeddings BEGIN
+                    UPDATE cache_stats SET total_bytes = total_bytes + LENGTH(NEW.vector) - LENGTH(OLD.vector);
+                END
+            """)
+            self.conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS embeddings_delete AFTER DELETE ON embeddings BEGIN
+                    UPDATE cache_stats SET total_bytes = total_bytes - LENGTH(OLD.vector);
+                END
+            """)
+            # Caches created before the stats table are measured once
+            if self.conn.execute('SELECT 1 FROM cache_stats').fetchone() is None:
+                self.conn.execute('INSERT INTO cache_stats SELECT 0, COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings')
+
+    def close(self):
+        self.conn.close()
+
+    def get_many(self, model_name, texts):
+        """
+        Look up embeddings for a list of texts.
+        :return: A list with a float32 vector for each cached text and None for each miss.
+        """
+        keys = [cache_key(model_name, text) for text in texts]
+        found = {}
+
+        for start in range(0, len(keys), SQL_CHUNK_SIZE):
+            chunk = keys[start:start + SQL_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(
+                f'SELECT key, dim, vector FROM embeddings WHERE key IN ({placeholders})', chunk
+            ).fetchall()
+            for key, dim, vector in rows:
+                found[key] = np.frombuffer(vector, dtype=np.float32, count=dim)
+
+        if found:
+            self._touch(list(found))
+
+        return [found.get(key) for key in keys]
+
+    def put_many(self, model_name, texts, vectors):
+        """Store one vector per text, then evict old entries if the cache is over its size limit."""
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            vector = np.ascontiguousarray(vector, dtype=np.float32)
+            rows.append((cache_key(model_name, text), model_name, vector.shape[0], vector.tobytes(), now))
+
+        with self.conn:
+            # An upsert rather than INSERT OR REPLACE, whose implicit delete would not fire the delete trigger
+            self.conn.executemany("""
+                INSERT INTO embeddings VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET model = excluded.model, dim = excluded.dim,
+                                                vector = excluded.vector, last_access = excluded.last_access
+            """, rows)
+
+        self.evict()
+
+    def encode(self, model_name, texts, encode_fn):
+        """
+        Return embeddings for `texts`, calling `encode_fn` only for distinct texts that are not cached.
+        :param model_name: The name identifying the model (part of the cache key).
+        :param texts: The texts to embed.
+        :param encode_fn: A function mapping a list of texts to a (len(texts), dim) array.
+        :return: A (len(texts), dim) float32 array in the order of the input texts.
+        """
+        # Texts that share a key are encoded once, in their normalized form
+        texts = [normalize_text(text) for text in texts]
+        vectors = self.get_many(model_name, texts)
+
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            logging.info(f"Embedding cache: {len(texts) - len(missing)} hits, encoding {len(missing)} new texts with '{model_name}'")
+            encoded = np.asarray(encode_fn(missing), dtype=np.float32)
+            self.put_many(model_name, missing, encoded)
+            encoded_by_text = dict(zip(missing, encoded))
+            vectors = [encoded_by_text[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+
+        if not vectors:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack(vectors)
+
+    def total_bytes(self):
+        return self.conn.execute('SELECT total_bytes FROM cache_stats').fetchone()[0]
+
+    def evict(self):
+        """Delete least recently used entries until the cache is back under `max_bytes`."""
+        excess = self.total_bytes() - self.max_bytes
+        if excess <= 0:
+            return
+
+        stale_keys = []
+        for key, size in self.conn.execute('SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_access'):
+            stale_keys.append(key)
+            excess -= size
+            if excess <= 0:
+                break
+
+        with self.conn:
+            for start in range(0, len(stale_keys), SQL_CHUNK_SIZE):
+                chunk = stale_keys[start:start + SQL_CHUNK_SIZE]
+                self.conn.execute(f"DELETE FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+        logging.info(f"Embedding cache: evicted {len(stale_keys)} least recently used entries")
+
+    def _touch(self, keys):
+        now = time.time()
+        try:
+            with self.conn:
+                for start in range(0, len(keys), SQL_CHUNK_SIZE):
+                    chunk = keys[start:start + SQL_CHUNK_SIZE]
+                    self.conn.execute(f"UPDATE embeddings SET last_access = ? WHERE key IN ({','.join('?' * len(chunk))})", [now] + chunk)
+        except sqlite3.OperationalError as error:
+            # Another process holds the write lock; recency is best effort
+            logging.debug(f"Embedding cache: could not update access times ({error})")
+
+
+class CachedEncoder:
+    """
+    Drop-in replacement for a SentenceTransformer's `encode` that goes through the embedding cache.
+    The model itself is only loaded the first time a text is not found in the cache.
+    """
+
+    def __init__(self, model_name, cache=None, load_model=None):
+        self.model_name = model_name
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self._load_model = load_model
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            if self._load_model is not None:
+                self._model = self._load_model()
+            else:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+
+        kwargs['convert_to_numpy'] = True
+        embeddings = self.cache.encode(
+            self.model_name, texts,
+            lambda missing: self.model.encode(missing, batch_size=batch_size, **kwargs)
+        )
+        return embeddings[0] if single else embeddings
@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+from collections import namedtuple
+import numpy as np
+
+EMBEDDINGS_FILE = 'taxonomy_embeddings.npy'
+NODE_INDEX_FILE = 'taxonomy_nodes.json'
+TREE_WITH_IDS_FILE = 'taxonomy_tree_with_ids.json'
+LEGACY_TREE_FILE = 'taxonomy_tree_with_embeddings.json'
+
+# One entry per node in depth-first order; row i of `embeddings` belongs to ids[i]
+TaxonomyEmbeddings = namedtuple('TaxonomyEmbeddings', ['ids', 'descriptions', 'parents', 'depths', 'embeddings', 'model'])
+
+
+def flatten_taxonomy_tree(taxonomy_tree):
+    """
+    Flatten the nested taxonomy tree (with '_embedding' and '_id' keys) in depth-first order.
+    Nodes without an embedding are skipped together with their subtree, like the old recursive search.
+    :param taxonomy_tree: The taxonomy tree with precomputed embeddings.
+    :return: A TaxonomyEmbeddings tuple; top-level nodes have depth 1 and parent -1.
+    """
+    ids = []
+    descriptions = []
+    parents = []
+    depths = []
+    embeddings = []
+
+    def visit(node, current_id, parent, depth):
+        embedding = node.get('_embedding', None)
+        if embedding is None:
+            logging.warning(f"No embedding found for node '{node.get('_description', '')}'")
+            return
+
+        row = len(ids)
+        ids.append(node.get('_id', current_id))
+        descriptions.append(node.get('_description', 'Unmapped'))
+        parents.append(parent)
+        depths.append(depth)
+        embeddings.append(embedding)
+
+        for key, child_node in node.items():
+            if key.startswith("_"):
+                continue
+            visit(child_node, child_node.get('_id', f"{current_id}.{key}"), row, depth + 1)
+
+    for index, (key, node) in enumerate(taxonomy_tree.items()):
+        if key.startswith("_"):
+            continue
+        visit(node, f"{index + 1}", -1, 1)
+
+    matrix = np.asarray(embeddings, dtype=np.float32) if embeddings else np.empty((0, 0), dtype=np.float32)
+    return TaxonomyEmbeddings(ids, descriptions, np.asarray(parents, dtype=np.int32),
+                              np.asarray(depths, dtype=np.int16), matrix, None)
+
+
+def save_taxonomy_embeddings(taxonomy, embeddings, data_dir, model_name=None):
+    """
+    Write the embedded taxonomy as a float32 .npy matrix, a small node index and an ID-annotated tree JSON.
+    :param taxonomy: The TaxonomyIndex the embeddings belong to.
+    :param embeddings: One embedding per taxonomy row.
+    :param data_dir: The directory to write the artifacts to.
+    :param model_name: The name of the model that produced the embeddings.
+    :return: The TaxonomyEmbeddings that were written.
+    """
+    descriptions = ['Unmapped' if description is None else description for description in taxonomy.descriptions]
+    nodes = TaxonomyEmbeddings(taxonomy.ids.tolist(), descriptions, taxonomy.parents, taxonomy.depths,
+                               np.asarray(embeddings, dtype=np.float32), model_name)
+    write_taxonomy_embeddings(nodes, data_dir)
+
+    with open(os.path.join(data_dir, TREE_WITH_IDS_FILE), 'w') as file:
+        json.dump(taxonomy.to_nested_dict(with_ids=True), file, indent=4)
+
+    return nodes
+
+
+def write_taxonomy_embeddings(nodes, data_dir):
+    """Write a TaxonomyEmbeddings tuple as the .npy matrix plus the node index."""
+    np.save(os.path.join(data_dir, EMBEDDINGS_FILE), np.ascontiguousarray(nodes.embeddings, dtype=np.float32))
+
+    node_index = {
+        'model': nodes.model,
+        'dim': int(nodes.embeddings.shape[1]) if len(nodes.ids) else 0,
+        'ids': list(nodes.ids),
+        'descriptions': list(nodes.descriptions),
+        'parents': np.asarray(nodes.parents).tolist(),
+        'depths': np.asarray(nodes.depths).tolist()
+    }
+    with open(os.path.join(data_dir, NODE_INDEX_FILE), 'w') as file:
+        json.dump(node_index, file, separators=(',', ':'))
+
+
+def load_taxonomy_embeddings(data_dir, mmap=True):
+    """
+    Load the taxonomy node index and embeddings, whichever format is on disk.
+    The .npy matrix is memory-mapped read-only by default, so loading does not copy the vectors.
+    Falls back to the legacy taxonomy_tree_with_embeddings.json if no binary artifact exists.
+    :param data_dir: The directory holding the artifacts (e.g. './mnt/data').
+    :param mmap: Whether to memory-map the embedding matrix instead of reading it into memory.
+    :return: A TaxonomyEmbeddings tuple.
+    """
+    embeddings_path = os.path.join(data_dir, EMBEDDINGS_FILE)
+    index_path = os.path.join(data_dir, NODE_INDEX_FILE)
+
+    if not (os.path.exists(embeddings_path) and os.path.exists(index_path)):
+        legacy_path = os.path.join(data_dir, LEGACY_TREE_FILE)
+        logging.warning(f"No binary embeddings in '{data_dir}', falling back to '{LEGACY_TREE_FILE}'")
+        with open(legacy_path, 'r') as file:
+            return flatten_taxonomy_tree(json.load(file))
+
+    with open(index_path, 'r') as file:
+        node_index = json.load(file)
+
+    embeddings = np.load(embeddings_path, mmap_mode='r' if mmap else None)
+    if embeddings.shape[0] != len(node_index['ids']):
+        raise ValueError(f"'{EMBEDDINGS_FILE}' has {embeddings.shape[0]} rows but the node index lists {len(node_index['ids'])} nodes")
+
+    return TaxonomyEmbeddings(
+        node_index['ids'],
+        node_index['descriptions'],
+        np.asarray(node_index['parents'], dtype=np.int32),
+        np.asarray(node_index['depths'], dtype=np.int16),
+        embeddings,
+        node_index.get('model')
+    )
@@ -0,0 +1,71 @@
+import json
+import os
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+DEFAULT_RULES_PATH = os.environ.get(
+    'OCCUPATION_RULES_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'occupation_categories.json')
+)
+DEFAULT_CATEGORY = "Other"
+
+
+class OccupationCategorizer:
+    """
+    Keyword rules that assign occupation titles to categories.
+    Rules are checked in order and the first rule with a keyword anywhere in the title (case-insensitive)
+    wins; titles matching no rule get the default category. Titles are classified a whole Series at a
+    time: each distinct title is lower-cased once, and each rule only scans the titles still unmatched.
+    """
+
+    def __init__(self, rules, default=DEFAULT_CATEGORY):
+        """
+        :param rules: A list of {"category": ..., "keywords": [...]} dicts, in priority order.
+        :param default: The category for titles that match no rule.
+        """
+        self.categories = [rule['category'] for rule in rules]
+        self.keywords = [[keyword.lower() for keyword in rule['keywords']] for rule in rules]
+        self.default = default
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_RULES_PATH):
+        with open(path, 'r') as file:
+            return cls(json.load(file))
+
+    def categorize(self, titles):
+        """
+        :param titles: A Series (or other array-like) of occupation titles.
+        :return: A Series of categories aligned with `titles`.
+        """
+        titles = titles if isinstance(titles, pd.Series) else pd.Series(titles)
+
+        # Posting titles repeat heavily, so match each distinct title once and broadcast back
+        codes, uniques = pd.factorize(titles)
+        lowered = pd.Series(uniques).astype(str).str.lower()
+
+        # Rules are applied in priority order, each only to the titles no earlier rule matched
+        unique_categories = np.full(len(lowered), self.default, dtype=object)
+        remaining = np.arange(len(lowered))
+        for category, keywords in zip(self.categories, self.keywords):
+            if len(remaining) == 0:
+                break
+            candidates = lowered.iloc[remaining]
+            matched = np.zeros(len(remaining), dtype=bool)
+            for keyword in keywords:
+                matched |= candidates.str.contains(keyword, regex=False).to_numpy(dtype=bool)
+            unique_categories[remaining[matched]] = category
+            remaining = remaining[~matched]
+
+        categories = np.append(unique_categories, self.default)[codes]  # code -1 (missing title) -> default
+        return pd.Series(categories, index=titles.index, name='Category')
+
+
+@lru_cache(maxsize=None)
+def load_categorizer(path=DEFAULT_RULES_PATH):
+    return OccupationCategorizer.from_file(path)
+
+
+def categorize_occupations(titles, rules_path=DEFAULT_RULES_PATH):
+    """Categorize occupation titles with the rules file (compiled once per process)."""
+    return load_categorizer(rules_path).categorize(titles)
@@ -1,40 +1,20 @@
-import pandas as pd
-from sentence_transformers import SentenceTransformer
-
-def map_occupation_to_category(occupation):
-    # Define the keyword-to-category mapping
-    keywords = [
-        "Engineer",
-        "Technician",
-        "Specialist",
-        "Operator",
-        "Inspector",
-        "Mechanic",
-        "Manager",
-        "Technologist",
-        "Trade",
-        "Scheduler",
-        "Planner",
-        "Coordinator"
-    ]
-
-    occupation_lower = occupation.lower()
-
-    for keyword in keywords:
-        if keyword.lower() in occupation_lower:
-            return keyword if (keyword != 'Planner' or keyword != 'Coordinator' or keyword != 'Scheduler') else "Scheduler (or related profession)"
-
-    return "Other"
+import os
+import sys
+
+# Shared modules live one directory up in visuals/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from artifacts import load_artifact, save_artifact
+from occupation_categories import categorize_occupations
 
 def cluster_occupations():
-    # Load the CSV file
-    df = pd.read_csv('../mnt/data/reformatted_occupations.csv')
+    # Load the occupations
+    df = load_artifact('reformatted_occupations', data_dir='../mnt/data')
 
     # Manually group occupations based on keywords
-    df['Category'] = df['core_occupation'].apply(map_occupation_to_category)
+    df['Category'] = categorize_occupations(df['core_occupation'])
 
     # Keep each occupation as a separate row, while categorizing it
-    df.sort_values(by=['Category']).to_csv('../mnt/extras/occupation_clusters_individual.csv', index=False)
+    save_artifact(df.sort_values(by=['Category']), 'occupation_clusters_individual', data_dir='../mnt/extras')
 
 if __name__ == "__main__":
     cluster_occupations()
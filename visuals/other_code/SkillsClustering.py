@@ -1,39 +1,100 @@
+import argparse
+import os
+import sys
+import time
 import pandas as pd
-from sentence_transformers import SentenceTransformer
-from scipy.cluster.hierarchy import linkage, dendrogram, fcluster
+from scipy.cluster.hierarchy import linkage
 import numpy as np
 
-def cluster_skills():
-    # Load the CSV file
-    df = pd.read_csv('../mnt/data/reformatted_skills.csv')
+# Shared modules live one directory up in visuals/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from artifacts import load_artifact
+from embedding_cache import CachedEncoder
+from ward_clustering import (DEFAULT_MICRO_CLUSTERS, adjusted_rand_index, cut_at_thresholds, save_linkage, scalable_ward,
+                             scalable_ward_linkage)
 
-    # Extract the relevant columns
-    sentences = df['skill'].tolist()
-    skill_ids = df['skill_id'].tolist()
+# Define multiple thresholds for different clustering levels
+THRESHOLDS = np.linspace(0.5, 10.0, num=20)  # Generates 20 threshold levels between 0.5 and 10.0
 
-    # Load the pre-trained model
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+# The merge tree is saved for skills_clusters_view.py, so the explorer does not have to re-cluster
+LINKAGE_PATH = '../mnt/extras/skill_linkage.npz'
 
-    # Generate embeddings for the sentences
-    embeddings = model.encode(sentences)
+def skill_leaves(df):
+    # What a saved linkage was built from: every skill ID and text, in order
+    return (df['skill_id'].astype(str) + '\t' + df['skill'].astype(str)).tolist()
 
-    # Perform hierarchical clustering
+def exact_ward(embeddings, thresholds):
+    # Perform hierarchical clustering (memory grows with the square of the number of skills)
     Z = linkage(embeddings, method='ward')
 
-    # Define multiple thresholds for different clustering levels
-    thresholds = np.linspace(0.5, 10.0, num=20)  # Generates 20 threshold levels between 0.5 and 10.0
+    # Cut the tree at every threshold in a single pass
+    return cut_at_thresholds(Z, thresholds)
+
+def load_skill_embeddings():
+    # Load the skills
+    df = load_artifact('reformatted_skills', columns=['skill_id', 'skill'], data_dir='../mnt/data')
+
+    # Load the pre-trained model (through the shared embedding cache)
+    model = CachedEncoder('all-MiniLM-L6-v2')
+
+    # Generate embeddings for the sentences
+    embeddings = model.encode(df['skill'].tolist())
+    return df, embeddings
+
+def cluster_skills(method='exact', max_leaves=DEFAULT_MICRO_CLUSTERS):
+    """
+    :param method: 'exact' for Ward linkage over all skills, or 'scalable' for the bounded-memory
+                   approximation (exact Ward within groups of at most `max_leaves` skills).
+    """
+    df, embeddings = load_skill_embeddings()
 
-    # Create a DataFrame to hold all clusters at different thresholds
-    clusters_df = pd.DataFrame({'skill_id': skill_ids, 'skill': sentences})
+    if method == 'exact':
+        Z = linkage(embeddings, method='ward')
+    else:
+        Z = scalable_ward_linkage(embeddings, max_leaves=max_leaves)
+    save_linkage(LINKAGE_PATH, Z, skill_leaves(df))
 
-    # For each threshold, generate clusters and add them as a column in the DataFrame
-    for i, threshold in enumerate(thresholds):
-        clusters = fcluster(Z, t=threshold, criterion='distance')
+    # Cut the tree at every threshold in a single pass
+    labels = cut_at_thresholds(Z, THRESHOLDS)
+
+    # Create a DataFrame to hold all clusters at different thresholds, one column per threshold
+    clusters_df = pd.DataFrame({'skill_id': df['skill_id'].tolist(), 'skill': df['skill'].tolist()})
+    for threshold, clusters in zip(THRESHOLDS, labels):
         clusters_df[f'Cluster_Threshold_{round(threshold, 2)}'] = clusters
 
     # Save the DataFrame with cluster assignments to a new CSV file
     clusters_df.to_csv('../mnt/extras/skill_clusters.csv', index=False)
     print("Clustered data exported to 'skill_clusters.csv'.")
 
+def compare_methods(max_leaves):
+    """Print how closely the scalable clustering agrees with exact Ward at every threshold (adjusted Rand index)."""
+    _, embeddings = load_skill_embeddings()
+
+    started = time.perf_counter()
+    exact = exact_ward(embeddings, THRESHOLDS)
+    exact_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    scalable = scalable_ward(embeddings, THRESHOLDS, max_leaves=max_leaves)
+    scalable_seconds = time.perf_counter() - started
+
+    print(f"{len(embeddings)} skills, at most {max_leaves} clustered at once by the scalable mode")
+    print(f"{'Threshold':>10}{'Exact':>8}{'Scalable':>10}{'ARI':>8}")
+    for threshold, exact_labels, scalable_labels in zip(THRESHOLDS, exact, scalable):
+        print(f"{threshold:>10.2f}{exact_labels.max():>8}{scalable_labels.max():>10}"
+              f"{adjusted_rand_index(exact_labels, scalable_labels):>8.3f}")
+    print(f"Exact Ward: {exact_seconds:.2f}s, scalable: {scalable_seconds:.2f}s")
+
 if __name__ == "__main__":
-    cluster_skills()
+    parser = argparse.ArgumentParser(description="Cluster skills hierarchically at several distance thresholds.")
+    parser.add_argument('--method', choices=['exact', 'scalable'], default='exact',
+                        help="Exact Ward needs memory quadratic in the number of skills; scalable is bounded by --max-leaves.")
+    parser.add_argument('--max-leaves', type=int, default=DEFAULT_MICRO_CLUSTERS,
+                        help="Largest set the scalable mode clusters at once; larger sets are split with k-means first.")
+    parser.add_argument('--compare', action='store_true', help="Compare the scalable mode with exact Ward instead of saving.")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_methods(args.max_leaves)
+    else:
+        cluster_skills(args.method, args.max_leaves)
@@ -1,10 +1,27 @@
-import pandas as pd
-from sentence_transformers import SentenceTransformer
+import logging
+import os
+import sys
+import time
 from scipy.cluster.hierarchy import linkage, dendrogram, fcluster
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import tkinter as tk
-from tkinter import filedialog
+from tkinter import filedialog, messagebox
+
+# Shared modules live one directory up in visuals/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from artifacts import load_artifact
+from embedding_cache import CachedEncoder
+from ward_clustering import clusters_at, load_linkage, save_linkage
+from SkillsClustering import LINKAGE_PATH, skill_leaves
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# The dendrogram only draws the last merges, however many skills there are
+DENDROGRAM_LEAVES = 60
+
+# Redraw the dendrogram once the slider has been still for this long
+REDRAW_DELAY_MS = 250
 
 class ClusteringApp:
     def __init__(self, root):
@@ -14,21 +31,16 @@ class ClusteringApp:
         # Bind the closing event
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
-        # Load the CSV file
-        self.df = pd.read_csv('../mnt/data/reformatted_skills.csv')
+        # Load the skills
+        self.df = load_artifact('reformatted_skills', data_dir='../mnt/data')
 
         # Extract the relevant columns
         self.sentences = self.df['skill'].tolist()
         self.skill_ids = self.df['skill_id'].tolist()
 
-        # Load the pre-trained model
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-
-        # Generate embeddings for the sentences
-        self.embeddings = self.model.encode(self.sentences)
-
-        # Perform hierarchical clustering
-        self.Z = linkage(self.embeddings, method='ward')
+        # Load the hierarchical clustering saved by SkillsClustering.py, or cluster now if it is missing or stale
+        self.Z = self.load_or_build_linkage()
+        self.pending_redraw = None
 
         # Create a figure for the dendrogram
         self.fig, self.ax = plt.subplots(figsize=(10, 7))
@@ -54,32 +66,67 @@ class ClusteringApp:
         self.canvas = FigureCanvasTkAgg(self.fig, master=root)
         self.canvas.get_tk_widget().pack()
 
-        # Initial plot
+        # Initial plot; from then on the cluster count follows the slider and the plot catches up when it stops
         self.update_dendrogram()
+        self.slider.config(command=self.on_threshold_change)
+
+    def load_or_build_linkage(self):
+        leaves = skill_leaves(self.df)
+        Z = load_linkage(LINKAGE_PATH, leaves)
+        if Z is not None:
+            logging.info(f"Loaded the clustering of {len(self.df)} skills from {LINKAGE_PATH}")
+            return Z
+
+        started = time.perf_counter()
+
+        # Load the pre-trained model (through the shared embedding cache) and embed the skills
+        embeddings = CachedEncoder('all-MiniLM-L6-v2').encode(self.sentences)
+
+        # Perform hierarchical clustering, and keep it for the next start
+        Z = linkage(embeddings, method='ward')
+        save_linkage(LINKAGE_PATH, Z, leaves)
+        logging.info(f"Clustered {len(self.df)} skills in {time.perf_counter() - started:.2f}s")
+        return Z
+
+    def on_threshold_change(self, value):
+        threshold = float(value)
+
+        # Counting clusters is a binary search over the merge heights, cheap enough for every slider step
+        self.cluster_label.config(text=f"Number of Clusters: {clusters_at(self.Z, threshold)}")
+
+        # The dendrogram is only redrawn when the slider stops moving
+        if self.pending_redraw is not None:
+            self.root.after_cancel(self.pending_redraw)
+        self.pending_redraw = self.root.after(REDRAW_DELAY_MS, self.update_dendrogram)
+
+    def leaf_label(self, node):
+        # A single skill shows its ID, a collapsed cluster its number of skills
+        if node < len(self.skill_ids):
+            return str(self.skill_ids[node])
+        return f"({int(self.Z[node - len(self.skill_ids), 3])})"
 
     def update_dendrogram(self):
+        self.pending_redraw = None
+
         # Clear the previous plot
         self.ax.clear()
 
         # Get the current value of the slider
         threshold = self.slider.get()
 
-        # Update the dendrogram
-        dendrogram(self.Z, ax=self.ax, labels=self.skill_ids, leaf_rotation=90, color_threshold=threshold)
+        # Update the dendrogram, collapsed to its last merges; collapsed leaves show their skill counts
+        dendrogram(self.Z, ax=self.ax, leaf_label_func=self.leaf_label, leaf_rotation=90, color_threshold=threshold,
+                   truncate_mode='lastp', p=DENDROGRAM_LEAVES)
         self.ax.axhline(y=threshold, color='r', linestyle='--')
         self.ax.set_title('Hierarchical Clustering Dendrogram')
-        self.ax.set_xlabel('Skill ID')
+        self.ax.set_xlabel('Skill ID (or number of skills)')
         self.ax.set_ylabel('Distance')
 
-        # Calculate the number of clusters
-        clusters = fcluster(self.Z, t=threshold, criterion='distance')
-        num_clusters = len(set(clusters))
-
         # Update the cluster count label
-        self.cluster_label.config(text=f"Number of Clusters: {num_clusters}")
+        self.cluster_label.config(text=f"Number of Clusters: {clusters_at(self.Z, threshold)}")
 
         # Redraw the canvas
-        self.canvas.draw()
+        self.canvas.draw_idle()
 
     def export_data(self):
         # Get the current value of the slider
@@ -96,15 +143,18 @@ class ClusteringApp:
                                                  filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
         if save_path:
             self.df.to_csv(save_path, index=False)
-            tk.messagebox.showinfo("Export Successful", f"Clustered data exported to {save_path}")
+            messagebox.showinfo("Export Successful", f"Clustered data exported to {save_path}")
 
     def on_closing(self):
+        if self.pending_redraw is not None:
+            self.root.after_cancel(self.pending_redraw)
         self.root.quit()
         self.root.destroy()
 
-# Create the main window
-root = tk.Tk()
-app = ClusteringApp(root)
+if __name__ == "__main__":
+    # Create the main window
+    root = tk.Tk()
+    app = ClusteringApp(root)
 
-# Run the Tkinter event loop
-root.mainloop()
\ No newline at end of file
+    # Run the Tkinter event loop
+    root.mainloop()
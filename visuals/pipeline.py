@@ -0,0 +1,245 @@
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+VISUALS_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_PATH = os.path.join(VISUALS_DIR, 'mnt', 'cache', 'pipeline_state.json')
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Inputs and outputs are glob patterns relative to the visuals/ directory (the scripts' working directory).
+# Artifacts saved through artifacts.py may be Parquet or CSV, hence the ".*" patterns.
+TAXONOMY_CSV = 'mnt/data/complete_taxonomy.*'
+TAXONOMY_TREE = 'mnt/data/taxonomy_tree.json'
+TAXONOMY_INDEX = 'mnt/data/taxonomy_index.npz'
+EMBEDDINGS = ['mnt/data/taxonomy_embeddings.npy', 'mnt/data/taxonomy_nodes.json', 'mnt/data/taxonomy_tree_with_ids.json']
+SKILLS = 'mnt/data/reformatted_skills.*'
+SKILL_MAPPING = 'mnt/data/threshold_skills_insertion.*'
+HEATMAP = 'mnt/data/aggregated_heatmap_data_with_categories.csv'
+# The taxonomy viewer is a separate checkout next to this repository; taxonomy.py skips it when it is missing
+VIEWER_DIR = '../taxonomy_viewer/src/assets'
+
+# A stage runs `python <script> <args>` in visuals/. Dependencies between stages follow from their
+# inputs and outputs. Stages with default=False only run when named on the command line.
+Stage = namedtuple('Stage', ['name', 'script', 'args', 'inputs', 'outputs', 'default'])
+
+STAGES = [
+    Stage('taxonomy', 'taxonomy.py', ['--viewer-dir', VIEWER_DIR],
+          ['taxonomy.py', 'taxonomy_index.py', 'artifacts.py', TAXONOMY_CSV],
+          [TAXONOMY_TREE, TAXONOMY_INDEX, 'mnt/data/taxonomy_tree.txt', f'{VIEWER_DIR}/taxonomy_tree.json'], True),
+    Stage('embeddings', 'precomputing_embeddings.py', ['--incremental'],
+          ['precomputing_embeddings.py', 'embedding_store.py', 'embedding_cache.py', 'taxonomy_matching.py', 'taxonomy_index.py',
+           TAXONOMY_INDEX],
+          EMBEDDINGS, True),
+    Stage('mapping', 'threshold_inserting_into_taxonomy.py', [],
+          ['threshold_inserting_into_taxonomy.py', 'taxonomy_matching.py', 'embedding_cache.py', 'artifacts.py', SKILLS] + EMBEDDINGS,
+          [SKILL_MAPPING], True),
+    Stage('chapters', 'skills_taxonomy_formatting.py', [],
+          ['skills_taxonomy_formatting.py', 'artifacts.py', 'taxonomy_index.py', TAXONOMY_INDEX, SKILL_MAPPING],
+          ['mnt/data/skill_taxonomy_with_locations.*', 'mnt/data/skills_in_chapters.docx'], True),
+    Stage('aggregation', 'workforce_aggregation.py', [],
+          ['workforce_aggregation.py', 'taxonomy_rollup.py', 'taxonomy_index.py', 'occupation_categories.*', 'artifacts.py', SKILLS, SKILL_MAPPING,
+           TAXONOMY_CSV, 'mnt/data/complete_canada_data.xlsx', 'mnt/data/occupation_clusters_individual.*'],
+          [HEATMAP], True),
+    Stage('clustergram', 'Clustergram.py', ['--batch'],
+          ['Clustergram.py', HEATMAP],
+          ['mnt/figures/clustergram_*.png'], False)
+]
+
+
+class FileHasher:
+    """SHA-256 of file contents, remembered by (size, mtime) so unchanged files are not re-read."""
+
+    def __init__(self, known=None):
+        self.known = dict(known or {})
+
+    def file_digest(self, path):
+        stat = os.stat(path)
+        entry = self.known.get(path)
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return entry['sha256']
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        self.known[path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': digest.hexdigest()}
+        return digest.hexdigest()
+
+    def fingerprint(self, patterns, salt=''):
+        """Hash of every file matched by the glob patterns (paths and contents), plus an optional salt."""
+        digest = hashlib.sha256(salt.encode('utf-8'))
+        for pattern in patterns:
+            for path in sorted(glob.glob(os.path.join(VISUALS_DIR, pattern))):
+                if os.path.isfile(path):
+                    digest.update(os.path.relpath(path, VISUALS_DIR).encode('utf-8'))
+                    digest.update(self.file_digest(path).encode('utf-8'))
+        return digest.hexdigest()
+
+
+def with_viewer_dir(stages, viewer_dir):
+    """Point the taxonomy stage's viewer export (and the output tracked for it) at another directory."""
+    return [stage._replace(args=['--viewer-dir', viewer_dir],
+                           outputs=[output for output in stage.outputs if not output.startswith(VIEWER_DIR)]
+                           + [os.path.join(viewer_dir, 'taxonomy_tree.json')])
+            if stage.name == 'taxonomy' else stage for stage in stages]
+
+
+def stage_dependencies(stages):
+    """Map each stage name to the names of the stages producing one of its inputs."""
+    producers = {output: stage.name for stage in stages for output in stage.outputs}
+    return {stage.name: sorted({producers[pattern] for pattern in stage.inputs if pattern in producers} - {stage.name})
+            for stage in stages}
+
+
+def select_stages(stages, targets):
+    """The requested stages (or all default ones) plus everything upstream of them, in declaration order."""
+    by_name = {stage.name: stage for stage in stages}
+    unknown = [target for target in targets if target not in by_name]
+    if unknown:
+        raise SystemExit(f"Unknown stages {unknown}; choose from {list(by_name)}")
+
+    dependencies = stage_dependencies(stages)
+    selected = set()
+    pending = list(targets) if targets else [stage.name for stage in stages if stage.default]
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(dependencies[name])
+    return [stage for stage in stages if stage.name in selected]
+
+
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return {'stages': {}, 'files': {}}
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w') as file:
+        json.dump(state, file, indent=4)
+    os.replace(temporary_path, path)
+
+
+def run_stage(stage):
+    """Run a stage's script in visuals/, returning (exit code, seconds). Plots render off-screen."""
+    started = time.perf_counter()
+    environment = dict(os.environ, MPLBACKEND=os.environ.get('MPLBACKEND', 'Agg'))
+    result = subprocess.run([sys.executable, stage.script] + stage.args, cwd=VISUALS_DIR, env=environment)
+    return result.returncode, time.perf_counter() - started
+
+
+def run_pipeline(stages, jobs=2, force=False, dry_run=False):
+    """
+    Run stages in dependency order, up to `jobs` at a time. A stage is skipped when the fingerprints of its
+    inputs and outputs match the last successful run; stages downstream of a failure are not run.
+    :return: A list of (stage name, status, seconds) in completion order.
+    """
+    state = load_state()
+    hasher = FileHasher(state.get('files'))
+    dependencies = {name: [dep for dep in deps if dep in {stage.name for stage in stages}]
+                    for name, deps in stage_dependencies(stages).items()}
+
+    waiting = {stage.name: stage for stage in stages}
+    finished = {}
+    report = []
+    running = {}
+
+    def start_ready(executor):
+        for name, stage in list(waiting.items()):
+            if len(running) >= jobs:
+                return
+            if not all(dep in finished for dep in dependencies[name]):
+                continue
+            del waiting[name]
+
+            if any(finished[dep] == 'failed' or finished[dep] == 'blocked' for dep in dependencies[name]):
+                finished[name] = 'blocked'
+                report.append((name, 'blocked', 0.0))
+                continue
+
+            input_hash = hasher.fingerprint(stage.inputs, salt=' '.join([stage.script] + stage.args))
+            previous = state['stages'].get(name, {})
+            up_to_date = (previous.get('inputs') == input_hash
+                          and previous.get('outputs') == hasher.fingerprint(stage.outputs))
+            if dry_run and any(finished[dep] == 'would run' for dep in dependencies[name]):
+                up_to_date = False
+            if dry_run or (up_to_date and not force):
+                status = 'up to date' if up_to_date else 'would run'
+                finished[name] = status
+                report.append((name, status, 0.0))
+                logging.info(f"{name}: {status}")
+                continue
+
+            logging.info(f"{name}: running {stage.script} {' '.join(stage.args)}".rstrip())
+            running[executor.submit(run_stage, stage)] = (stage, input_hash)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        start_ready(executor)
+        while running or waiting:
+            if not running:
+                start_ready(executor)
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, input_hash = running.pop(future)
+                returncode, seconds = future.result()
+                if returncode == 0:
+                    finished[stage.name] = 'ran'
+                    state['stages'][stage.name] = {'inputs': input_hash, 'outputs': hasher.fingerprint(stage.outputs),
+                                                   'seconds': round(seconds, 3), 'finished_at': time.time()}
+                else:
+                    finished[stage.name] = 'failed'
+                    state['stages'].pop(stage.name, None)
+                    logging.error(f"{stage.name}: exited with code {returncode}")
+                report.append((stage.name, finished[stage.name], seconds))
+                logging.info(f"{stage.name}: {finished[stage.name]} in {seconds:.2f}s")
+            start_ready(executor)
+
+    if not dry_run:
+        state['files'] = hasher.known
+        save_state(state)
+    return report
+
+
+def print_report(report, total_seconds):
+    print(f"\n{'Stage':<14}{'Status':<12}{'Seconds':>9}")
+    for name, status, seconds in report:
+        print(f"{name:<14}{status:<12}{seconds:>9.2f}")
+    print(f"{'total':<26}{total_seconds:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the taxonomy pipeline, skipping stages whose inputs did not change.")
+    parser.add_argument('stages', nargs='*', help=f"Stages to bring up to date, with their upstream stages "
+                                                 f"(default: all except {[s.name for s in STAGES if not s.default]})")
+    parser.add_argument('--jobs', '-j', type=int, default=2, help="Stages to run in parallel.")
+    parser.add_argument('--force', action='store_true', help="Run the selected stages even if they are up to date.")
+    parser.add_argument('--dry-run', action='store_true', help="Only show which stages would run.")
+    parser.add_argument('--viewer-dir', default=VIEWER_DIR,
+                        help="The taxonomy viewer's assets directory, relative to visuals/ (skipped if it does not exist).")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    stages = with_viewer_dir(STAGES, args.viewer_dir) if args.viewer_dir != VIEWER_DIR else STAGES
+    report = run_pipeline(select_stages(stages, args.stages), jobs=args.jobs, force=args.force, dry_run=args.dry_run)
+    print_report(report, time.perf_counter() - started)
+    if any(status in ('failed', 'blocked') for _, status, _ in report):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
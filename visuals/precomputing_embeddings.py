@@ -1,54 +1,114 @@
-import json
-from sentence_transformers import SentenceTransformer
+import argparse
+import logging
+import os
+import numpy as np
+from embedding_cache import CachedEncoder
+from embedding_store import EMBEDDINGS_FILE, load_taxonomy_embeddings, save_taxonomy_embeddings
+from taxonomy_index import load_taxonomy_index
+from taxonomy_matching import encode_texts
 
-# Load the model for generating embeddings
-model = SentenceTransformer('msmarco-distilbert-base-v4')
+MODEL_NAME = 'msmarco-distilbert-base-v4'
+DEFAULT_BATCH_SIZE = 64
 
-def generate_embedding(text):
-    """Generate an embedding for a given text using the SentenceTransformer model."""
-    return model.encode(text).tolist()  # Convert to list for JSON serialization
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def recursive_compute_embeddings(node, parent_embedding=None, current_id=""):
+# Embeddings go through the shared cache; the model only loads on a cache miss
+model = CachedEncoder(MODEL_NAME)
+
+def combined_descriptions(descriptions, parents):
+    """
+    Each node's description prefixed by its parent's combined description.
+    Rows are in depth-first order, so a parent's text is always built before its children's.
+    """
+    combined = []
+    for row, description in enumerate(descriptions):
+        parent = parents[row]
+        # The root only groups the top-level nodes and contributes an empty description
+        parent_description = combined[parent] if parent >= 0 else " "
+        combined.append(parent_description + " " + description)
+    return combined
+
+def node_texts(taxonomy):
+    """The text to embed for every row of a TaxonomyIndex."""
+    return combined_descriptions(["" if description is None else description for description in taxonomy.descriptions],
+                                 taxonomy.parents)
+
+def previous_node_texts(previous):
+    """
+    Rebuild the combined description of every node in a previously embedded taxonomy.
+    :param previous: A TaxonomyEmbeddings tuple loaded from the last run.
+    :return: A dict mapping each node ID to its (combined_description, row) in the previous artifacts.
+    """
+    combined = combined_descriptions(previous.descriptions, previous.parents)
+    return {node_id: (combined[row], row) for row, node_id in enumerate(previous.ids)}
+
+def compute_embeddings(taxonomy, batch_size=DEFAULT_BATCH_SIZE, previous=None):
     """
-    Recursively compute embeddings for each node in the taxonomy tree and assign unique IDs.
-    :param node: The current node in the taxonomy tree.
-    :param parent_embedding: The embedding of the parent node's description.
-    :param current_id: The current ID path (e.g., "6.4.2.2") for the node in the taxonomy.
+    Compute embeddings for every node in the taxonomy in batched forward passes.
+    Repeated texts are encoded once and the results are scattered back to their nodes.
+    :param taxonomy: A TaxonomyIndex.
+    :param previous: Optional TaxonomyEmbeddings from the last run. A node keeps its previous embedding
+                     when a node with the same ID had the same combined description, i.e. neither its
+                     own description nor any ancestor's changed; only new or edited subtrees are encoded.
+    :return: A float32 (nodes x dim) matrix in the taxonomy's row order.
     """
-    node_description = node.get("_description", "")
-    combined_description = (parent_embedding or "") + " " + node_description
-
-    # Ensure only one embedding is computed per node
-    if isinstance(node.get("_embedding"), list) and not isinstance(node["_embedding"][0], float):
-        # This condition checks if there’s already a nested list (list of lists), indicating an issue
-        print(f"Warning: Nested list found at node: {node_description}. Resetting to a single embedding.")
-        node["_embedding"] = generate_embedding(combined_description)
-    else:
-        # Generate and store the embedding
-        node["_embedding"] = generate_embedding(combined_description)
-
-    # Assign the ID to the node
-    node["_id"] = current_id
-
-    # Recursively compute embeddings and assign IDs for child nodes
-    for index, (key, child_node) in enumerate(node.items()):
-        if not key.startswith("_"):
-            child_id = f"{current_id}.{index}" if current_id else f"{index + 1}"
-            recursive_compute_embeddings(child_node, combined_description, child_id)
+    texts = node_texts(taxonomy)
+    pending = np.arange(len(texts))
+    embeddings = None
+
+    if previous is not None:
+        previous_texts = previous_node_texts(previous)
+        previous_rows = np.full(len(texts), -1, dtype=np.int64)
+        for row, (node_id, text) in enumerate(zip(taxonomy.ids.tolist(), texts)):
+            previous_text, previous_row = previous_texts.get(node_id, (None, -1))
+            if previous_text == text:
+                previous_rows[row] = previous_row
+        pending = np.flatnonzero(previous_rows < 0)
+        embeddings = np.empty((len(texts), previous.embeddings.shape[1]), dtype=np.float32)
+        reused = np.flatnonzero(previous_rows >= 0)
+        embeddings[reused] = previous.embeddings[previous_rows[reused]]
+        logging.info(f"Reusing {len(reused)} unchanged node embeddings, {len(pending)} nodes changed")
+
+    if not len(pending):
+        return embeddings if embeddings is not None else np.empty((0, 0), dtype=np.float32)
+
+    pending_texts = [texts[row] for row in pending]
+    logging.info(f"Encoding {len(set(pending_texts))} distinct texts for {len(pending_texts)} taxonomy nodes (batch size {batch_size})")
+
+    encoded = np.asarray(encode_texts(model, pending_texts, batch_size=batch_size), dtype=np.float32)
+    if embeddings is None:
+        return encoded
+    embeddings[pending] = encoded
+    return embeddings
 
 def main():
-    # Load the taxonomy tree from the JSON file
-    with open('./mnt/data/taxonomy_tree.json', 'r') as file:
-        taxonomy_tree = json.load(file)
+    parser = argparse.ArgumentParser(description="Precompute taxonomy node embeddings.")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Texts per forward pass.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only re-embed nodes whose description or ancestry changed since the last run.")
+    args = parser.parse_args()
+
+    # Load the taxonomy arrays saved by taxonomy.py
+    taxonomy = load_taxonomy_index('./mnt/data')
+
+    # Load the last run's embeddings fully into memory, since the artifacts are about to be overwritten
+    previous = None
+    if args.incremental:
+        if os.path.exists(os.path.join('./mnt/data', EMBEDDINGS_FILE)):
+            previous = load_taxonomy_embeddings('./mnt/data', mmap=False)
+            if previous.model != MODEL_NAME:
+                logging.warning(f"Previous embeddings were made with '{previous.model}', re-embedding everything")
+                previous = None
+        else:
+            logging.warning("No previous embeddings found, re-embedding everything")
 
-    # Compute and store embeddings and assign IDs in the taxonomy tree
-    recursive_compute_embeddings(taxonomy_tree)
+    # Compute the embeddings, one row per taxonomy node
+    embeddings = compute_embeddings(taxonomy, batch_size=args.batch_size, previous=previous)
 
-    # Save the updated taxonomy tree with embeddings and IDs
-    with open('./mnt/data/taxonomy_tree_with_embeddings.json', 'w') as file:
-        json.dump(taxonomy_tree, file, indent=4)
+    # Save the embeddings as a memory-mappable matrix plus a node index, and the tree with IDs only
+    nodes = save_taxonomy_embeddings(taxonomy, embeddings, './mnt/data', model_name=MODEL_NAME)
 
-    print("Taxonomy tree with embeddings saved to 'taxonomy_tree_with_embeddings.json'.")
+    print(f"Embeddings for {len(nodes.ids)} taxonomy nodes saved to 'taxonomy_embeddings.npy' and 'taxonomy_nodes.json'.")
 
 if __name__ == "__main__":
     main()
@@ -1,26 +1,31 @@
+import argparse
+import copy
+import html
+import os
 import pandas as pd
-import json
 from anytree import Node, RenderTree, AsciiStyle
 from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
 from docx.shared import Pt
+from docx.text.paragraph import Paragraph
 import re
+from artifacts import load_artifact, save_artifact
+from taxonomy_index import load_taxonomy_index
 
 
-def get_taxonomy_path_description(taxonomy_id, taxonomy_dict):
+def get_taxonomy_path_description(taxonomy_id, taxonomy):
     """
-    Given a taxonomy ID (e.g., "6.4.2.2"), traverse the JSON tree to extract the full path with descriptions.
+    Given a taxonomy ID (e.g., "6.4.2.2"), look up its ancestors in the TaxonomyIndex to get the full path with descriptions.
     """
-    parts = taxonomy_id.split('.')
-    current_node = taxonomy_dict
+    row = taxonomy.row_of.get(taxonomy_id)
+    if row is None:
+        return f"Invalid Taxonomy ID: {taxonomy_id}"
+
     descriptions = []
-    
-    for part in parts:
-        if part in current_node:
-            description = current_node[part].get('_description', f"Missing description for {part}")
-            descriptions.append(f"{part} {description}")
-            current_node = current_node[part]  # Move deeper into the tree
-        else:
-            return f"Invalid Taxonomy ID: {taxonomy_id}"
+    for ancestor in taxonomy.ancestors(row):
+        part = taxonomy.ids[ancestor].rsplit('.', 1)[-1]
+        description = taxonomy.descriptions[ancestor]
+        descriptions.append(f"{part} {description if description is not None else f'Missing description for {part}'}")
 
     return descriptions
 
@@ -41,13 +46,14 @@ def build_taxonomy_tree_from_path(path_descriptions):
 
     return root
 
-def map_skills_to_taxonomy_location(skill_mapping_df, taxonomy_dict):
+def map_skills_to_taxonomy_location(skill_mapping_df, taxonomy):
     """
     Map each skill to its taxonomy path as formatted text.
+    Each distinct Taxonomy ID is rendered once and the result is shared by all skills mapped to it.
     """
     def get_formatted_taxonomy_path(taxonomy_id):
-        # Get the path descriptions from the taxonomy dictionary
-        path_descriptions = get_taxonomy_path_description(taxonomy_id, taxonomy_dict)
+        # Get the path descriptions from the taxonomy index
+        path_descriptions = get_taxonomy_path_description(taxonomy_id, taxonomy)
         if isinstance(path_descriptions, str):  # Handle errors
             return path_descriptions
         
@@ -58,113 +64,142 @@ def map_skills_to_taxonomy_location(skill_mapping_df, taxonomy_dict):
         return "\n".join([f"{pre}{node.name}" for pre, _, node in RenderTree(root, style=AsciiStyle())])
 
     # Add the taxonomy path to the DataFrame
-    skill_mapping_df['taxonomy_location'] = skill_mapping_df['Taxonomy ID'].apply(get_formatted_taxonomy_path)
+    locations = {taxonomy_id: get_formatted_taxonomy_path(taxonomy_id) for taxonomy_id in skill_mapping_df['Taxonomy ID'].unique()}
+    skill_mapping_df['taxonomy_location'] = skill_mapping_df['Taxonomy ID'].map(locations)
     return skill_mapping_df
 
-def generate_chapter_format(skill_mapping_df):
-
-    # Create a five-digit sort key where each level has two digits, ensuring consistent sorting
-    skill_mapping_df['sort_key'] = skill_mapping_df['Taxonomy ID'].apply(
-        lambda x: ''.join([f'{int(part):02d}' for part in x.split('.')])
-    )
+def taxonomy_sort_key(taxonomy_id):
+    # Two digits per level, so that e.g. "1.10" sorts after "1.9"
+    return ''.join([f'{int(part):02d}' for part in taxonomy_id.split('.')])
 
-    #skill_mapping_df['']
-
-    # Debugging step to verify sort keys
-    #print('\nChecking sort_key:')
-    #print(skill_mapping_df.sort_values(by='sort_key')[250:300][['Taxonomy ID', 'sort_key']])
+def iter_chapter_sections(skill_mapping_df):
+    """
+    Walk the mapping in taxonomy order, one section per Taxonomy ID.
+    Skill lines are formatted for the whole DataFrame at once rather than row by row.
+    :return: A generator of (taxonomy_id, level, title, skill_lines), where level 0 starts a new chapter.
+    """
+    # Create a sort key where each level has two digits, ensuring consistent sorting
+    sort_keys = {taxonomy_id: taxonomy_sort_key(taxonomy_id) for taxonomy_id in skill_mapping_df['Taxonomy ID'].unique()}
+    skill_mapping_df = skill_mapping_df.assign(sort_key=skill_mapping_df['Taxonomy ID'].map(sort_keys))
 
     # Sort by the generated sort key
     skill_mapping_df = skill_mapping_df.sort_values(by='sort_key')
 
-    grouped_skills = skill_mapping_df.groupby('Taxonomy ID', sort=False)
-    #specific_group = grouped_skills.get_group('1.1')
-    #print(specific_group['taxonomy_location'].unique())
-
-    counter = 0
-
-    #print('\nChecking if groups are sorted:')
-
-    # Iterate through each group in the grouped_skills object
-    """for id, group in grouped_skills:
-        # Iterate through the rows in the current group
-        for _, row in group.iterrows():
-            # Print the current element
-            print(f'{counter}\t{id}\t{row["sort_key"]}')
-            
-            # Increment the counter
-            counter += 1
-            
-            # Break if we've printed 300 elements
-            if counter == 300:
-                break
-        
-        # Break the outer loop as well if we've printed 300 elements
-        if counter == 300:
-            break"""
+    skill_lines = ("ID " + skill_mapping_df['skill_id'].astype(str) + ": " + skill_mapping_df['skill'].astype(str)
+                   + " (Similarity Score: " + skill_mapping_df['Similarity Score'].map('{:.4f}'.format) + ")")
+
+    for taxonomy_id, group in skill_lines.groupby(skill_mapping_df['Taxonomy ID'], sort=False):
+        locations = skill_mapping_df.loc[group.index, 'taxonomy_location'].unique()
+        if len(locations) > 1:
+            print(locations)
+
+        # Only the deepest level of the path gets a heading; its depth sets the heading level
+        path_levels = 'MAPPING_ERROR'.join(locations).split('\n')
+        level = len(path_levels) - 1
+        title = re.sub(r'^\d+\s+', '', path_levels[-1].replace('+-- ', '').strip())
 
+        yield taxonomy_id, level, title, group.tolist()
+
+class ParagraphTemplates:
+    """
+    Appends paragraphs by copying one prepared paragraph element per style. python-docx resolves the
+    style again on every add_paragraph/add_heading call, which dominates the run time of large books.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.templates = {}
+        # New paragraphs go right before the body's trailing section properties; looking them up is a linear scan
+        self.section_properties = doc.element.body.sectPr
+
+    def add(self, text, style):
+        template = self.templates.get(style)
+        if template is None:
+            paragraph = self.doc.add_paragraph(style=style)
+            template = self.templates[style] = copy.deepcopy(paragraph._p)
+            paragraph._p.getparent().remove(paragraph._p)
+
+        element = copy.deepcopy(template)
+        if self.section_properties is not None:
+            self.section_properties.addprevious(element)
+        else:
+            self.doc.element.body.append(element)
+        paragraph = Paragraph(element, self.doc._body)
+        paragraph.add_run(text)
+        return paragraph
+
+def write_docx(sections, path):
+    """Build the chapter book with python-docx; each top-level node starts a new page."""
     doc = Document()
-    sections = doc.sections
     doc.sections[0].different_first_page_header_footer = True
     footer_txt = ""
 
     # Define font size for different levels
     font_sizes = {1: 30, 2: 23, 3: 18}
 
-    for index, (id, group) in enumerate(grouped_skills):
-        #print(f"\nDebug: Processing group {index + 1} - Taxonomy Location:\n{taxonomy_location}")
-        #print(f"Taxonomy IDs in this group: {group['Taxonomy ID'].tolist()}")
-
-        path_levels = 'MAPPING_ERROR'.join(group['taxonomy_location'].unique()).split('\n')
-        if (len(group['taxonomy_location'].unique()) > 1):
-            print(group['taxonomy_location'].unique())
-        path_description = None
-
-        # Iterate over each path level and generate the heading
-        for level, path in enumerate(path_levels):
-            if level == (len(path_levels) - 1):  # Ensure we're within bounds
-                if (level == 0):
-                    if index != 0: doc.add_page_break()
-                    footer_txt = f'{'MAPPING_ERROR'.join(group['Taxonomy ID'].unique())}: {re.sub(r'^\d+\s+', '', path.replace('+-- ', '').strip())}'
-                    #heading = doc.add_heading('New Chapter', 1)
-                    #heading.runs[0].font.size = Pt(50)  # Set font size based on depth
-                    #doc.add_page_break()
-
-                # Extract the descriptive part of the path, ignoring the number
-                taxonomy_id = 'MAPPING_ERROR'.join(group['Taxonomy ID'].unique())
-                path_description = re.sub(r'^\d+\s+', '', path.replace('+-- ', '').strip())
+    # Skill paragraphs share one style instead of each carrying its own spacing
+    skill_style = doc.styles.add_style('Skill', WD_STYLE_TYPE.PARAGRAPH)
+    skill_style.base_style = doc.styles['Normal']
+    skill_style.paragraph_format.space_after = Pt(0)
+    paragraphs = ParagraphTemplates(doc)
 
-                #print(f"Debug: Adding Heading: {taxonomy_id} {path_description}")
+    for index, (taxonomy_id, level, title, skill_lines) in enumerate(sections):
+        if level == 0:
+            if index != 0: doc.add_page_break()
+            footer_txt = f'{taxonomy_id}: {title}'
 
-                # Add the heading with the appropriate level and font size
-                heading = doc.add_heading(f'{' '*(level)}{taxonomy_id}: {path_description}', level=level + 1)
-                font_size = font_sizes.get(level + 1, 14)  # Default to 12 if the level exceeds defined sizes
-                heading.runs[0].font.size = Pt(font_size)  # Set font size based on depth
+        # Add the heading with the appropriate level and font size
+        heading = paragraphs.add(' ' * level + f'{taxonomy_id}: {title}', f'Heading {level + 1}')
+        heading.runs[0].font.size = Pt(font_sizes.get(level + 1, 14))  # Default to 14 if the level exceeds defined sizes
 
         # Add the skills under this taxonomy location
-        for _, row in group.iterrows():
-            #print(f"Debug: Adding Skill: ID {row['skill_id']} - {row['skill']} (Similarity: {row['Similarity Score']:.4f})")
-            paragraph = doc.add_paragraph(f"ID {row['skill_id']}: {row['skill']} (Similarity Score: {row['Similarity Score']:.4f})")
-            paragraph.paragraph_format.space_after = Pt(0)
-
-        if not (doc.sections[-1].footer.paragraphs[-1].text == footer_txt):
-            doc.sections[-1].footer.paragraphs[-1].clear()
-            doc.sections[-1].footer.paragraphs[-1].add_run(footer_txt)
-        #footer.add_paragraph(f'{taxonomy_id}: {path_description}')
-
-    doc.save('./mnt/data/skills_in_chapters.docx')
-    print("Skills grouped by taxonomy location have been saved as 'skills_in_chapters.docx'.")
-
-def show_skill_taxonomy():
+        for line in skill_lines:
+            paragraphs.add(line, skill_style.name)
+
+    # The document has a single section, so its footer shows the last chapter
+    if footer_txt:
+        doc.sections[-1].footer.paragraphs[-1].add_run(footer_txt)
+
+    doc.save(path)
+
+def write_markdown(sections, path):
+    """Stream the chapter book as Markdown, one section at a time."""
+    with open(path, 'w', encoding='utf-8') as file:
+        for taxonomy_id, level, title, skill_lines in sections:
+            file.write(f"{'#' * min(level + 1, 6)} {taxonomy_id}: {title}\n\n")
+            file.writelines(f"- {line}\n" for line in skill_lines)
+            file.write("\n")
+
+def write_html(sections, path):
+    """Stream the chapter book as a standalone HTML page, one section at a time."""
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>Skills by taxonomy location</title>\n'
+                   '<style>h1 { page-break-before: always; } h1:first-of-type { page-break-before: auto; } p { margin: 0; }</style>\n'
+                   '</head>\n<body>\n')
+        for taxonomy_id, level, title, skill_lines in sections:
+            tag = f'h{min(level + 1, 6)}'
+            file.write(f'<{tag}>{html.escape(taxonomy_id)}: {html.escape(title)}</{tag}>\n')
+            file.writelines(f'<p>{html.escape(line)}</p>\n' for line in skill_lines)
+        file.write('</body>\n</html>\n')
+
+WRITERS = {'docx': write_docx, 'markdown': write_markdown, 'html': write_html}
+EXTENSIONS = {'docx': 'docx', 'markdown': 'md', 'html': 'html'}
+
+def generate_chapter_format(skill_mapping_df, formats=('docx',)):
+    for output_format in formats:
+        path = f'./mnt/data/skills_in_chapters.{EXTENSIONS[output_format]}'
+        WRITERS[output_format](iter_chapter_sections(skill_mapping_df), path)
+        print(f"Skills grouped by taxonomy location have been saved as '{os.path.basename(path)}'.")
+
+def show_skill_taxonomy(formats=('docx',)):
     # Load the taxonomy mapping data
-    skill_mapping_df = pd.read_csv('./mnt/data/threshold_skills_insertion.csv')
+    skill_mapping_df = load_artifact('threshold_skills_insertion')
 
     # Load the taxonomy structure
-    with open('./mnt/data/taxonomy_tree.json', 'r') as f:
-        taxonomy_dict = json.load(f)
+    taxonomy = load_taxonomy_index('./mnt/data')
 
     # Map skills to the taxonomy tree and add the formatted paths
-    updated_skill_mapping_df = map_skills_to_taxonomy_location(skill_mapping_df, taxonomy_dict)
+    updated_skill_mapping_df = map_skills_to_taxonomy_location(skill_mapping_df, taxonomy)
 
     # Print the updated DataFrame with the taxonomy path
     #print(updated_skill_mapping_df.head())
@@ -178,10 +213,15 @@ def show_skill_taxonomy():
     updated_skill_mapping_df = updated_skill_mapping_df[cols]
 
     # Optionally save the result to a file
-    updated_skill_mapping_df.to_csv('./mnt/data/skill_taxonomy_with_locations.csv', index=False)
+    save_artifact(updated_skill_mapping_df, 'skill_taxonomy_with_locations')
 
     # Generate chapter-like format
-    generate_chapter_format(updated_skill_mapping_df)
+    generate_chapter_format(updated_skill_mapping_df, formats)
 
 if __name__ == "__main__":
-    show_skill_taxonomy()
+    parser = argparse.ArgumentParser(description="Group mapped skills by taxonomy location into a chapter book.")
+    parser.add_argument('--format', dest='formats', action='append', choices=sorted(WRITERS),
+                        help="Output format (repeatable, default docx). Markdown and HTML are streamed to disk.")
+    args = parser.parse_args()
+
+    show_skill_taxonomy(args.formats or ['docx'])
@@ -1,37 +1,28 @@
+import argparse
+import hashlib
 import json
+import os
 import pandas as pd
-from collections import defaultdict
 from anytree import Node, RenderTree
 from anytree.exporter import DotExporter
-import logging
+from artifacts import load_artifact
+from taxonomy_index import INDEX_FILE, TaxonomyIndex
+
+VIEWER_ASSETS_DIR = "../taxonomy_viewer/src/assets"
+SHARD_LEVELS = 2  # Levels of the tree in the skeleton and in each shard
 
 def build_taxonomy_hierarchy(taxonomy_df):
-    # Extract and parse the 'New Unique ID' into levels
-    taxonomy_hierarchy = defaultdict(dict)
-    
-    for _, row in taxonomy_df.iterrows():
-        levels = row['Taxonomy ID'].split(".")
-        description = row['Description']
-
-        current_level = taxonomy_hierarchy
-        for level in levels:
-            if level.strip():
-                if not isinstance(current_level, dict):
-                    logging.error(f"Expected dictionary but found list at level {level}.")
-                    return None
-                current_level = current_level.setdefault(level, {})
-        current_level["_description"] = description
-
-    return taxonomy_hierarchy
-
-
-def build_anytree_hierarchy(taxonomy_hierarchy, parent=None, level=""):
-    for key, value in taxonomy_hierarchy.items():
-        if key == "_description":  # Skip description keys in this recursive build
-            continue
-        node_name = f"{level}.{key}" if level else key  # Build the hierarchical name
-        node = Node(f"{node_name} {value.get('_description', '')}", parent=parent)
-        build_anytree_hierarchy(value, parent=node, level=node_name)  # Recursively build the hierarchy
+    """The nested taxonomy dict (as taxonomy_tree.json holds it) for the rows of complete_taxonomy."""
+    return TaxonomyIndex.from_frame(taxonomy_df).to_nested_dict()
+
+
+def build_anytree_hierarchy(taxonomy, parent=None):
+    # Rows are in depth-first order, so every parent's node exists before its children's
+    nodes = []
+    for row, node_id in enumerate(taxonomy.ids.tolist()):
+        description = taxonomy.descriptions[row]
+        node_parent = nodes[taxonomy.parents[row]] if taxonomy.parents[row] >= 0 else parent
+        nodes.append(Node(f"{node_id} {'' if description is None else description}", parent=node_parent))
 
 def save_tree_as_text(root_node, file_name):
     with open(file_name, "w") as file:
@@ -44,14 +35,91 @@ def save_tree_as_json(taxonomy_hierarchy, file_name):
         json.dump(taxonomy_hierarchy, file, indent=4)
     print(f"Tree structure saved as {file_name}")
 
+def minified_json(value):
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def write_content_addressed(directory, prefix, value):
+    """Write minified JSON under a name containing its content hash, so it can be cached indefinitely."""
+    data = minified_json(value)
+    file_name = f"{prefix}.{hashlib.sha256(data).hexdigest()[:16]}.json"
+    path = os.path.join(directory, file_name)
+    if not os.path.exists(path):
+        with open(f"{path}.tmp", "wb") as file:
+            file.write(data)
+        os.replace(f"{path}.tmp", path)
+    return file_name
+
+def node_fields(taxonomy, row):
+    description = taxonomy.descriptions[row]
+    return {} if description is None else {"_description": description}
+
+def shard_subtree(taxonomy, rows, levels, levels_per_file, shard_dir, written):
+    """
+    The nested tree of `rows` with `levels` levels of descendants. Nodes on the last level become stubs:
+    their own "_" fields plus "_child_count" and, when they have children, "_shard", the file holding
+    their next `levels_per_file` levels.
+    Shards are written bottom-up, so a change anywhere renames every shard on the path to the root.
+    """
+    subtree = {}
+    for row in rows:
+        node_id = taxonomy.ids[row]
+        node = node_fields(taxonomy, row)
+        children = taxonomy.child_rows(row)
+        if levels > 1:
+            node.update(shard_subtree(taxonomy, children, levels - 1, levels_per_file, shard_dir, written))
+        else:
+            node["_child_count"] = len(children)
+            if len(children):
+                shard = node_fields(taxonomy, row)
+                shard.update(shard_subtree(taxonomy, children, levels_per_file, levels_per_file, shard_dir, written))
+                file_name = write_content_addressed(shard_dir, node_id, shard)
+                written.add(file_name)
+                node["_shard"] = f"{os.path.basename(shard_dir)}/{file_name}"
+        subtree[node_id.rsplit(".", 1)[-1]] = node
+    return subtree
+
+def save_tree_as_shards(taxonomy, output_dir, levels=SHARD_LEVELS):
+    """
+    Export the hierarchy for lazy loading. taxonomy_manifest.json names a skeleton holding the first
+    `levels` levels; every node on the skeleton's last level is a stub whose "_shard" file holds its
+    next `levels` levels, and so on. Paths in the manifest and stubs are relative to `output_dir`.
+    Files are minified and named by content hash; those no longer referenced are removed.
+    """
+    if levels < 1:
+        raise ValueError("Each file must hold at least one level of the tree")
+    shard_dir = os.path.join(output_dir, "taxonomy_shards")
+    os.makedirs(shard_dir, exist_ok=True)
+
+    written = set()
+    skeleton = shard_subtree(taxonomy, taxonomy.top_level(), levels, levels, shard_dir, written)
+    skeleton_name = write_content_addressed(shard_dir, "skeleton", skeleton)
+    written.add(skeleton_name)
+
+    manifest = {
+        "skeleton": f"taxonomy_shards/{skeleton_name}",
+        "levels_per_file": levels,
+        "shard_count": len(written) - 1
+    }
+    manifest_path = os.path.join(output_dir, "taxonomy_manifest.json")
+    with open(f"{manifest_path}.tmp", "wb") as file:
+        file.write(minified_json(manifest))
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    # Only after the new manifest is in place, so a viewer never follows it to a missing file
+    for file_name in os.listdir(shard_dir):
+        if file_name not in written:
+            os.remove(os.path.join(shard_dir, file_name))
+    print(f"Tree structure saved as {manifest_path} with {manifest['shard_count']} shards in {shard_dir}")
+
 def save_tree_as_image(root_node, file_name):
     DotExporter(root_node).to_picture(file_name)
     print(f"Tree structure saved as {file_name}")
 
-def display_and_save_hierarchy(taxonomy_hierarchy):
+def display_and_save_hierarchy(taxonomy, sharded=False, viewer_dir=VIEWER_ASSETS_DIR, levels=SHARD_LEVELS):
     # Build the hierarchical structure using anytree
     root_node = Node("Taxonomy Root")
-    build_anytree_hierarchy(taxonomy_hierarchy, parent=root_node)
+    build_anytree_hierarchy(taxonomy, parent=root_node)
+    taxonomy_hierarchy = taxonomy.to_nested_dict()
 
     # Display the tree structure
     for pre, _, node in RenderTree(root_node):
@@ -60,18 +128,35 @@ def display_and_save_hierarchy(taxonomy_hierarchy):
     # Save the tree structure in different formats
     save_tree_as_text(root_node, "./mnt/data/taxonomy_tree.txt")
     save_tree_as_json(taxonomy_hierarchy, "./mnt/data/taxonomy_tree.json")
-    save_tree_as_json(taxonomy_hierarchy, "../taxonomy_viewer/src/assets/taxonomy_tree.json")
+    taxonomy.save(os.path.join("./mnt/data", INDEX_FILE))
+    print(f"Taxonomy index saved as ./mnt/data/{INDEX_FILE}")
+
+    # The viewer is a separate checkout; without it there is nothing to export to
+    if not os.path.isdir(viewer_dir):
+        print(f"Skipping the viewer export: '{viewer_dir}' does not exist (use --viewer-dir to point at the viewer's assets)")
+        return
+    if sharded:
+        save_tree_as_shards(taxonomy, viewer_dir, levels)
+    else:
+        save_tree_as_json(taxonomy_hierarchy, os.path.join(viewer_dir, "taxonomy_tree.json"))
 
-def main():
-    # Load the CSV file containing the taxonomy information
-    taxonomy_file_path = './mnt/data/complete_taxonomy.csv'
-    taxonomy_df = pd.read_csv(taxonomy_file_path)
+def main(sharded=False, viewer_dir=VIEWER_ASSETS_DIR, levels=SHARD_LEVELS):
+    # Load the taxonomy information
+    taxonomy_df = load_artifact('complete_taxonomy')
 
-    # Build the theoretical taxonomy hierarchy
-    taxonomy_hierarchy = build_taxonomy_hierarchy(taxonomy_df)
+    # Build the theoretical taxonomy hierarchy, as arrays the other scripts load instead of walking the JSON
+    taxonomy = TaxonomyIndex.from_frame(taxonomy_df)
 
     # Display and save the hierarchy
-    display_and_save_hierarchy(taxonomy_hierarchy)
+    display_and_save_hierarchy(taxonomy, sharded, viewer_dir, levels)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Build the taxonomy tree and export it for the taxonomy viewer.")
+    parser.add_argument("--sharded", action="store_true",
+                        help="Give the viewer a manifest, a skeleton and per-subtree shards instead of one taxonomy_tree.json")
+    parser.add_argument("--levels", type=int, default=SHARD_LEVELS, help="Tree levels in the skeleton and in each shard")
+    parser.add_argument("--viewer-dir", default=VIEWER_ASSETS_DIR,
+                        help="The taxonomy viewer's assets directory; the export is skipped if it does not exist")
+    args = parser.parse_args()
+
+    main(args.sharded, args.viewer_dir, args.levels)
@@ -0,0 +1,179 @@
+import logging
+import os
+import numpy as np
+import pandas as pd
+from artifacts import artifact_paths, load_artifact
+
+INDEX_FILE = 'taxonomy_index.npz'
+
+
+def normalize_taxonomy_id(taxonomy_id):
+    """'1.' (as complete_taxonomy.csv writes top-level IDs) -> '1'; empty levels are dropped."""
+    return '.'.join(part.strip() for part in str(taxonomy_id).split('.') if part.strip())
+
+
+class TaxonomyIndex:
+    """
+    The taxonomy as flat arrays, one row per node in depth-first order (each node before its
+    children, siblings in the order complete_taxonomy.csv first mentions them):
+
+        ids, descriptions     Taxonomy ID and description of every row (None where a node is only implied by a child's ID)
+        parents, depths       Parent row (-1 at the top level) and depth (1 at the top level)
+        child_offsets, children
+                              Children in CSR form: those of row r are children[child_offsets[r]:child_offsets[r + 1]]
+        subtree_ends          Euler-tour ranges: the subtree of row r is rows r .. subtree_ends[r] - 1
+        paths                 (rows x max depth) ancestor rows, paths[r, d - 1] being r's ancestor at depth d (-1 below r)
+
+    Subtree, ancestor and level queries are slices and comparisons on these arrays.
+    """
+
+    def __init__(self, ids, descriptions, parents, depths):
+        self.ids = np.asarray(ids, dtype=str)
+        self.descriptions = np.asarray(descriptions, dtype=object)
+        self.parents = np.asarray(parents, dtype=np.int32)
+        self.depths = np.asarray(depths, dtype=np.int16)
+        n = len(self.ids)
+
+        self.row_of = {node_id: row for row, node_id in enumerate(self.ids.tolist())}
+        self.id_index = pd.Index(self.ids.tolist())
+
+        # Children in row order, which is their sibling order
+        has_parent = self.parents >= 0
+        self.child_offsets = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(self.parents[has_parent], minlength=n), out=self.child_offsets[1:])
+        self.children = np.flatnonzero(has_parent)[np.argsort(self.parents[has_parent], kind='stable')].astype(np.int32)
+
+        # In depth-first order a subtree ends where the next row at the same or a shallower depth begins
+        self.subtree_ends = np.full(n, n, dtype=np.int32)
+        open_rows = []
+        for row, depth in enumerate(self.depths.tolist()):
+            while open_rows and self.depths[open_rows[-1]] >= depth:
+                self.subtree_ends[open_rows.pop()] = row
+            open_rows.append(row)
+
+        # Each level copies its parents' paths, one vectorized step per depth
+        self.max_depth = int(self.depths.max()) if n else 0
+        self.paths = np.full((n, self.max_depth), -1, dtype=np.int32)
+        for depth in range(1, self.max_depth + 1):
+            rows = np.flatnonzero(self.depths == depth)
+            if depth > 1:
+                self.paths[rows] = self.paths[self.parents[rows]]
+            self.paths[rows, depth - 1] = rows
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_frame(cls, taxonomy_df):
+        """
+        Build the index from complete_taxonomy rows ('Taxonomy ID', 'Description').
+        Like the nested tree, a repeated ID keeps its last description and missing ancestors are implied.
+        """
+        descriptions = {}
+        children = {'': []}
+        for taxonomy_id, description in zip(taxonomy_df['Taxonomy ID'], taxonomy_df['Description']):
+            parts = normalize_taxonomy_id(taxonomy_id).split('.')
+            for level in range(1, len(parts) + 1):
+                node_id = '.'.join(parts[:level])
+                if node_id not in children:
+                    children[node_id] = []
+                    children['.'.join(parts[:level - 1])].append(node_id)
+            descriptions[node_id] = description
+
+        ids, parents, depths = [], [], []
+        pending = [(node_id, -1, 1) for node_id in reversed(children[''])]
+        while pending:
+            node_id, parent, depth = pending.pop()
+            row = len(ids)
+            ids.append(node_id)
+            parents.append(parent)
+            depths.append(depth)
+            pending.extend((child, row, depth + 1) for child in reversed(children[node_id]))
+
+        return cls(ids, [descriptions.get(node_id) for node_id in ids], parents, depths)
+
+    def save(self, path):
+        np.savez(path, ids=self.ids, parents=self.parents, depths=self.depths,
+                 descriptions=np.asarray(['' if description is None else description for description in self.descriptions], dtype=str),
+                 has_description=np.asarray([description is not None for description in self.descriptions]))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            descriptions = np.where(data['has_description'], data['descriptions'].astype(object), None)
+            return cls(data['ids'], descriptions, data['parents'], data['depths'])
+
+    def row(self, taxonomy_id):
+        """The row of a Taxonomy ID (KeyError if it is not in the taxonomy)."""
+        return self.row_of[taxonomy_id]
+
+    def rows(self, taxonomy_ids):
+        """Rows of many Taxonomy IDs at once, -1 for IDs not in the taxonomy."""
+        return self.id_index.get_indexer(pd.Index(taxonomy_ids, dtype=object).astype(str))
+
+    def child_rows(self, row):
+        return self.children[self.child_offsets[row]:self.child_offsets[row + 1]]
+
+    def top_level(self):
+        return self.level(1)
+
+    def level(self, depth):
+        return np.flatnonzero(self.depths == depth)
+
+    def subtree(self, row):
+        """Rows of the subtree under `row` (itself included), in depth-first order."""
+        return np.arange(row, self.subtree_ends[row])
+
+    def in_subtree(self, rows, root):
+        """Which of `rows` lie in the subtree under `root`."""
+        rows = np.asarray(rows)
+        return (rows >= root) & (rows < self.subtree_ends[root])
+
+    def ancestors(self, row):
+        """Rows from the top level down to `row` itself."""
+        return self.paths[row, :self.depths[row]]
+
+    def ancestors_at(self, rows, depth):
+        """Each row's ancestor at `depth`, or the row itself when it is not deeper than that; -1 stays -1."""
+        rows = np.asarray(rows)
+        if depth < 1 or not len(self):
+            return np.full(len(rows), -1)
+        result = np.where(self.depths[rows] > depth, self.paths[rows, min(depth, self.max_depth) - 1], rows)
+        return np.where(rows >= 0, result, -1)
+
+    def to_nested_dict(self, with_ids=False):
+        """
+        The nested {key: {'_description': ..., child key: {...}}} tree that taxonomy_tree.json holds.
+        :param with_ids: Also give every node its '_id', after its children (as taxonomy_tree_with_ids.json has it).
+        """
+        tree = {}
+        nodes = []
+        for row, node_id in enumerate(self.ids.tolist()):
+            node = {}
+            if self.descriptions[row] is not None:
+                node['_description'] = self.descriptions[row]
+            parent = self.parents[row]
+            (nodes[parent] if parent >= 0 else tree)[node_id.rsplit('.', 1)[-1]] = node
+            nodes.append(node)
+        if with_ids:
+            for node, node_id in zip(nodes, self.ids.tolist()):
+                node['_id'] = node_id
+        return tree
+
+
+def load_taxonomy_index(data_dir):
+    """
+    Load the index taxonomy.py saves next to taxonomy_tree.json, or build it from the complete_taxonomy
+    artifact if it has not been saved yet or complete_taxonomy has been regenerated since (the same
+    mtime check load_artifact makes between Parquet and CSV).
+    """
+    path = os.path.join(data_dir, INDEX_FILE)
+    sources = [source for source in artifact_paths('complete_taxonomy', data_dir) if os.path.exists(source)]
+    if os.path.exists(path) and all(os.path.getmtime(path) >= os.path.getmtime(source) for source in sources):
+        return TaxonomyIndex.load(path)
+
+    if os.path.exists(path):
+        logging.warning(f"'{INDEX_FILE}' in '{data_dir}' is older than complete_taxonomy, rebuilding the taxonomy index")
+    else:
+        logging.warning(f"No '{INDEX_FILE}' in '{data_dir}', building the taxonomy index from complete_taxonomy")
+    return TaxonomyIndex.from_frame(load_artifact('complete_taxonomy', data_dir=data_dir))
@@ -0,0 +1,281 @@
+import logging
+import os
+import numpy as np
+import pandas as pd
+from ann_index import DEFAULT_K, DEFAULT_N_PROBE, IVFIndex, fingerprint, normalize_rows32
+from embedding_store import flatten_taxonomy_tree
+
+# Fraction of a skill's best similarity a node must reach to be kept in threshold mode
+DEFAULT_THRESHOLD_RATIO = 0.90
+DEFAULT_BATCH_SIZE = 256
+# Rows of the candidate block scored exactly at once in approximate mode
+CANDIDATE_CHUNK_SIZE = 32
+# Output columns of the two mapping modes
+THRESHOLD_COLUMNS = ['skill_id', 'skill', 'Mapped Node', 'Taxonomy ID', 'Similarity Score']
+BEST_COLUMNS = ['Skill ID', 'Skill', 'Mapped Node', 'Taxonomy ID', 'Similarity Score']
+
+
+def row_norms(matrix):
+    """The length of each float32 row (1 for all-zero rows), computed without a squared copy of `matrix`."""
+    norms = np.sqrt(np.einsum('ij,ij->i', matrix, matrix))
+    norms[norms == 0] = 1.0
+    return norms
+
+
+def normalize_rows(matrix):
+    """Scale each row to unit length in float32 so that a dot product is the cosine similarity."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / row_norms(matrix)[:, None]
+
+
+def encode_texts(model, texts, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Encode a list of texts in batches, encoding each distinct text only once.
+    :param model: A SentenceTransformer model.
+    :param texts: The texts to encode.
+    :param batch_size: The number of texts passed to the model per forward pass.
+    :return: A (len(texts), dim) array of embeddings in the order of the input texts.
+    """
+    unique_texts, inverse = np.unique(np.asarray(texts, dtype=object).astype(str), return_inverse=True)
+    unique_embeddings = model.encode(list(unique_texts), batch_size=batch_size, convert_to_numpy=True)
+    return np.asarray(unique_embeddings)[inverse]
+
+
+class TaxonomyMatcher:
+    """
+    Scores skill embeddings against every taxonomy node at once.
+    The node embeddings are stacked into one normalized matrix so that a block of skills
+    is compared with the whole tree in a single matrix product.
+    """
+
+    def __init__(self, nodes):
+        """
+        :param nodes: A TaxonomyEmbeddings tuple from embedding_store.load_taxonomy_embeddings.
+        """
+        self.ids = nodes.ids
+        self.descriptions = nodes.descriptions
+        # The (usually memory-mapped) float32 embeddings are used as they are; scores are scaled by
+        # the inverse node lengths instead of normalizing a copy of the whole matrix
+        self.node_matrix = np.asarray(nodes.embeddings, dtype=np.float32)
+        self.node_scale = 1.0 / row_norms(self.node_matrix)
+        # Rows are in depth-first order, so each top-level subtree starts at a depth-1 row
+        self.top_level_starts = np.flatnonzero(np.asarray(nodes.depths) == 1)
+
+    @classmethod
+    def from_tree(cls, taxonomy_tree):
+        """Build a matcher from a nested taxonomy tree with inline '_embedding' lists."""
+        return cls(flatten_taxonomy_tree(taxonomy_tree))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def score(self, skill_embeddings):
+        """Return the (skills x nodes) cosine similarity block."""
+        return (normalize_rows(skill_embeddings) @ self.node_matrix.T) * self.node_scale
+
+    def threshold_matches(self, skill_embeddings, ratio=DEFAULT_THRESHOLD_RATIO):
+        """
+        Keep every node whose similarity is at least `ratio` times the best similarity for that skill.
+        :return: Skill row indices, node row indices and similarity scores, ordered by skill and
+                 then by descending similarity (ties keep depth-first order).
+        """
+        scores = self.score(skill_embeddings)
+        thresholds = scores.max(axis=1, keepdims=True) * ratio
+
+        # Sort each row once, then keep the leading run of columns above the row's threshold
+        order = np.argsort(-scores, axis=1, kind='stable')
+        sorted_scores = np.take_along_axis(scores, order, axis=1)
+        keep = sorted_scores >= thresholds
+
+        skill_rows, ranks = np.nonzero(keep)
+        return skill_rows, order[skill_rows, ranks], sorted_scores[skill_rows, ranks]
+
+    def best_matches(self, skill_embeddings, n=3):
+        """
+        Find the single best node for each skill among the `n` top-level subtrees that
+        contain the highest similarities.
+        :return: Node row indices and similarity scores, one per skill.
+        """
+        scores = self.score(skill_embeddings)
+
+        # Best score inside each top-level subtree (subtrees are contiguous row blocks)
+        subtree_best = np.maximum.reduceat(scores, self.top_level_starts, axis=1)
+        top_subtrees = np.argsort(-subtree_best, axis=1, kind='stable')[:, :n]
+
+        # Mask out every node that is not inside one of the selected subtrees
+        subtree_of_node = np.searchsorted(self.top_level_starts, np.arange(len(self)), side='right') - 1
+        allowed = (subtree_of_node[None, :, None] == top_subtrees[:, None, :]).any(axis=2)
+        masked = np.where(allowed, scores, -np.inf)
+
+        best_nodes = masked.argmax(axis=1)
+        return best_nodes, scores[np.arange(len(scores)), best_nodes]
+
+
+class ApproximateTaxonomyMatcher(TaxonomyMatcher):
+    """
+    Threshold matcher that only scores a shortlist of candidate nodes per skill.
+    Candidates are the `k` nearest nodes from an IVF index over the node embeddings, plus the nodes
+    that the `n_neighbours` most similar previously mapped skills were mapped to. Candidates are then
+    re-scored exactly like the exact matcher, so only recall is approximate.
+    """
+
+    def __init__(self, nodes, node_index, skill_index=None, k=DEFAULT_K, n_probe=DEFAULT_N_PROBE, n_neighbours=5):
+        super().__init__(nodes)
+        self.node_index = node_index
+        self.skill_index = skill_index
+        self.k = k
+        self.n_probe = n_probe
+        self.n_neighbours = n_neighbours
+
+        # Padded (skills x max matches) table of node rows mapped to each previously mapped skill
+        self.neighbour_nodes = None
+        if skill_index is not None and skill_index.payload_offsets is not None and len(skill_index):
+            row_of_id = {node_id: row for row, node_id in enumerate(self.ids)}
+            lengths = np.diff(skill_index.payload_offsets)
+            self.neighbour_nodes = np.full((len(skill_index), max(1, lengths.max())), -1, dtype=np.int64)
+            for skill_row in range(len(skill_index)):
+                mapped = [row_of_id.get(node_id, -1) for node_id in skill_index.payload(skill_row)]
+                self.neighbour_nodes[skill_row, :len(mapped)] = mapped
+
+    def candidates(self, skill_embeddings):
+        """Return a (skills x candidates) array of node rows, sorted ascending and -1 padded."""
+        candidates, _ = self.node_index.search(skill_embeddings, k=self.k, n_probe=self.n_probe)
+
+        if self.neighbour_nodes is not None:
+            neighbours, _ = self.skill_index.search(skill_embeddings, k=self.n_neighbours, n_probe=self.n_probe)
+            neighbour_nodes = np.where(neighbours[:, :, None] >= 0, self.neighbour_nodes[neighbours], -1)
+            candidates = np.hstack([candidates, neighbour_nodes.reshape(len(candidates), -1)])
+
+        # Sort so ties keep depth-first order, and blank out repeated candidates
+        candidates = np.sort(candidates, axis=1)
+        duplicates = np.zeros_like(candidates, dtype=bool)
+        duplicates[:, 1:] = candidates[:, 1:] == candidates[:, :-1]
+        candidates[duplicates] = -1
+        return candidates
+
+    def threshold_matches(self, skill_embeddings, ratio=DEFAULT_THRESHOLD_RATIO):
+        candidates = self.candidates(skill_embeddings)
+        queries = normalize_rows(skill_embeddings)
+
+        scores = np.empty(candidates.shape, dtype=np.float32)
+        for start in range(0, len(candidates), CANDIDATE_CHUNK_SIZE):
+            chunk = np.maximum(candidates[start:start + CANDIDATE_CHUNK_SIZE], 0)
+            scores[start:start + len(chunk)] = np.einsum('nd,ncd->nc', queries[start:start + len(chunk)],
+                                                         self.node_matrix[chunk]) * self.node_scale[chunk]
+        scores[candidates < 0] = -np.inf
+
+        thresholds = scores.max(axis=1, keepdims=True) * ratio
+        order = np.argsort(-scores, axis=1, kind='stable')
+        sorted_scores = np.take_along_axis(scores, order, axis=1)
+        keep = (sorted_scores >= thresholds) & np.isfinite(sorted_scores)
+
+        skill_rows, ranks = np.nonzero(keep)
+        return skill_rows, candidates[skill_rows, order[skill_rows, ranks]], sorted_scores[skill_rows, ranks]
+
+
+def load_node_index(nodes, path, n_lists=None):
+    """
+    Load the IVF index over the taxonomy node embeddings, rebuilding and saving it when it is
+    missing or was built from different embeddings.
+    """
+    current = fingerprint(nodes.ids, normalize_rows32(nodes.embeddings))
+    if os.path.exists(path):
+        index = IVFIndex.load(path)
+        if index.source_fingerprint == current:
+            return index
+        logging.info(f"'{path}' is stale, rebuilding the node index")
+
+    index = IVFIndex.build(nodes.embeddings, nodes.ids, n_lists=n_lists)
+    index.save(path)
+    return index
+
+
+def update_skill_index(skill_index, path, skill_embeddings, skill_ids, skill_mappings_df):
+    """
+    Add newly mapped skills to the index of previously mapped skills, with the Taxonomy IDs
+    each one was mapped to as its payload, and save it. Skills already in the index only have
+    their payload replaced, so re-running over the same skills does not index them twice.
+    """
+    if not len(skill_ids):
+        return skill_index
+
+    mapped = skill_mappings_df.groupby('skill_id', sort=False)['Taxonomy ID'].agg(list)
+    payloads = [mapped.get(skill_id, []) for skill_id in skill_ids]
+
+    if skill_index is None:
+        skill_index = IVFIndex.build(skill_embeddings, skill_ids, payloads=payloads)
+    else:
+        row_of = {skill_id: row for row, skill_id in enumerate(skill_index.ids.tolist())}
+        rows = np.asarray([row_of.get(str(skill_id), -1) for skill_id in skill_ids], dtype=np.int64)
+        known = rows >= 0
+
+        if known.any():
+            all_payloads = [list(skill_index.payload(row)) if skill_index.payload_offsets is not None else []
+                            for row in range(len(skill_index))]
+            for row, index in zip(rows[known], np.flatnonzero(known)):
+                all_payloads[row] = list(payloads[index])
+            skill_index.set_payloads(all_payloads)
+
+        if not known.all():
+            new = np.flatnonzero(~known)
+            skill_index = skill_index.add(np.asarray(skill_embeddings)[new], np.asarray(skill_ids)[new],
+                                          payloads=[payloads[index] for index in new])
+
+    skill_index.save(path)
+    return skill_index
+
+
+def map_skills_threshold(matcher, model, skills_df, ratio=DEFAULT_THRESHOLD_RATIO, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Map every skill to all taxonomy nodes within `ratio` of its best similarity.
+    :return: A DataFrame with one row per (skill, node) match, matching threshold_skills_insertion.csv.
+    """
+    frames = []
+    total = len(skills_df)
+
+    for start in range(0, total, batch_size):
+        batch = skills_df.iloc[start:start + batch_size]
+        embeddings = encode_texts(model, batch['skill'].tolist(), batch_size=batch_size)
+        skill_rows, node_rows, scores = matcher.threshold_matches(embeddings, ratio)
+
+        logging.info(f"Processed skills {start + 1}-{start + len(batch)}/{total}")
+
+        frames.append(pd.DataFrame({
+            'skill_id': batch['skill_id'].to_numpy()[skill_rows],
+            'skill': batch['skill'].to_numpy()[skill_rows],
+            'Mapped Node': np.asarray(matcher.descriptions, dtype=object)[node_rows],
+            'Taxonomy ID': np.asarray(matcher.ids, dtype=object)[node_rows],
+            'Similarity Score': scores
+        }))
+
+    if not frames:
+        return pd.DataFrame(columns=THRESHOLD_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def map_skills_best(matcher, model, skills_df, n=3, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Map every skill to its single best-fitting taxonomy node.
+    :return: A DataFrame with one row per skill, matching skill_taxonomy_mapping_with_ids.csv.
+    """
+    frames = []
+    total = len(skills_df)
+
+    for start in range(0, total, batch_size):
+        batch = skills_df.iloc[start:start + batch_size]
+        embeddings = encode_texts(model, batch['skill'].tolist(), batch_size=batch_size)
+        node_rows, scores = matcher.best_matches(embeddings, n)
+
+        logging.info(f"Processed skills {start + 1}-{start + len(batch)}/{total}")
+
+        frames.append(pd.DataFrame({
+            'Skill ID': batch['skill_id'].to_numpy(),
+            'Skill': batch['skill'].to_numpy(),
+            'Mapped Node': np.asarray(matcher.descriptions, dtype=object)[node_rows],
+            'Taxonomy ID': np.asarray(matcher.ids, dtype=object)[node_rows],
+            'Similarity Score': scores
+        }))
+
+    if not frames:
+        return pd.DataFrame(columns=BEST_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,162 @@
+import logging
+import time
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from taxonomy_index import TaxonomyIndex, normalize_taxonomy_id
+
+UNMAPPED = 'nan'  # Taxonomy ID of joined rows without a mapped skill, as the old str cast produced
+
+
+def taxonomy_depth(taxonomy_id):
+    return taxonomy_id.count('.') + 1
+
+
+def ancestor_id(taxonomy_id, depth):
+    """The ID of a node's ancestor at `depth` (the node itself if it is not deeper than that)."""
+    return '.'.join(taxonomy_id.split('.')[:depth])
+
+
+def legacy_top_level_labels(taxonomy_df):
+    """
+    The top-level label map used by the original heatmap: descriptions of the level 1 and 2 rows,
+    keyed by their first ID component (so the last level 2 row of each subtree wins).
+    """
+    top_level_taxonomies = taxonomy_df.loc[taxonomy_df['Taxonomy ID'].str.contains(r'^\d+(?:\.\d+)?$', regex=True)]
+    return dict(zip(top_level_taxonomies['Taxonomy ID'].str.split('.').str[0], top_level_taxonomies['Description']))
+
+
+def coded_matrix(row_codes, col_codes, shape):
+    """Integer count matrix with one increment per (row, column) pair."""
+    data = np.ones(len(row_codes), dtype=np.int64)
+    return sparse.csr_matrix((data, (row_codes, col_codes)), shape=shape)
+
+
+class TaxonomyRollup:
+    """
+    Occupation x taxonomy-node skill counts, built once from integer-coded sparse incidence matrices:
+
+        occupation x requirement  @  requirement x skill  @  skill x node
+
+    Each product entry counts the rows the old merge chain (occupations -> skills -> taxonomy mapping)
+    produced for that pair. Requirements without skills and skills without a mapping count towards the
+    'nan' node, like the old left joins. Views at any depth, or inside any subtree, are then a single
+    sparse product with a node -> group indicator matrix.
+    """
+
+    def __init__(self, occupation_df, skills_df, skill_mapping_df, taxonomy_df):
+        """
+        :param occupation_df: One row per (occupation, requirement) with 'core_occupation' and 'requirement_id'.
+        :param skills_df: Rows with 'requirement_id' and 'skill_id'.
+        :param skill_mapping_df: Rows with 'skill_id' and 'Taxonomy ID'.
+        :param taxonomy_df: The taxonomy, with 'Taxonomy ID' and 'Description'.
+        """
+        started = time.perf_counter()
+        occupation_df = occupation_df.dropna(subset=['core_occupation'])
+
+        self.occupations = np.sort(occupation_df['core_occupation'].unique())
+        self.taxonomy = TaxonomyIndex.from_frame(taxonomy_df)
+        self.legacy_labels = legacy_top_level_labels(taxonomy_df)
+
+        # Integer codes for requirements, skills and nodes; the extra last skill and node stand for "no match"
+        requirements = pd.Index(pd.unique(pd.concat([occupation_df['requirement_id'], skills_df['requirement_id']]).dropna()))
+        skills = pd.Index(pd.unique(pd.concat([skills_df['skill_id'], skill_mapping_df['skill_id']]).dropna()))
+        mapped = skill_mapping_df.dropna(subset=['skill_id', 'Taxonomy ID'])
+        self.node_ids = np.array(list(pd.unique(mapped['Taxonomy ID'].astype(str))) + [UNMAPPED], dtype=object)
+        no_skill, unmapped = len(skills), len(self.node_ids) - 1
+
+        # occupation x requirement; rows without a requirement go to an extra column with no skills
+        occupation_codes = self.occupations.searchsorted(occupation_df['core_occupation'].to_numpy())
+        requirement_codes = requirements.get_indexer(occupation_df['requirement_id'])
+        requirement_codes[requirement_codes < 0] = len(requirements)
+        occupation_requirements = coded_matrix(occupation_codes, requirement_codes, (len(self.occupations), len(requirements) + 1))
+
+        # requirement x skill; requirements without any skill link to the "no skill" column
+        linked = skills_df.dropna(subset=['requirement_id'])
+        skill_codes = skills.get_indexer(linked['skill_id'])
+        skill_codes[skill_codes < 0] = no_skill
+        requirement_rows = requirements.get_indexer(linked['requirement_id'])
+        lonely = np.setdiff1d(np.arange(len(requirements) + 1), requirement_rows)
+        requirement_skills = coded_matrix(
+            np.concatenate([requirement_rows, lonely]), np.concatenate([skill_codes, np.full(len(lonely), no_skill)]),
+            (len(requirements) + 1, len(skills) + 1)
+        )
+
+        # skill x node; skills without any mapping (and the "no skill" column) map to 'nan'
+        node_index = pd.Index(self.node_ids)
+        mapped_skill_rows = skills.get_indexer(mapped['skill_id'])
+        unmapped_skills = np.setdiff1d(np.arange(len(skills) + 1), mapped_skill_rows)
+        self.skill_nodes = coded_matrix(
+            np.concatenate([mapped_skill_rows, unmapped_skills]),
+            np.concatenate([node_index.get_indexer(mapped['Taxonomy ID'].astype(str)), np.full(len(unmapped_skills), unmapped)]),
+            (len(skills) + 1, len(self.node_ids))
+        )
+
+        self.occupation_skills = (occupation_requirements @ requirement_skills).tocsr()
+        self.node_counts = (self.occupation_skills @ self.skill_nodes).tocsr()
+
+        # Mapped IDs keep complete_taxonomy's spelling ('1.' at the top level); the index holds them normalized
+        self.node_rows = self.taxonomy.rows([normalize_taxonomy_id(node_id) for node_id in self.node_ids])
+
+        logging.info(f"Built {len(self.occupations)} x {len(self.node_ids)} occupation x taxonomy counts "
+                     f"({self.node_counts.nnz} non-zero) in {time.perf_counter() - started:.2f}s")
+
+    def group(self, labels):
+        """
+        Roll node counts up into labelled groups.
+        :param labels: One group label per node (None drops the node).
+        :return: A DataFrame of counts indexed by core_occupation, with a column per group that occurs.
+        """
+        labels = pd.Series(labels, dtype=object)
+        keep = labels.notna().to_numpy()
+        group_codes, groups = pd.factorize(labels[keep], sort=True)
+        grouping = coded_matrix(np.flatnonzero(keep), group_codes, (len(self.node_ids), len(groups)))
+
+        counts = (self.node_counts @ grouping).toarray()
+        occurring = counts.sum(axis=0) > 0
+        return pd.DataFrame(counts[:, occurring], index=pd.Index(self.occupations, name='core_occupation'),
+                            columns=pd.Index(np.asarray(groups, dtype=object)[occurring]))
+
+    def label(self, taxonomy_id):
+        taxonomy_id = normalize_taxonomy_id(taxonomy_id)
+        row = self.taxonomy.row_of.get(taxonomy_id)
+        description = self.taxonomy.descriptions[row] if row is not None else None
+        return description if description is not None else f'Taxonomy {taxonomy_id}'
+
+    def at_depth(self, depth, subtree=None):
+        """
+        Counts rolled up to the taxonomy nodes at `depth` (1 is the top level), labelled with their descriptions.
+        Skills mapped above that depth stay on their own node.
+        :param subtree: Optional Taxonomy ID; only nodes inside this subtree are counted.
+        """
+        known = self.node_rows >= 0
+        ancestor_ids = self.taxonomy.ids[self.taxonomy.ancestors_at(self.node_rows[known], depth)]
+        labels = np.full(len(self.node_ids), None, dtype=object)
+        labels[known] = [self.label(taxonomy_id) for taxonomy_id in ancestor_ids]
+
+        # Mapped IDs missing from complete_taxonomy are placed by their ID alone
+        for node in np.flatnonzero(~known & (self.node_ids != UNMAPPED)):
+            labels[node] = self.label(ancestor_id(normalize_taxonomy_id(self.node_ids[node]), depth))
+
+        if subtree is not None:
+            subtree = normalize_taxonomy_id(subtree)
+            root = self.taxonomy.row_of.get(subtree)
+            inside = self.taxonomy.in_subtree(self.node_rows, root) & known if root is not None else np.zeros(len(known), dtype=bool)
+            inside[~known] = [normalize_taxonomy_id(node_id) == subtree or normalize_taxonomy_id(node_id).startswith(f'{subtree}.')
+                              for node_id in self.node_ids[~known]]
+            labels[~inside] = None
+        return self.group(labels)
+
+    def subtree(self, taxonomy_id):
+        """Counts inside one subtree, rolled up to the children of its root."""
+        taxonomy_id = normalize_taxonomy_id(taxonomy_id)
+        return self.at_depth(taxonomy_depth(taxonomy_id) + 1, subtree=taxonomy_id)
+
+    def legacy_top_level(self):
+        """
+        The original heatmap columns: every Taxonomy ID is labelled by its first component through the
+        legacy label map, falling back to 'Taxonomy <id>' (including 'Taxonomy nan' for unmapped rows).
+        """
+        view = self.group([self.legacy_labels.get(node_id.split('.')[0], f'Taxonomy {node_id}') for node_id in self.node_ids])
+        view.columns.name = 'Top_Level_Taxonomy'
+        return view
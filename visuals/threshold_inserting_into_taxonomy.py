@@ -1,120 +1,89 @@
-import json
+import argparse
+import os
+import time
 import pandas as pd
-from scipy.spatial.distance import cosine
 import logging
-from sentence_transformers import SentenceTransformer
+from ann_index import DEFAULT_K, DEFAULT_N_PROBE, IVFIndex, recall
+from artifacts import load_artifact, save_artifact
+from embedding_cache import CachedEncoder
+from embedding_store import load_taxonomy_embeddings
+from taxonomy_matching import (ApproximateTaxonomyMatcher, TaxonomyMatcher, encode_texts, load_node_index,
+                               map_skills_threshold, update_skill_index)
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
-model = SentenceTransformer('msmarco-distilbert-base-v4')
+# Skill embeddings are served from the shared cache; the model only loads on a cache miss
+model = CachedEncoder('msmarco-distilbert-base-v4')
 
-# Load the taxonomy tree with precomputed embeddings
-with open('./mnt/data/taxonomy_tree_with_embeddings.json', 'r') as file:
-    taxonomy_tree = json.load(file)
+# Load the taxonomy node index and memory-mapped embeddings
+taxonomy_nodes = load_taxonomy_embeddings('./mnt/data')
 
 # Load the skills data
-skills_df = pd.read_csv('./mnt/data/reformatted_skills.csv')
-#skills_df = pd.read_csv('./mnt/data/TEST_reformatted_skills.csv')
+skills_df = load_artifact('reformatted_skills', columns=['skill_id', 'skill'])
+#skills_df = load_artifact('TEST_reformatted_skills', columns=['skill_id', 'skill'])
 
-def recursive_taxonomy_search(skill_embedding, node, level=0, current_id=""):
-    """
-    Recursively search through the taxonomy tree to find the best matches for the given skill embedding.
-    :param skill_embedding: The embedding of the skill.
-    :param node: The current node in the taxonomy tree.
-    :param level: The current depth in the recursion (for logging purposes).
-    :param current_id: The current ID path (e.g., "1.1.1") of the node in the taxonomy.
-    :return: The best matching nodes, the similarity scores, and the taxonomy IDs.
-    """
-    # Use the precomputed embedding stored in the node
-    combined_embedding = node.get('_embedding', None)
-
-    if combined_embedding is None:
-        logging.warning(f"No embedding found for node '{node.get('_description', '')}'")
-        return []
-
-    similarity = 1 - cosine(skill_embedding, combined_embedding)
-    logging.debug(f"Level {level}: Comparing with node '{node.get('_description', '')}' (Similarity: {similarity:.4f})")
-
-    # Use the correct ID from the node if available
-    node_id = node.get('_id', current_id)
-
-    matches = [(node, similarity, node_id)]  # Store the current node as a match
-
-    # Recursively search through child nodes
-    for key, child_node in node.items():
-        if key.startswith("_"):
-            continue
-
-        child_id = child_node.get('_id', f"{current_id}.{key}")
-        matches.extend(recursive_taxonomy_search(skill_embedding, child_node, level + 1, current_id=child_id))
-
-    return matches
+# Approximate nearest-neighbour indexes, stored next to the taxonomy embedding artifacts
+NODE_INDEX_PATH = './mnt/data/taxonomy_nodes.ivf.npz'
+SKILL_INDEX_PATH = './mnt/data/mapped_skills.ivf.npz'
 
-def top_n_taxonomy_search(skill_embedding, taxonomy_tree, n):
+def map_skills_to_taxonomy(taxonomy_nodes, skills_df, n):
     """
-    Search the top N most similar top-level nodes and compare their subtrees.
-    :param skill_embedding: The embedding of the skill.
-    :param taxonomy_tree: The taxonomy tree to search.
-    :param n: The number of top-level nodes to search deeper.
-    :return: The best matching node, the similarity score, and the taxonomy ID.
+    Map each skill to every taxonomy node scoring at least 90% of the skill's best similarity.
+    Skills are encoded in batches and scored against the whole tree with one matrix product per batch.
     """
-    top_level_results = []
+    matcher = TaxonomyMatcher(taxonomy_nodes)
+    logging.info(f"Scoring {len(skills_df)} skills against {len(matcher)} taxonomy nodes")
 
-    for index, (key, node) in enumerate(taxonomy_tree.items()):
-        if key.startswith("_"):
-            continue
+    return map_skills_threshold(matcher, model, skills_df)
 
-        top_id = f"{index + 1}"
-        matches = recursive_taxonomy_search(skill_embedding, node, level=0, current_id=top_id)
-        top_level_results.extend(matches)
+def build_approximate_matcher(taxonomy_nodes, k, n_probe):
+    """Load (or build) the node and mapped-skill indexes and wrap them in an approximate matcher."""
+    node_index = load_node_index(taxonomy_nodes, NODE_INDEX_PATH)
+    skill_index = IVFIndex.load(SKILL_INDEX_PATH) if os.path.exists(SKILL_INDEX_PATH) else None
+    return ApproximateTaxonomyMatcher(taxonomy_nodes, node_index, skill_index, k=k, n_probe=n_probe)
 
-    # Sort matches by similarity
-    top_level_results.sort(key=lambda x: x[1], reverse=True)
+def check_recall(taxonomy_nodes, skills_df, k, n_probe):
+    """Compare the approximate mapping with the exact brute-force mapping on the given skills."""
+    started = time.perf_counter()
+    exact_df = map_skills_threshold(TaxonomyMatcher(taxonomy_nodes), model, skills_df)
+    exact_seconds = time.perf_counter() - started
 
-    # Determine the dynamic threshold (e.g., 80% of the highest similarity score)
-    if top_level_results:
-        threshold = top_level_results[0][1] * 0.90  # Adjust the 0.8 as needed
+    started = time.perf_counter()
+    approx_df = map_skills_threshold(build_approximate_matcher(taxonomy_nodes, k, n_probe), model, skills_df)
+    approx_seconds = time.perf_counter() - started
 
-        # Filter out matches below the threshold
-        filtered_results = [match for match in top_level_results if match[1] >= threshold]
-        return filtered_results
-
-    return []
-
-def map_skills_to_taxonomy(taxonomy_tree, skills_df, n):
-    """Map each skill to its best-fitting taxonomy node by considering the top N most similar top-level nodes."""
-    skill_mappings = []
-
-    for index, row in skills_df.iterrows():
-        skill = row['skill']
-        skill_id = row['skill_id']
-        skill_embedding = model.encode(skill)
-
-        logging.info(f"Processing skill {index + 1}/{len(skills_df)}: {skill} (ID: {skill_id})")
-
-        matches = top_n_taxonomy_search(skill_embedding, taxonomy_tree, n)
-
-        for match in matches:
-            best_match_node, similarity_score, taxonomy_id = match
-            skill_mappings.append({
-                'skill_id': skill_id,
-                'skill': skill,
-                'Mapped Node': best_match_node.get('_description', 'Unmapped'),
-                'Taxonomy ID': taxonomy_id,
-                'Similarity Score': similarity_score
-            })
-
-    return pd.DataFrame(skill_mappings)
+    pairs = lambda df: zip(df['skill_id'], df['Taxonomy ID'])
+    print(f"Recall of the approximate mapping (k={k}, n_probe={n_probe}): {recall(pairs(approx_df), pairs(exact_df)):.4f}")
+    print(f"Exact: {exact_seconds:.2f}s, approximate: {approx_seconds:.2f}s for {len(skills_df)} skills")
 
 def main():
-    # Map the skills to the taxonomy, considering the top 3 most similar top-level nodes
-    skill_mappings_df = map_skills_to_taxonomy(taxonomy_tree, skills_df, 3)
-
-    # Save the mapping results to a CSV file
-    skill_mappings_df.to_csv('./mnt/data/threshold_skills_insertion.csv', index=False)
-
-    print("Skill mappings have been saved to 'threshold_skills_insertion.csv'.")
+    parser = argparse.ArgumentParser(description="Map skills onto the taxonomy.")
+    parser.add_argument('--ann', action='store_true', help="Use the approximate nearest-neighbour indexes.")
+    parser.add_argument('--k', type=int, default=DEFAULT_K, help="Candidate nodes fetched per skill in ANN mode.")
+    parser.add_argument('--n-probe', type=int, default=DEFAULT_N_PROBE, help="Inverted lists scanned per query; higher is slower but more accurate.")
+    parser.add_argument('--check-recall', type=int, metavar='N', help="Measure ANN recall against the exact search on the first N skills and exit.")
+    args = parser.parse_args()
+
+    if args.check_recall:
+        check_recall(taxonomy_nodes, skills_df.head(args.check_recall), args.k, args.n_probe)
+        return
+
+    if args.ann:
+        matcher = build_approximate_matcher(taxonomy_nodes, args.k, args.n_probe)
+        skill_mappings_df = map_skills_threshold(matcher, model, skills_df)
+
+        # Remember this batch so later batches can reuse its matches as candidates
+        skill_embeddings = encode_texts(model, skills_df['skill'].tolist())
+        update_skill_index(matcher.skill_index, SKILL_INDEX_PATH, skill_embeddings, skills_df['skill_id'].tolist(), skill_mappings_df)
+    else:
+        # Map the skills to the taxonomy, considering the top 3 most similar top-level nodes
+        skill_mappings_df = map_skills_to_taxonomy(taxonomy_nodes, skills_df, 3)
+
+    # Save the mapping results
+    path = save_artifact(skill_mappings_df, 'threshold_skills_insertion')
+
+    print(f"Skill mappings have been saved to '{path}'.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,315 @@
+import hashlib
+import logging
+import os
+import time
+import numpy as np
+from scipy import sparse
+from scipy.cluster.hierarchy import linkage
+
+DEFAULT_MICRO_CLUSTERS = 2000
+KMEANS_BATCH_SIZE = 4096
+
+
+def assign_to_nearest(vectors, centroids, batch_size=KMEANS_BATCH_SIZE):
+    """Index of the nearest centroid (Euclidean) for every vector, computed in row batches to bound memory."""
+    centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch_size):
+        # |x - c|^2 up to the constant |x|^2, computed in place
+        scores = vectors[start:start + batch_size] @ centroids.T
+        scores *= -2
+        scores += centroid_norms
+        assignments[start:start + batch_size] = scores.argmin(axis=1)
+    return assignments
+
+
+def group_means(vectors, assignments):
+    """Centroid and size of each group of vectors, for group numbers 0..k-1."""
+    sizes = np.bincount(assignments)
+    return group_sums(vectors, assignments, len(sizes)) / sizes[:, None], sizes
+
+
+def group_sums(vectors, assignments, n_groups):
+    """Per-group sums of vectors, as a sparse (group x vector) indicator product."""
+    indicator = sparse.csr_matrix((np.ones(len(assignments)), (assignments, np.arange(len(assignments)))),
+                                  shape=(n_groups, len(assignments)))
+    return np.asarray(indicator @ vectors, dtype=np.float64)
+
+
+def micro_clusters(vectors, n_clusters, n_iter=10, seed=0):
+    """
+    Partition vectors into at most `n_clusters` small clusters with Lloyd's k-means.
+    :return: (assignments, centroids, sizes); clusters that end up empty are dropped.
+    """
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), size=n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assignments = assign_to_nearest(vectors, centroids)
+        sums = group_sums(vectors, assignments, n_clusters)
+        counts = np.bincount(assignments, minlength=n_clusters)
+
+        # Re-seed empty clusters with random vectors so every cluster stays in use
+        empty = counts == 0
+        sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()))]
+        counts[empty] = 1
+        centroids = (sums / counts[:, None]).astype(np.float32)
+
+    _, assignments = np.unique(assign_to_nearest(vectors, centroids), return_inverse=True)
+    centroids, sizes = group_means(vectors, assignments)
+    return assignments, centroids, sizes
+
+
+def weighted_ward_merges(centroids, sizes):
+    """
+    Ward clustering of weighted points (cluster centroids with their sizes). Merge heights are what
+    exact Ward would report for the same groups of original points. Uses the nearest-neighbour chain
+    algorithm on a dense matrix of squared Ward distances: O(m^2) time and memory for m centroids.
+    :return: A list of (slot a, slot b, height) in merge order; each merged cluster keeps slot a.
+    """
+    centroids = np.asarray(centroids, dtype=np.float64)
+    sizes = np.asarray(sizes, dtype=np.float64).copy()
+    m = len(centroids)
+
+    # Squared Ward distance between clusters i and j: 2 n_i n_j / (n_i + n_j) * |c_i - c_j|^2
+    norms = np.einsum('ij,ij->i', centroids, centroids)
+    distances = np.maximum(norms[:, None] + norms[None, :] - 2 * (centroids @ centroids.T), 0)
+    distances *= 2 * np.outer(sizes, sizes) / (sizes[:, None] + sizes[None, :])
+    np.fill_diagonal(distances, np.inf)
+
+    merges = []
+    chain = []
+    active = np.ones(m, dtype=bool)
+    while len(merges) < m - 1:
+        if not chain:
+            chain.append(int(np.argmax(active)))
+        a = chain[-1]
+        b = int(np.argmin(distances[a]))
+        # Prefer the previous chain element on ties so the chain always terminates
+        if len(chain) > 1 and distances[a, chain[-2]] <= distances[a, b]:
+            b = chain[-2]
+        if len(chain) < 2 or b != chain[-2]:
+            chain.append(b)
+            continue
+
+        chain.pop()
+        chain.pop()
+        size_a, size_b, distance_ab = sizes[a], sizes[b], distances[a, b]
+        merges.append((a, b, np.sqrt(distance_ab)))
+
+        # Lance-Williams update for Ward; the merged cluster keeps slot a and slot b is retired
+        total = sizes + size_a + size_b
+        updated = ((sizes + size_a) * distances[a] + (sizes + size_b) * distances[b] - sizes * distance_ab) / total
+        distances[a], distances[:, a] = updated, updated
+        distances[a, a] = np.inf
+        distances[b], distances[:, b] = np.inf, np.inf
+        sizes[a] = size_a + size_b
+        active[b] = False
+
+    return merges
+
+
+def weighted_ward_linkage(centroids, sizes):
+    """Weighted Ward in scipy's linkage format; over singletons it equals `linkage(points, method='ward')`."""
+    return merges_to_linkage(weighted_ward_merges(centroids, sizes), len(centroids))
+
+
+def linkage_merges(Z, leaves):
+    """Express a scipy linkage over `leaves` as (leaf a, leaf b, height) merges, naming clusters by a member leaf."""
+    representative = np.concatenate([leaves, np.empty(len(Z), dtype=np.int64)])
+    merges = []
+    for i, (left, right, height, _) in enumerate(Z):
+        representative[len(leaves) + i] = representative[int(left)]
+        merges.append((representative[int(left)], representative[int(right)], height))
+    return merges
+
+
+def ward_tree_merges(vectors, indices, max_leaves, seed=0):
+    """
+    Approximate Ward tree over vectors[indices] that never clusters more than `max_leaves` points
+    (or groups) at once: exact Ward when the set is small enough, otherwise k-means micro-clusters,
+    each with its own Ward tree, joined by weighted Ward over their centroids. A join is never placed
+    below the subtrees it joins, so heights stay monotone.
+    :return: (merges, height) with (leaf a, leaf b, height) merges in a valid merge order, and the root height.
+    """
+    if len(indices) <= max_leaves:
+        if len(indices) < 2:
+            return [], 0.0
+        merges = linkage_merges(linkage(vectors[indices], method='ward'), indices)
+        return merges, max(merge[2] for merge in merges)
+
+    assignments, centroids, sizes = micro_clusters(vectors[indices], max_leaves, seed=seed)
+    if len(sizes) == 1:
+        # Only identical vectors are left; split them arbitrarily
+        assignments = np.arange(len(indices)) % max_leaves
+        centroids, sizes = group_means(vectors[indices], assignments)
+
+    # Group members of each micro-cluster without scanning the whole set once per cluster
+    order = np.argsort(assignments, kind='stable')
+    groups = np.split(indices[order], np.cumsum(sizes)[:-1])
+
+    merges = []
+    heights = np.empty(len(groups))
+    for i, members in enumerate(groups):
+        group_merges, heights[i] = ward_tree_merges(vectors, members, max_leaves, seed=seed)
+        merges.extend(group_merges)
+
+    for a, b, height in weighted_ward_merges(centroids, sizes):
+        heights[a] = max(height, heights[a], heights[b])
+        merges.append((groups[a][0], groups[b][0], heights[a]))
+    return merges, heights.max()
+
+
+def merges_to_linkage(merges, n_leaves):
+    """
+    Sort (leaf a, leaf b, height) merges by height and name the clusters the way scipy does.
+    The fourth column counts leaves, as scipy expects, whatever weight each leaf carried.
+    """
+    merges = sorted(merges, key=lambda merge: merge[2])
+    parent = np.arange(2 * n_leaves - 1)
+    counts = np.ones(2 * n_leaves - 1)
+
+    Z = np.empty((len(merges), 4), dtype=np.float64)
+    for i, (a, b, height) in enumerate(merges):
+        left, right = sorted((find_root(parent, a), find_root(parent, b)))
+        parent[left] = parent[right] = n_leaves + i
+        counts[n_leaves + i] = counts[left] + counts[right]
+        Z[i] = left, right, height, counts[n_leaves + i]
+    return Z
+
+
+def cut_at_thresholds(Z, thresholds):
+    """
+    Flat clusters for several distance thresholds in one pass over the merge tree, with a union-find
+    over the leaves. Clusters are numbered the way `fcluster(Z, t, criterion='distance')` numbers them.
+    :return: An int32 array of shape (len(thresholds), n_leaves) with cluster numbers starting at 1.
+    """
+    n_leaves = len(Z) + 1
+    order = fcluster_leaf_order(Z)
+    parent = np.arange(n_leaves)
+    node_leaf = np.concatenate([np.arange(n_leaves), np.empty(len(Z), dtype=np.int64)])  # A leaf under each node
+
+    labels = np.empty((len(thresholds), n_leaves), dtype=np.int32)
+    merge = 0
+    for row in np.argsort(thresholds, kind='stable'):
+        while merge < len(Z) and Z[merge, 2] <= thresholds[row]:
+            left, right = node_leaf[int(Z[merge, 0])], node_leaf[int(Z[merge, 1])]
+            parent[find_root(parent, left)] = find_root(parent, right)
+            node_leaf[n_leaves + merge] = left
+            merge += 1
+
+        # Number the clusters in the order fcluster reaches their first leaf
+        roots = find_roots(parent, np.arange(n_leaves))
+        unique_roots, first = np.unique(roots[order], return_index=True)
+        numbers = np.empty(len(unique_roots), dtype=np.int32)
+        numbers[np.argsort(first)] = np.arange(1, len(unique_roots) + 1)
+        labels[row] = numbers[np.searchsorted(unique_roots, roots)]
+    return labels
+
+
+def fcluster_leaf_order(Z):
+    """
+    The order in which fcluster labels leaves: depth first from the root, left before right, where
+    a node's leaf children come after the subtrees of its other children.
+    """
+    n_leaves = len(Z) + 1
+    order = []
+    stack = [(2 * n_leaves - 2, False)] if len(Z) else []
+    while stack:
+        node, expanded = stack.pop()
+        children = [int(Z[node - n_leaves, 0]), int(Z[node - n_leaves, 1])]
+        if expanded:
+            order.extend(child for child in children if child < n_leaves)
+            continue
+        stack.append((node, True))
+        stack.extend((child, False) for child in reversed(children) if child >= n_leaves)
+    return np.array(order or [0], dtype=np.int64)
+
+
+def find_root(parent, node):
+    while parent[node] != node:
+        parent[node] = parent[parent[node]]
+        node = parent[node]
+    return node
+
+
+def find_roots(parent, nodes):
+    """Union-find roots of many nodes at once, compressing the paths followed (pointer jumping)."""
+    while True:
+        grandparent = parent[parent]
+        if np.array_equal(grandparent, parent):
+            return parent[nodes]
+        parent[:] = grandparent
+
+
+def scalable_ward_linkage(vectors, max_leaves=DEFAULT_MICRO_CLUSTERS, seed=0):
+    """
+    Approximate Ward linkage whose memory is bounded by `max_leaves` rather than the number of
+    vectors (see `ward_tree_merges`), in scipy's linkage format. With no more vectors than
+    `max_leaves` it equals exact Ward.
+    """
+    started = time.perf_counter()
+    vectors = np.asarray(vectors, dtype=np.float32)
+    merges, _ = ward_tree_merges(vectors, np.arange(len(vectors)), max_leaves, seed=seed)
+    Z = merges_to_linkage(merges, len(vectors))
+    logging.info(f"Built an approximate Ward tree over {len(vectors)} vectors in {time.perf_counter() - started:.2f}s")
+    return Z
+
+
+def scalable_ward(vectors, thresholds, max_leaves=DEFAULT_MICRO_CLUSTERS, seed=0):
+    """
+    Flat clusters of `scalable_ward_linkage` at every threshold.
+    :return: An int32 array of shape (len(thresholds), len(vectors)) of flat cluster numbers.
+    """
+    return cut_at_thresholds(scalable_ward_linkage(vectors, max_leaves, seed=seed), thresholds)
+
+
+def clusters_at(Z, threshold):
+    """
+    Number of flat clusters `fcluster(Z, threshold, criterion='distance')` would produce, by binary
+    search over the merge heights (sorted in any monotone linkage such as Ward).
+    """
+    return len(Z) + 1 - np.searchsorted(Z[:, 2], threshold, side='right')
+
+
+def leaves_fingerprint(leaves):
+    return hashlib.sha256('\0'.join(map(str, leaves)).encode('utf-8')).hexdigest()
+
+
+def save_linkage(path, Z, leaves):
+    """Store a linkage with a fingerprint of its leaves (e.g. the clustered texts), so viewers can reuse it."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.savez_compressed(path, linkage=Z, fingerprint=leaves_fingerprint(leaves))
+
+
+def load_linkage(path, leaves):
+    """
+    :return: The linkage saved at `path`, or None when there is none or it was built for other leaves.
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as saved:
+        if str(saved['fingerprint']) != leaves_fingerprint(leaves):
+            logging.info(f"Ignoring {path}: it was built for different leaves")
+            return None
+        return saved['linkage']
+
+
+def adjusted_rand_index(labels_a, labels_b):
+    """Adjusted Rand index between two flat clusterings of the same items (1.0 means identical partitions)."""
+    _, labels_a = np.unique(labels_a, return_inverse=True)
+    _, labels_b = np.unique(labels_b, return_inverse=True)
+    contingency = sparse.coo_matrix((np.ones(len(labels_a)), (labels_a, labels_b))).tocsr()
+
+    def pairs(counts):
+        counts = np.asarray(counts, dtype=np.float64)
+        return (counts * (counts - 1) / 2).sum()
+
+    index = pairs(contingency.data)
+    pairs_a, pairs_b = pairs(contingency.sum(axis=1)), pairs(contingency.sum(axis=0))
+    expected = pairs_a * pairs_b / pairs(len(labels_a)) if len(labels_a) > 1 else 0.0
+    maximum = (pairs_a + pairs_b) / 2
+    if maximum == expected:
+        return 1.0
+    return (index - expected) / (maximum - expected)
@@ -1,47 +1,30 @@
+import argparse
+import os
 import pandas as pd
-
-def map_occupation_to_category(occupation):
-    # Define the keyword-to-category mapping
-    keywords = [
-        "Engineer",
-        "Technician",
-        "Specialist",
-        "Operator",
-        "Inspector",
-        "Mechanic",
-        "Manager",
-        "Technologist",
-        "Trade",
-        "Scheduler",
-        "Planner",
-        "Coordinator"
-    ]
-
-    occupation_lower = occupation.lower()
-
-    for keyword in keywords:
-        if keyword.lower() in occupation_lower:
-            if keyword in ['Planner', 'Coordinator', 'Scheduler']:
-                return "Scheduler (or related profession)"
-            return keyword
-
-    return "Other"
-
-def aggregate_workforce_data():
+from artifacts import load_artifact
+from occupation_categories import categorize_occupations
+from taxonomy_rollup import TaxonomyRollup
+
+def aggregate_workforce_data(depths=(), subtrees=()):
+    """
+    Build the occupation x taxonomy counts once and write the heatmap views.
+    :param depths: Extra taxonomy depths to write views for (1 is the top level).
+    :param subtrees: Extra Taxonomy IDs whose subtrees get their own view.
+    """
     # Load the skills data
-    skills_df = pd.read_csv('./mnt/data/reformatted_skills.csv')
+    skills_df = load_artifact('reformatted_skills', columns=['requirement_id', 'skill_id'])
 
     # Load the taxonomy mapping data
-    skill_mapping_df = pd.read_csv('./mnt/data/threshold_skills_insertion.csv')
+    skill_mapping_df = load_artifact('threshold_skills_insertion', columns=['skill_id', 'Taxonomy ID'])
 
     # Load the occupation data
     occupation_data_df = pd.read_excel('./mnt/data/complete_canada_data.xlsx')
 
     # Load the occupation clusters data
-    occupation_clusters_df = pd.read_csv('./mnt/data/occupation_clusters_individual.csv')
+    occupation_clusters_df = load_artifact('occupation_clusters_individual', columns=['occupation_id', 'Category'])
 
     # Load the empty taxonomy structure
-    taxonomy_df = pd.read_csv('./mnt/data/complete_taxonomy.csv')
+    taxonomy_df = load_artifact('complete_taxonomy')
 
     # Step 1: Link Occupation Data to Categories
     occupation_with_category_df = pd.merge(
@@ -53,60 +36,31 @@ def aggregate_workforce_data():
     print("Occupation Data with Categories:")
     print(occupation_with_category_df.head())  # Debugging output
 
-    # Step 2: Link Skills to Requirements
-    skills_with_taxonomy_df = pd.merge(
-        skills_df,
-        skill_mapping_df[['skill_id', 'Taxonomy ID']],
-        on='skill_id',
-        how='left'
-    )
-    print("\nSkills Data with Taxonomy Mapping:")
-    print(skills_with_taxonomy_df.head())  # Debugging output
-
-    # Step 3: Aggregate Skills for Each Requirement
-    aggregated_requirements_df = pd.merge(
-        occupation_with_category_df,
-        skills_with_taxonomy_df,
-        on='requirement_id',
-        how='left'
-    )
-    print("\nAggregated Requirements Data:")
-    print(aggregated_requirements_df[['Category', 'core_occupation', 'requirement_id', 'Taxonomy ID']].head())  # Debugging output
-
-    # Step 4: Filter to Top-Level Taxonomy Categories
-    top_level_taxonomies = taxonomy_df.loc[
-        taxonomy_df['Taxonomy ID'].str.contains(r'^\d+(\.\d+)?$', regex=True)  # Regex to find top-level taxonomies
-    ].copy()
-
-    top_level_taxonomies['Cleaned Taxonomy ID'] = top_level_taxonomies['Taxonomy ID'].str.split('.').str[0]  # Keep only the top-level
+    # Step 2: Count skills per occupation and taxonomy node (occupation -> requirement -> skill -> node)
+    rollup = TaxonomyRollup(occupation_with_category_df, skills_df, skill_mapping_df, taxonomy_df)
 
-    taxonomy_map = top_level_taxonomies.set_index('Cleaned Taxonomy ID')['Description'].to_dict()
+    # Step 3: Write the top-level view the dashboard uses, plus any extra granularities
+    save_heatmap(rollup.legacy_top_level(), './mnt/data/aggregated_heatmap_data_with_categories.csv')
+    for depth in depths:
+        save_heatmap(rollup.at_depth(depth), f'./mnt/data/aggregated_heatmap_data_depth_{depth}.csv')
+    for taxonomy_id in subtrees:
+        save_heatmap(rollup.subtree(taxonomy_id), f'./mnt/data/aggregated_heatmap_data_subtree_{taxonomy_id}.csv')
 
-    # Convert 'Taxonomy ID' to string and handle NaN values
-    aggregated_requirements_df['Taxonomy ID'] = aggregated_requirements_df['Taxonomy ID'].astype(str)
-
-    # Apply the top-level taxonomy mapping to the aggregated data
-    aggregated_requirements_df['Top_Level_Taxonomy'] = aggregated_requirements_df['Taxonomy ID'].apply(
-        lambda x: taxonomy_map.get(x.split('.')[0], f'Taxonomy {x}') if pd.notna(x) else 'Unknown Taxonomy'
-    )
-
-    # Step 5: Aggregate Data by core_occupation and Top-Level Taxonomy
-    occupation_skill_matrix = aggregated_requirements_df.pivot_table(
-        index='core_occupation',
-        columns='Top_Level_Taxonomy',
-        aggfunc='size',  # Count the occurrences of each taxonomy for each occupation
-        fill_value=0
-    )
-
-    # Step 6: Add Categories Based on Occupation Keywords
-    occupation_skill_matrix['Category'] = occupation_skill_matrix.index.map(map_occupation_to_category)
+def save_heatmap(occupation_skill_matrix, path):
+    # Add Categories Based on Occupation Keywords
+    occupation_skill_matrix['Category'] = categorize_occupations(occupation_skill_matrix.index).to_numpy()
 
     # Sort the data by Category
     occupation_skill_matrix = occupation_skill_matrix.sort_values(by=['Category'])
 
     # Save the final pivot table with categories
-    occupation_skill_matrix.to_csv('./mnt/data/aggregated_heatmap_data_with_categories.csv')
-    print("\nGenerated 'aggregated_heatmap_data_with_categories.csv' successfully!")
+    occupation_skill_matrix.to_csv(path)
+    print(f"\nGenerated '{os.path.basename(path)}' successfully!")
 
 if __name__ == "__main__":
-    aggregate_workforce_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Aggregate skill counts per occupation and taxonomy node.")
+    parser.add_argument('--depth', type=int, action='append', default=[], help="Also write a view at this taxonomy depth (repeatable)")
+    parser.add_argument('--subtree', action='append', default=[], help="Also write a view of this Taxonomy ID's subtree (repeatable)")
+    args = parser.parse_args()
+
+    aggregate_workforce_data(args.depth, args.subtree)